@@ -0,0 +1,187 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import streamlit as st
+
+from constants import ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_SIMILARITY_THRESHOLD, ANSWER_CACHE_TTL_SECONDS
+from metrics import increment, timed
+
+# Questions referring back to earlier turns depend on the conversation, not just their text
+FOLLOW_UP_PATTERN = re.compile(r"\b(it|its|that|this|these|those|they|them|their|also|else|again)\b", re.IGNORECASE)
+
+def normalize_query(query):
+    return " ".join(re.findall(r"[a-z0-9]+", query.lower()))
+
+
+def is_follow_up(query):
+    return bool(FOLLOW_UP_PATTERN.search(query))
+
+
+class AnswerCacheEntry:
+    __slots__ = ("answer", "embedding", "created_at")
+
+    def __init__(self, answer, embedding, created_at):
+        self.answer = answer
+        self.embedding = embedding
+        self.created_at = created_at
+
+
+class AnswerCache:
+    """
+    Process-wide cache of general agent answers.
+
+    Entries are scoped by a tuple describing everything the answer depends
+    on (knowledge base contents, system message, model), so sessions with the
+    same configuration share answers. A lookup first tries the normalized
+    query text and then, if an embedding function is given, the most similar
+    cached query of the same scope above ``similarity_threshold``. Entries
+    expire after ``ttl_seconds`` and the least recently used ones are evicted
+    beyond ``max_entries``.
+    """
+
+    def __init__(self, max_entries=ANSWER_CACHE_MAX_ENTRIES, ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+                 similarity_threshold=ANSWER_CACHE_SIMILARITY_THRESHOLD):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_fresh(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if now - entry.created_at > self.ttl_seconds:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _find_similar(self, scope, embedding, now):
+        keys = [key for key, entry in self._entries.items()
+                if key[0] == scope and entry.embedding is not None and now - entry.created_at <= self.ttl_seconds]
+        if not keys:
+            return None
+        similarities = np.stack([self._entries[key].embedding for key in keys]) @ embedding
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.similarity_threshold:
+            return None
+        self._entries.move_to_end(keys[best])
+        return self._entries[keys[best]]
+
+    def get(self, scope, query, embed_query=None):
+        """
+        Look up a cached answer for the query.
+
+        Args:
+            scope (tuple): The answer scope.
+            query (str): The user query.
+            embed_query (callable, optional): Returns the embedding of a text;
+                enables the similarity layer after an exact miss.
+
+        Returns:
+            tuple: The cached answer or None, and the normalized query
+                embedding if one was computed (pass it to ``put`` on a miss).
+        """
+        now = time.time()
+        with timed("answer_cache.lookup"):
+            with self._lock:
+                entry = self._get_fresh((scope, normalize_query(query)), now)
+            if entry is not None:
+                return self._hit("exact", entry), entry.embedding
+
+            embedding = None
+            if embed_query is not None:
+                try:
+                    embedding = np.asarray(embed_query(query), dtype=np.float32)
+                    embedding /= np.linalg.norm(embedding) or 1.0
+                except Exception as e:
+                    print("Error embedding query for the answer cache:", e)
+                if embedding is not None:
+                    with self._lock:
+                        entry = self._find_similar(scope, embedding, now)
+                    if entry is not None:
+                        return self._hit("semantic", entry), embedding
+
+        with self._lock:
+            self.misses += 1
+        increment("answer_cache.misses")
+        return None, embedding
+
+    def _hit(self, layer, entry):
+        with self._lock:
+            if layer == "exact":
+                self.exact_hits += 1
+            else:
+                self.semantic_hits += 1
+        increment(f"answer_cache.{layer}_hits")
+        return entry.answer
+
+    def put(self, scope, query, answer, embedding=None):
+        with self._lock:
+            key = (scope, normalize_query(query))
+            self._entries.pop(key, None)
+            self._entries[key] = AnswerCacheEntry(answer, embedding, time.time())
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, predicate):
+        """
+        Drop every entry whose scope matches ``predicate``.
+
+        Returns:
+            int: The number of dropped entries.
+        """
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key[0])]
+            for key in keys:
+                del self._entries[key]
+        increment("answer_cache.invalidated", len(keys))
+        return len(keys)
+
+    def stats(self):
+        with self._lock:
+            hits = self.exact_hits + self.semantic_hits
+            lookups = hits + self.misses
+            return {
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+            }
+
+
+@st.cache_resource(show_spinner=False)
+def get_shared_answer_cache():
+    """
+    Return the answer cache shared by all Streamlit sessions of this process.
+    """
+    return AnswerCache()
+
+
+_local_answer_cache = None
+_local_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache():
+    """
+    Return the process-wide answer cache.
+
+    Inside a Streamlit app the cache lives in ``st.cache_resource``; when
+    running without the Streamlit runtime a module level instance is used.
+    """
+    if st.runtime.exists():
+        return get_shared_answer_cache()
+
+    global _local_answer_cache
+    with _local_answer_cache_lock:
+        if _local_answer_cache is None:
+            _local_answer_cache = AnswerCache()
+        return _local_answer_cache
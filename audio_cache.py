@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from constants import AUDIO_CACHE_DIR, AUDIO_CACHE_MAX_BYTES
+
+
+class AudioCache:
+    """
+    Disk-backed, content-addressed cache for synthesized speech.
+
+    Entries are keyed on a hash of (text, model, voice, format) and evicted in
+    least-recently-used order once the total size exceeds ``max_bytes``.
+    Recency is persisted through the file modification time, so the LRU order
+    survives process restarts.
+    """
+
+    def __init__(self, cache_dir=AUDIO_CACHE_DIR, max_bytes=AUDIO_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def make_key(text, model, voice, response_format):
+        payload = json.dumps([text, model, voice, response_format])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _load(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        files = []
+        for name in os.listdir(self.cache_dir):
+            path = self._path(name)
+            if os.path.isfile(path) and not name.endswith(".tmp"):
+                stat = os.stat(path)
+                files.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._total_bytes += size
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key):
+        """
+        Return the cached audio bytes for ``key``, or None on a miss.
+        """
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            try:
+                with open(self._path(key), "rb") as audio_file:
+                    data = audio_file.read()
+                os.utime(self._path(key))
+            except OSError as e:
+                print("Error reading cached audio:", e)
+                self._total_bytes -= self._entries.pop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        """
+        Store audio bytes under ``key`` and evict old entries if needed.
+        """
+        with self._lock:
+            if len(data) > self.max_bytes:
+                return
+            tmp_path = f"{self._path(key)}.tmp"
+            try:
+                with open(tmp_path, "wb") as audio_file:
+                    audio_file.write(data)
+                os.replace(tmp_path, self._path(key))
+            except OSError as e:
+                print("Error writing cached audio:", e)
+                return
+            self._total_bytes -= self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._total_bytes += len(data)
+            self._evict()
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except OSError as e:
+                print("Error evicting cached audio:", e)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "total_bytes": self._total_bytes,
+            }
+
+
+audio_cache = AudioCache()
@@ -0,0 +1,59 @@
+import threading
+from collections import OrderedDict
+
+from constants import AUDIO_STORE_MAX_BYTES
+
+
+class AudioStore:
+    """
+    Bounded in-memory store for the reply audio of one conversation.
+
+    Clips are kept as the compressed bytes returned by the TTS API and
+    evicted in least-recently-used order once the total size exceeds
+    ``max_bytes``. An evicted clip is simply no longer replayable from the
+    history.
+    """
+
+    def __init__(self, max_bytes=AUDIO_STORE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._clips = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return the audio bytes stored under ``key``, or None if missing or evicted.
+        """
+        with self._lock:
+            data = self._clips.get(key)
+            if data is not None:
+                self._clips.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        """
+        Store audio bytes under ``key`` and evict old clips if needed.
+        """
+        with self._lock:
+            if len(data) > self.max_bytes:
+                return
+            old_data = self._clips.pop(key, None)
+            if old_data is not None:
+                self._total_bytes -= len(old_data)
+            self._clips[key] = data
+            self._total_bytes += len(data)
+            while self._total_bytes > self.max_bytes:
+                _, evicted = self._clips.popitem(last=False)
+                self._total_bytes -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._clips.clear()
+            self._total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._clips),
+                "total_bytes": self._total_bytes,
+            }
@@ -1,21 +1,34 @@
-from chat_utils import openai_client
 import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
 
-def convert_audio_to_text(audio_file_path):
+from pydub import AudioSegment
+from pydub.silence import detect_leading_silence, detect_silence
+
+from audio_cache import AudioCache, audio_cache
+from chat_utils import async_openai_client, openai_client
+from constants import AUDIO_FORMATS, CACHED_AUDIO_PHRASES, STT_SAMPLE_RATE, STT_SILENCE_PADDING_MS, STT_SILENCE_THRESHOLD_DBFS, STT_SPLIT_MAX_CHUNK_MS, STT_SPLIT_MAX_OVERLAP_WORDS, STT_SPLIT_MAX_WORKERS, STT_SPLIT_MIN_DURATION_MS, STT_SPLIT_MIN_SILENCE_MS, STT_SPLIT_OVERLAP_MS, STT_UPLOAD_BITRATE, STT_UPLOAD_CODEC, STT_UPLOAD_FORMAT, TURN_STAGE_TIMEOUTS, TTS_MODEL, TTS_RESPONSE_FORMAT, TTS_STREAMING_MAX_WORKERS, TTS_STREAMING_MIN_SENTENCE_CHARS, TTS_VOICE
+from metrics import increment, timed
+
+SENTENCE_BOUNDARY_PATTERN = re.compile(r"(?<=[.!?])\s+")
+TTS_MIME_TYPE, TTS_CONTAINER_FORMAT = AUDIO_FORMATS[TTS_RESPONSE_FORMAT]
+
+def convert_audio_to_text(audio_file_path, engine=None):
   """
     Convert audio file to text using OpenAI's Whisper API.
 
     Args:
         audio_file_path (str): Path to the audio file.
+        engine (TurnEngine, optional): Transcribe on the turn engine.
 
     Returns:
         str: Text extracted from the audio file.
     """
   try:
     with open(audio_file_path, "rb") as audio_file:
-      response = openai_client.audio.transcriptions.create(
-          model="whisper-1", file=audio_file, response_format="json")
-      return response.text
+      audio_bytes = audio_file.read()
+    return transcribe_audio(audio_bytes, os.path.basename(audio_file_path), engine)
   except Exception as e:
     print("Error converting audio to text:", e)
     return None
@@ -23,6 +36,284 @@ def convert_audio_to_text(audio_file_path):
      if audio_file_path:
         os.remove(audio_file_path)
 
+def transcribe_audio(audio_bytes, file_name="audio.wav", engine=None):
+    """
+    Convert in-memory audio to text using OpenAI's Whisper API.
+
+    Args:
+        audio_bytes (bytes): The recorded audio.
+        file_name (str): Name sent with the upload, its extension tells the API the format.
+        engine (TurnEngine, optional): Transcribe on the turn engine.
+
+    Returns:
+        str: Text extracted from the audio, or None on error.
+    """
+    try:
+        with timed("stt.transcription"):
+            if engine:
+                return engine.run(transcribe_audio_async(audio_bytes, file_name), "stt", TURN_STAGE_TIMEOUTS["stt"])
+            response = openai_client.audio.transcriptions.create(
+                model="whisper-1", file=(file_name, audio_bytes), response_format="json")
+        return response.text
+    except Exception as e:
+        print("Error converting audio to text:", e)
+        return None
+
+async def transcribe_audio_async(audio_bytes, file_name="audio.wav"):
+    """
+    Async version of ``transcribe_audio`` for the turn engine.
+    """
+    response = await async_openai_client.audio.transcriptions.create(
+        model="whisper-1", file=(file_name, audio_bytes), response_format="json")
+    return response.text
+
+def trim_silence(segment, silence_threshold=STT_SILENCE_THRESHOLD_DBFS, padding_ms=STT_SILENCE_PADDING_MS):
+    """
+    Cut leading and trailing silence from a recording, keeping a little padding.
+
+    A recording that is silent throughout is returned unchanged.
+    """
+    leading_silence = detect_leading_silence(segment, silence_threshold=silence_threshold)
+    trailing_silence = detect_leading_silence(segment.reverse(), silence_threshold=silence_threshold)
+    start = max(0, leading_silence - padding_ms)
+    end = len(segment) - max(0, trailing_silence - padding_ms)
+    if start >= end:
+        return segment
+    return segment[start:end]
+
+def prepare_recording(segment):
+    """
+    Trim silence, downmix to mono and resample a recording to ``STT_SAMPLE_RATE``.
+
+    Args:
+        segment (AudioSegment): The raw recording.
+
+    Returns:
+        AudioSegment: The processed recording.
+    """
+    increment("stt.bytes_raw", len(segment.raw_data))
+    with timed("stt.preprocess"):
+        return trim_silence(segment).set_channels(1).set_frame_rate(STT_SAMPLE_RATE).set_sample_width(2)
+
+def encode_recording(segment):
+    """
+    Encode a prepared recording with ``STT_UPLOAD_CODEC`` for upload.
+
+    If the codec is unavailable the audio is uploaded as WAV instead.
+
+    Returns:
+        tuple: The encoded bytes and the file name to upload them under.
+    """
+    with timed("stt.encode"):
+        buffer = BytesIO()
+        try:
+            segment.export(buffer, format=STT_UPLOAD_FORMAT, codec=STT_UPLOAD_CODEC, bitrate=STT_UPLOAD_BITRATE)
+            file_name = f"audio.{STT_UPLOAD_FORMAT}"
+        except Exception as e:
+            print("Error encoding recording, uploading WAV instead:", e)
+            buffer = BytesIO()
+            segment.export(buffer, format="wav")
+            file_name = "audio.wav"
+
+    audio_bytes = buffer.getvalue()
+    increment("stt.bytes_uploaded", len(audio_bytes))
+    return audio_bytes, file_name
+
+def split_recording(segment, max_chunk_ms=STT_SPLIT_MAX_CHUNK_MS, min_silence_ms=STT_SPLIT_MIN_SILENCE_MS,
+                    silence_threshold=STT_SILENCE_THRESHOLD_DBFS, overlap_ms=STT_SPLIT_OVERLAP_MS):
+    """
+    Split a recording into chunks of at most ``max_chunk_ms`` at silence boundaries.
+
+    Each chunk is cut in the middle of the last pause that keeps it under the
+    limit, but no earlier than half the limit. When there is no such pause the
+    chunk is cut hard and the next one starts ``overlap_ms`` earlier, so a word
+    on the boundary is heard whole by at least one request.
+
+    Returns:
+        list: (chunk, overlaps_previous) tuples, in order.
+    """
+    silences = detect_silence(segment, min_silence_len=min_silence_ms, silence_thresh=silence_threshold, seek_step=10)
+    cut_points = [(silence_start + silence_end) // 2 for silence_start, silence_end in silences]
+
+    chunks = []
+    start = 0
+    overlaps_previous = False
+    while len(segment) - start > max_chunk_ms:
+        candidates = [point for point in cut_points if start + max_chunk_ms // 2 <= point <= start + max_chunk_ms]
+        chunks.append((segment[start:candidates[-1] if candidates else start + max_chunk_ms], overlaps_previous))
+        if candidates:
+            start = candidates[-1]
+            overlaps_previous = False
+        else:
+            start = start + max_chunk_ms - overlap_ms
+            overlaps_previous = True
+    chunks.append((segment[start:], overlaps_previous))
+    return chunks
+
+def normalize_word(word):
+    return re.sub(r"[^\w']", "", word.lower())
+
+def merge_transcripts(texts, overlaps=None, max_overlap_words=STT_SPLIT_MAX_OVERLAP_WORDS):
+    """
+    Join chunk transcripts in order, dropping words repeated across overlapping boundaries.
+
+    Args:
+        texts (list): Transcripts of consecutive chunks.
+        overlaps (list, optional): Whether each chunk overlaps the previous one,
+            defaults to all of them.
+        max_overlap_words (int): Longest repeated run of words looked for at each boundary.
+
+    Returns:
+        str: The merged transcript.
+    """
+    if overlaps is None:
+        overlaps = [True] * len(texts)
+    merged_words = []
+    for text, overlaps_previous in zip(texts, overlaps):
+        words = text.split()
+        overlap = 0
+        searched_words = max_overlap_words if overlaps_previous else 0
+        for size in range(min(searched_words, len(merged_words), len(words)), 0, -1):
+            tail = [normalize_word(word) for word in merged_words[-size:]]
+            head = [normalize_word(word) for word in words[:size]]
+            if tail == head:
+                overlap = size
+                break
+        merged_words.extend(words[overlap:])
+    return " ".join(merged_words)
+
+def transcribe_chunk(chunk, engine=None):
+    audio_bytes, file_name = encode_recording(chunk)
+    return transcribe_audio(audio_bytes, file_name, engine)
+
+def transcribe_in_parallel(chunks, engine=None, max_workers=STT_SPLIT_MAX_WORKERS):
+    """
+    Transcribe recording chunks concurrently and stitch the text back in order.
+
+    Args:
+        chunks (list): (chunk, overlaps_previous) tuples from ``split_recording``.
+
+    Chunks that fail are retried once.
+
+    Returns:
+        str: The merged transcript, or None if a chunk failed again.
+    """
+    increment("stt.split_chunks", len(chunks))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        texts = list(executor.map(lambda chunk: transcribe_chunk(chunk[0], engine), chunks))
+        failed = [index for index, text in enumerate(texts) if text is None]
+        if failed:
+            increment("stt.split_retries", len(failed))
+            retried = executor.map(lambda index: transcribe_chunk(chunks[index][0], engine), failed)
+            for index, text in zip(failed, retried):
+                texts[index] = text
+    if any(text is None for text in texts):
+        return None
+    return merge_transcripts(texts, [overlaps_previous for _, overlaps_previous in chunks])
+
+def transcribe_recording(segment, engine=None, split=False):
+    """
+    Preprocess a recording and convert it to text.
+
+    Args:
+        segment (AudioSegment): The raw recording from the audio recorder.
+        engine (TurnEngine, optional): Transcribe on the turn engine.
+        split (bool): Split recordings longer than ``STT_SPLIT_MIN_DURATION_MS``
+            at pauses and transcribe the chunks concurrently. If a chunk keeps
+            failing the whole recording is transcribed in one request instead.
+
+    Returns:
+        str: Text extracted from the recording, or None on error.
+    """
+    with timed("stt.end_to_end"):
+        prepared = prepare_recording(segment)
+        if split and len(prepared) > STT_SPLIT_MIN_DURATION_MS:
+            text = transcribe_in_parallel(split_recording(prepared), engine)
+            if text is not None:
+                return text
+            increment("stt.split_fallbacks")
+        return transcribe_chunk(prepared, engine)
+
+def get_audio_cache_key(text):
+    return AudioCache.make_key(text, TTS_MODEL, TTS_VOICE, TTS_RESPONSE_FORMAT)
+
+def is_audio_cached(text):
+    return get_audio_cache_key(text) in audio_cache
+
+def synthesize_speech(text, cache=True):
+    """
+    Synthesize speech for the given text using OpenAI's TTS API.
+
+    Results are served from the audio cache when the same text was
+    synthesized before with the same model, voice and format.
+
+    Args:
+        text (str): Text to be converted to audio.
+        cache (bool): Store newly synthesized audio in the audio cache.
+
+    Returns:
+        bytes: The synthesized audio, encoded as ``TTS_RESPONSE_FORMAT``.
+    """
+    cache_key = get_audio_cache_key(text)
+    audio_bytes = audio_cache.get(cache_key)
+    if audio_bytes is None:
+        with timed("tts.synthesis"):
+            response = openai_client.audio.speech.create(model=TTS_MODEL,
+                                                         voice=TTS_VOICE,
+                                                         input=text,
+                                                         response_format=TTS_RESPONSE_FORMAT)
+            audio_bytes = response.content
+        if cache:
+            audio_cache.put(cache_key, audio_bytes)
+    return audio_bytes
+
+def warm_up_audio_cache(texts=CACHED_AUDIO_PHRASES, max_workers=TTS_STREAMING_MAX_WORKERS):
+    """
+    Synthesize the given phrases into the audio cache if they are missing.
+
+    Args:
+        texts (list): Phrases to warm up.
+        max_workers (int): Maximum number of concurrent TTS requests.
+    """
+    missing_texts = [text for text in texts if not is_audio_cached(text)]
+    if not missing_texts:
+        return
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(synthesize_speech, text) for text in missing_texts]
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                print("Error warming up audio cache:", e)
+
+async def synthesize_speech_async(text, cache=True):
+    """
+    Async version of ``synthesize_speech`` for the turn engine.
+    """
+    cache_key = get_audio_cache_key(text)
+    audio_bytes = audio_cache.get(cache_key)
+    if audio_bytes is None:
+        with timed("tts.synthesis"):
+            response = await async_openai_client.audio.speech.create(model=TTS_MODEL,
+                                                                     voice=TTS_VOICE,
+                                                                     input=text,
+                                                                     response_format=TTS_RESPONSE_FORMAT)
+            audio_bytes = response.content
+        if cache:
+            audio_cache.put(cache_key, audio_bytes)
+    return audio_bytes
+
+async def convert_text_to_audio_async(text, output_file_path):
+    """
+    Async version of ``convert_text_to_audio`` for the turn engine.
+
+    Errors are left to the caller, which decides whether to attach the audio.
+    """
+    audio_bytes = await synthesize_speech_async(text)
+    with open(output_file_path, "wb") as audio_file:
+        audio_file.write(audio_bytes)
+
 def convert_text_to_audio(text, output_file_path):
     """ 
     COnvert text to audio using OpenAI's Whisper API.
@@ -34,9 +325,85 @@ def convert_text_to_audio(text, output_file_path):
         None
     """
     try:
-        response = openai_client.audio.speech.create(model="tts-1",
-                                                     voice="onyx",
-                                                         input=text)
-        response.write_to_file(output_file_path)
+        audio_bytes = synthesize_speech(text)
+        with open(output_file_path, "wb") as audio_file:
+            audio_file.write(audio_bytes)
+    except Exception as e:
+        print("Error converting text to audio:", e)
+
+def split_into_sentences(text, min_chars=TTS_STREAMING_MIN_SENTENCE_CHARS):
+    """
+    Split text into sentences for streaming synthesis.
+
+    Very short sentences (greetings, list markers) are merged with the
+    following one so that each TTS request carries a useful amount of text.
+
+    Args:
+        text (str): Text to split.
+        min_chars (int): Minimum length of a sentence sent on its own.
+
+    Returns:
+        list: The sentences, in order.
+    """
+    sentences = []
+    pending = ""
+    for sentence in SENTENCE_BOUNDARY_PATTERN.split(text.strip()):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        pending = f"{pending} {sentence}" if pending else sentence
+        if len(pending) >= min_chars:
+            sentences.append(pending)
+            pending = ""
+    if pending:
+        sentences.append(pending)
+    return sentences
+
+def stream_text_to_audio(text, output, max_workers=TTS_STREAMING_MAX_WORKERS):
+    """
+    Convert text to audio sentence by sentence.
+
+    Sentences are synthesized concurrently by a bounded worker pool and
+    yielded in order as soon as each one is ready, so playback of the first
+    sentence can start while later ones are still being generated. Once all
+    sentences are done the stitched clip is written to ``output`` and stored in
+    the audio cache under the whole text, so the same reply is not split again.
+    Individual sentences are only read from the cache, never added to it.
+
+    Args:
+        text (str): Text to be converted to audio.
+        output (str or file): Path or binary buffer to write the stitched audio to.
+        max_workers (int): Maximum number of concurrent TTS requests.
+
+    Yields:
+        bytes: The audio of each sentence.
+    """
+    sentences = split_into_sentences(text)
+    if not sentences:
+        return
+
+    stitched_audio = AudioSegment.empty()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(synthesize_speech, sentence, False) for sentence in sentences]
+        for future in futures:
+            try:
+                audio_bytes = future.result()
+                segment = AudioSegment.from_file(BytesIO(audio_bytes), format=TTS_CONTAINER_FORMAT)
+            except Exception as e:
+                print("Error converting text to audio:", e)
+                continue
+            stitched_audio += segment
+            yield audio_bytes
+
+    try:
+        if len(stitched_audio) > 0:
+            buffer = BytesIO()
+            stitched_audio.export(buffer, format=TTS_CONTAINER_FORMAT)
+            audio_cache.put(get_audio_cache_key(text), buffer.getvalue())
+            if isinstance(output, str):
+                with open(output, "wb") as audio_file:
+                    audio_file.write(buffer.getvalue())
+            else:
+                output.write(buffer.getvalue())
     except Exception as e:
-        print("Error converting text to audio:", e)
\ No newline at end of file
+        print("Error saving streamed audio:", e)
@@ -0,0 +1,109 @@
+"""
+Helpers shared by the benchmark scripts.
+"""
+import hashlib
+import os
+import re
+import sys
+import threading
+
+import numpy as np
+import tiktoken
+from langchain_core.embeddings import Embeddings
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+# A word or punctuation mark with the whitespace before it, or trailing whitespace
+WORD_PIECE_PATTERN = re.compile(r"\s*(?:\w+|[^\w\s])|\s+$")
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic bag-of-words embeddings for running benchmarks without an API key.
+
+    Not a substitute for a real embedding model when judging answer quality,
+    but good enough to compare chunking settings and retriever backends
+    against each other offline.
+    """
+
+    def __init__(self, dimensions=512):
+        self.dimensions = dimensions
+
+    def _embed(self, text):
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in TOKEN_PATTERN.findall(text.lower()):
+            bucket = int.from_bytes(hashlib.md5(token.encode()).digest()[:4], "little")
+            vector[bucket % self.dimensions] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+def get_embeddings(offline):
+    if offline:
+        return HashingEmbeddings()
+    from langchain_community.embeddings import OpenAIEmbeddings
+
+    from constants import EMBEDDING_MODEL
+    return OpenAIEmbeddings(api_key=os.getenv("OPENAI_API_KEY"), model=EMBEDDING_MODEL)
+
+
+def normalize_text(text):
+    return " ".join(TOKEN_PATTERN.findall(text.lower()))
+
+
+class WordEncoding:
+    """
+    Offline stand-in for a tiktoken encoding: one token per word or punctuation mark.
+
+    Token counts are close to the real encoding for English text and to the
+    stub server's counts, and decoding is lossless, which covers what the app
+    uses an encoding for: counting, truncating, chunking and embedding input.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._ids = {}
+        self._pieces = []
+        self._lock = threading.Lock()
+
+    def encode_ordinary(self, text):
+        ids = []
+        with self._lock:
+            for piece in WORD_PIECE_PATTERN.findall(text):
+                if piece not in self._ids:
+                    self._ids[piece] = len(self._pieces)
+                    self._pieces.append(piece)
+                ids.append(self._ids[piece])
+        return ids
+
+    def encode(self, text, allowed_special=frozenset(), disallowed_special="all"):
+        return self.encode_ordinary(text)
+
+    def decode(self, tokens):
+        return "".join(self._pieces[token] for token in tokens)
+
+
+def use_offline_encoding_fallback():
+    """
+    Register a ``WordEncoding`` as the app's tokenizer if tiktoken cannot load it.
+
+    tiktoken downloads its encodings on first use; without network access and
+    without the file under TIKTOKEN_CACHE_DIR, loading it fails.
+    """
+    from constants import TOKENIZER_ENCODING
+    try:
+        tiktoken.get_encoding(TOKENIZER_ENCODING)
+    except Exception as e:
+        print(f"Could not load the {TOKENIZER_ENCODING} encoding, counting words as tokens instead:", e)
+        tiktoken.registry.ENCODINGS[TOKENIZER_ENCODING] = WordEncoding(TOKENIZER_ENCODING)
@@ -0,0 +1,87 @@
+"""
+Compare the local phone number / first name extractor with the LLM extractor.
+
+Runs every input of the extraction corpus through the local extractor, with
+a customer index built from the corpus itself, and reports how many inputs
+are decided locally, their accuracy and latency. With ``--with-llm`` the LLM
+extractor (requires OPENAI_API_KEY) is run on the same inputs for comparison.
+
+Usage:
+    python benchmarks/extraction_benchmark.py [--with-llm] [--corpus path.csv]
+"""
+import argparse
+import csv
+import os
+import time
+
+import pandas as pd
+from common import DATA_DIR
+
+from metrics import percentile  # noqa: E402
+
+DEFAULT_CORPUS = os.path.join(DATA_DIR, "extraction_corpus.csv")
+
+
+def load_corpus(path):
+    with open(path, newline="") as corpus_file:
+        return [(row["input"], row["phone_number"], row["first_name"]) for row in csv.DictReader(corpus_file)]
+
+
+def build_corpus_index(corpus):
+    from validation_agent import UserIndex
+
+    user_data = pd.DataFrame({
+        "ID": range(len(corpus)),
+        "PhoneNumber": [phone_number for _, phone_number, _ in corpus],
+        "FirstName": [first_name.title() for _, _, first_name in corpus],
+        "MothersMaidenName": "",
+        "FirstElementarySchoolName": "",
+        "FirstPetName": "",
+    })
+    return UserIndex(user_data)
+
+
+def report(label, results, latencies):
+    decided = [result for result in results if result[0] is not None]
+    correct = [result for result in decided if result[0] == result[1]]
+    print(f"{label}:")
+    print(f"  decided:  {len(decided)} / {len(results)}")
+    print(f"  accuracy: {len(correct) / len(decided):.0%}" if decided else "  accuracy: n/a")
+    print(f"  latency p50/p95: {percentile(latencies, 50) * 1000:.3f} ms / {percentile(latencies, 95) * 1000:.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--with-llm", action="store_true", help="Also run the LLM extractor")
+    args = parser.parse_args()
+
+    from validation_agent import extract_user_info_locally, extract_user_info_with_llm, normalize_phone_number
+
+    corpus = load_corpus(args.corpus)
+    user_index = build_corpus_index(corpus)
+
+    for label, index in (("Local (patterns only)", None), ("Local (with customer index)", user_index)):
+        results, latencies = [], []
+        for user_input, phone_number, first_name in corpus:
+            started = time.perf_counter()
+            extracted = extract_user_info_locally(user_input, index)
+            latencies.append(time.perf_counter() - started)
+            results.append((extracted, (phone_number, first_name)))
+            if extracted != (phone_number, first_name):
+                print(f"  {label}: {user_input!r} -> {extracted}")
+        report(label, results, latencies)
+
+    if args.with_llm:
+        results, latencies = [], []
+        for user_input, phone_number, first_name in corpus:
+            started = time.perf_counter()
+            extracted_phone, extracted_name = extract_user_info_with_llm(user_input)
+            latencies.append(time.perf_counter() - started)
+            extracted = (normalize_phone_number(extracted_phone), extracted_name) if extracted_phone else None
+            results.append((extracted, (phone_number, first_name)))
+        report("LLM", results, latencies)
+
+
+if __name__ == "__main__":
+    main()
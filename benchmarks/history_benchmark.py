@@ -0,0 +1,86 @@
+"""
+Measure Streamlit rerun time against conversation length for the chat history.
+
+A conversation of N turns (a user message and an assistant reply with audio
+in the in-memory audio store) is rendered with Streamlit's AppTest, once by
+rendering every message with its audio player (the previous behaviour) and
+once with ``chat_interface.render_chat_history``. The script reports the p50
+rerun time, the number of rendered chat messages and the audio bytes sent to
+the browser per rerun.
+
+Usage:
+    python benchmarks/history_benchmark.py [--turns 10,50,100,200] [--runs 5]
+"""
+import argparse
+import os
+import time
+
+from common import REPO_ROOT
+from streamlit.testing.v1 import AppTest
+
+from metrics import percentile  # noqa: E402
+
+# Roughly 10 s of speech at the TTS bitrate
+REPLY_AUDIO_BYTES = 40 * 1024
+
+
+def history_app():
+    import streamlit as st
+
+    from chat_history import ChatHistory, ChatMessage
+    from chat_interface import get_audio_store, render_audio, render_chat_history
+
+    if "messages" not in st.session_state:
+        st.session_state.messages = ChatHistory()
+        for turn in range(st.session_state.benchmark_turns):
+            st.session_state.messages.append(ChatMessage("user", f"Question number {turn} about my **account**?"))
+            audio_key = f"message{len(st.session_state.messages)}"
+            get_audio_store().put(audio_key, bytes([turn % 256]) * st.session_state.benchmark_audio_bytes)
+            st.session_state.messages.append(ChatMessage("assistant", f"Answer number {turn}. " * 20,
+                                                         audio_key=audio_key))
+
+    if st.session_state.benchmark_mode == "full":
+        for message in st.session_state.messages:
+            with st.chat_message(message.role):
+                st.markdown(message.content)
+                render_audio(st, message.audio_file_name, message.audio_key)
+    else:
+        render_chat_history()
+
+
+def measure(turns, mode, runs):
+    app = AppTest.from_function(history_app, default_timeout=120)
+    app.session_state["benchmark_turns"] = turns
+    app.session_state["benchmark_mode"] = mode
+    app.session_state["benchmark_audio_bytes"] = REPLY_AUDIO_BYTES
+    app.run()
+
+    rerun_times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        app.run()
+        rerun_times.append(time.perf_counter() - started)
+    rendered_messages = len(app.chat_message)
+    return percentile(rerun_times, 50), rendered_messages, len(app.get("audio")) * REPLY_AUDIO_BYTES
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", default="10,50,100,200", help="Comma separated conversation lengths in turns")
+    parser.add_argument("--runs", type=int, default=5, help="Reruns measured per configuration")
+    args = parser.parse_args()
+
+    os.chdir(REPO_ROOT)
+    # The app creates its model clients at import time; no API calls are made
+    for name in ("OPENAI_API_KEY", "AZURE_OPENAI_API_KEY"):
+        os.environ.setdefault(name, "unused")
+    os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://unused")
+    print(f"{'turns':>6} {'mode':>9} {'rerun p50':>10} {'messages':>9} {'audio KB':>9}")
+    for turns in (int(value) for value in args.turns.split(",")):
+        for mode in ("full", "windowed"):
+            rerun_p50, rendered_messages, audio_bytes = measure(turns, mode, args.runs)
+            print(f"{turns:>6} {mode:>9} {rerun_p50 * 1000:>7.0f} ms {rendered_messages:>9} {audio_bytes / 1024:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Compare chunking and retrieval settings on a labeled Q&A set.
+
+For every combination of chunk size, overlap and k the knowledge base is
+split with the token-aware splitter, indexed into an in-memory Chroma
+collection and queried with each question. A question is a hit when the
+expected answer text appears in one of the retrieved chunks.
+
+Reports chunk count, index size, ingestion time, query latency and hit rate.
+Use ``--offline`` to run with local hashing embeddings instead of OpenAI;
+words are counted as tokens if the tokenizer cannot be downloaded.
+
+Usage:
+    python benchmarks/retrieval_benchmark.py [--offline] [--chunk-sizes 100 200 400]
+        [--overlaps 0 20 50] [--k 3 5] [--documents a.txt b.txt] [--qa qa.csv]
+"""
+import argparse
+import csv
+import itertools
+import os
+import time
+import uuid
+
+from common import DATA_DIR, get_embeddings, normalize_text, use_offline_encoding_fallback
+
+from langchain_community.vectorstores import Chroma  # noqa: E402
+
+from metrics import percentile  # noqa: E402
+from vector_store import get_text_splitter  # noqa: E402
+
+
+def load_qa(path):
+    with open(path, newline="") as qa_file:
+        return [(row["question"], row["answer"]) for row in csv.DictReader(qa_file)]
+
+
+def run_setting(documents, qa_pairs, embeddings, chunk_size, chunk_overlap, k):
+    started = time.perf_counter()
+    chunks = get_text_splitter(chunk_size, chunk_overlap).create_documents(documents)
+    db = Chroma.from_documents(chunks, embeddings, collection_name=f"benchmark-{uuid.uuid4().hex}")
+    ingestion_seconds = time.perf_counter() - started
+
+    dimensions = len(embeddings.embed_query("dimension probe"))
+    index_bytes = len(chunks) * dimensions * 4 + sum(len(chunk.page_content.encode()) for chunk in chunks)
+
+    latencies = []
+    hits = 0
+    for question, answer in qa_pairs:
+        started = time.perf_counter()
+        retrieved = db.similarity_search(question, k=k)
+        latencies.append(time.perf_counter() - started)
+        retrieved_text = normalize_text(" ".join(doc.page_content for doc in retrieved))
+        hits += normalize_text(answer) in retrieved_text
+
+    db.delete_collection()
+    return {
+        "chunks": len(chunks),
+        "index_kb": index_bytes / 1024,
+        "ingestion_ms": ingestion_seconds * 1000,
+        "query_p50_ms": percentile(latencies, 50) * 1000,
+        "query_p95_ms": percentile(latencies, 95) * 1000,
+        "hit_rate": hits / len(qa_pairs),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", nargs="+", default=[os.path.join(DATA_DIR, "knowledge_base.txt")])
+    parser.add_argument("--qa", default=os.path.join(DATA_DIR, "retrieval_qa.csv"))
+    parser.add_argument("--chunk-sizes", nargs="+", type=int, default=[50, 100, 200, 400])
+    parser.add_argument("--overlaps", nargs="+", type=int, default=[0, 20])
+    parser.add_argument("--k", nargs="+", type=int, default=[3, 5])
+    parser.add_argument("--offline", action="store_true", help="Use local hashing embeddings")
+    args = parser.parse_args()
+    if args.offline:
+        use_offline_encoding_fallback()
+
+    documents = []
+    for path in args.documents:
+        with open(path) as document_file:
+            documents.append(document_file.read())
+    qa_pairs = load_qa(args.qa)
+    embeddings = get_embeddings(args.offline)
+
+    header = f"{'size':>5} {'overlap':>7} {'k':>3} {'chunks':>7} {'index KB':>9} {'ingest ms':>10} {'q p50 ms':>9} {'q p95 ms':>9} {'hit rate':>9}"
+    print(header)
+    print("-" * len(header))
+    for chunk_size, chunk_overlap, k in itertools.product(args.chunk_sizes, args.overlaps, args.k):
+        if chunk_overlap >= chunk_size:
+            continue
+        result = run_setting(documents, qa_pairs, embeddings, chunk_size, chunk_overlap, k)
+        print(f"{chunk_size:>5} {chunk_overlap:>7} {k:>3} {result['chunks']:>7} {result['index_kb']:>9.1f} "
+              f"{result['ingestion_ms']:>10.1f} {result['query_p50_ms']:>9.2f} {result['query_p95_ms']:>9.2f} "
+              f"{result['hit_rate']:>9.0%}")
+
+
+if __name__ == "__main__":
+    main()
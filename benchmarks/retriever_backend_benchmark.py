@@ -0,0 +1,132 @@
+"""
+Compare the in-process retriever backends (BM25, NumPy vectors, hybrid) with Chroma.
+
+The knowledge base is split once with the app's token-aware splitter. Each
+backend then indexes the chunks and answers every question of the labeled
+Q&A set. The script reports build time, query latency, the memory allocated
+while building the index, embedding API calls per query and hit rate (the
+expected answer appears in a retrieved chunk).
+
+``--embedding-latency`` adds a fixed delay to every embedding call, to model
+the API round trip that BM25 avoids at query time. Use ``--offline`` to run
+with local hashing embeddings instead of OpenAI; words are counted as tokens
+if the tokenizer cannot be downloaded.
+
+Usage:
+    python benchmarks/retriever_backend_benchmark.py [--offline] [--embedding-latency 150]
+        [--chunk-size 200] [--k 5] [--documents a.txt b.txt] [--qa qa.csv] [--copies 20]
+"""
+import argparse
+import os
+import time
+import tracemalloc
+import uuid
+
+from common import DATA_DIR, get_embeddings, normalize_text, use_offline_encoding_fallback
+
+from langchain_community.vectorstores import Chroma  # noqa: E402
+from langchain_core.documents import Document  # noqa: E402
+from langchain_core.embeddings import Embeddings  # noqa: E402
+
+from metrics import percentile  # noqa: E402
+from retrievers import InMemoryRetriever, build_index  # noqa: E402
+from retrieval_benchmark import load_qa  # noqa: E402
+from vector_store import get_text_splitter  # noqa: E402
+
+
+class CountingEmbeddings(Embeddings):
+    """
+    Wraps an embedding model, counting calls and adding a fixed latency per call.
+    """
+
+    def __init__(self, embeddings, latency_seconds):
+        self.embeddings = embeddings
+        self.latency_seconds = latency_seconds
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        time.sleep(self.latency_seconds)
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        self.calls += 1
+        time.sleep(self.latency_seconds)
+        return self.embeddings.embed_query(text)
+
+
+def build_retriever(backend, chunks, embeddings, k):
+    if backend == "chroma":
+        db = Chroma.from_documents(chunks, embeddings, collection_name=f"benchmark-{uuid.uuid4().hex}")
+        return db.as_retriever(search_kwargs={"k": k}), db.delete_collection
+    return InMemoryRetriever(index=build_index(chunks, backend, embeddings), k=k), None
+
+
+def run_backend(backend, chunks, qa_pairs, embeddings, k):
+    tracemalloc.start()
+    started = time.perf_counter()
+    retriever, cleanup = build_retriever(backend, chunks, embeddings, k)
+    build_seconds = time.perf_counter() - started
+    _, build_peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    embeddings.calls = 0
+    latencies = []
+    hits = 0
+    for question, answer in qa_pairs:
+        started = time.perf_counter()
+        retrieved = retriever.invoke(question)
+        latencies.append(time.perf_counter() - started)
+        retrieved_text = normalize_text(" ".join(doc.page_content for doc in retrieved))
+        hits += normalize_text(answer) in retrieved_text
+
+    if cleanup:
+        cleanup()
+    return {
+        "build_ms": build_seconds * 1000,
+        "memory_kb": build_peak_bytes / 1024,
+        "query_p50_ms": percentile(latencies, 50) * 1000,
+        "query_p95_ms": percentile(latencies, 95) * 1000,
+        "calls_per_query": embeddings.calls / len(qa_pairs),
+        "hit_rate": hits / len(qa_pairs),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", nargs="+", default=[os.path.join(DATA_DIR, "knowledge_base.txt")])
+    parser.add_argument("--qa", default=os.path.join(DATA_DIR, "retrieval_qa.csv"))
+    parser.add_argument("--chunk-size", type=int, default=200)
+    parser.add_argument("--chunk-overlap", type=int, default=20)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--copies", type=int, default=1,
+                        help="Index the documents this many times to model a larger corpus")
+    parser.add_argument("--embedding-latency", type=float, default=0, help="Milliseconds added per embedding call")
+    parser.add_argument("--offline", action="store_true", help="Use local hashing embeddings")
+    args = parser.parse_args()
+    if args.offline:
+        use_offline_encoding_fallback()
+
+    documents = []
+    for path in args.documents:
+        with open(path) as document_file:
+            documents.append(document_file.read())
+    chunks = get_text_splitter(args.chunk_size, args.chunk_overlap).create_documents(documents)
+    chunks = [Document(page_content=chunk.page_content, metadata={"copy": copy})
+              for copy in range(args.copies) for chunk in chunks]
+    qa_pairs = load_qa(args.qa)
+    embeddings = CountingEmbeddings(get_embeddings(args.offline), args.embedding_latency / 1000)
+
+    print(f"{len(chunks)} chunks, k={args.k}, {args.embedding_latency:.0f} ms per embedding call")
+    header = (f"{'backend':>8} {'build ms':>9} {'memory KB':>10} {'q p50 ms':>9} {'q p95 ms':>9} "
+              f"{'API calls/q':>12} {'hit rate':>9}")
+    print(header)
+    print("-" * len(header))
+    for backend in ("chroma", "bm25", "vector", "hybrid"):
+        result = run_backend(backend, chunks, qa_pairs, embeddings, args.k)
+        print(f"{backend:>8} {result['build_ms']:>9.1f} {result['memory_kb']:>10.0f} {result['query_p50_ms']:>9.2f} "
+              f"{result['query_p95_ms']:>9.2f} {result['calls_per_query']:>12.1f} {result['hit_rate']:>9.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmark the local intent router against the labeled query set.
+
+Reports local accuracy, how many queries are decided without the LLM and the
+per-query classification latency. With ``--with-llm`` every query is also
+sent to the LLM router (requires OPENAI_API_KEY) to report agreement.
+
+Usage:
+    python benchmarks/router_benchmark.py [--with-llm] [--queries path.csv]
+"""
+import argparse
+import csv
+import os
+import time
+
+from common import DATA_DIR
+
+from intent_classifier import classify_normalized_query, normalize_query  # noqa: E402
+from metrics import percentile  # noqa: E402
+
+DEFAULT_QUERIES = os.path.join(DATA_DIR, "router_queries.csv")
+
+
+def load_queries(path):
+    with open(path, newline="") as queries_file:
+        return [(row["query"], row["label"]) for row in csv.DictReader(queries_file)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", default=DEFAULT_QUERIES)
+    parser.add_argument("--with-llm", action="store_true", help="Also query the LLM router for agreement")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries)
+    latencies = []
+    results = []
+    for query, label in queries:
+        classify_normalized_query.cache_clear()
+        started = time.perf_counter()
+        route, confidence, is_confident = classify_normalized_query(normalize_query(query))
+        latencies.append(time.perf_counter() - started)
+        results.append((query, label, route, is_confident))
+
+    confident = [result for result in results if result[3]]
+    print(f"Queries:               {len(results)}")
+    print(f"Decided locally:       {len(confident)} ({len(confident) / len(results):.0%})")
+    print(f"Local accuracy (all):  {sum(r[1] == r[2] for r in results) / len(results):.0%}")
+    if confident:
+        print(f"Local accuracy (conf): {sum(r[1] == r[2] for r in confident) / len(confident):.0%}")
+    print(f"Latency p50/p99:       {percentile(latencies, 50) * 1e6:.1f} us / {percentile(latencies, 99) * 1e6:.1f} us")
+
+    for query, label, route, is_confident in results:
+        if route != label:
+            print(f"  miss{' (confident)' if is_confident else ''}: {query!r} -> {route}, expected {label}")
+
+    if args.with_llm:
+        from router_agent import llm_router_agent
+
+        llm_routes = [llm_router_agent(query) for query, _ in queries]
+        agreement = [r[2] == llm for r, llm in zip(results, llm_routes)]
+        confident_agreement = [agree for r, agree in zip(results, agreement) if r[3]]
+        print(f"LLM accuracy:          {sum(llm == r[1] for r, llm in zip(results, llm_routes)) / len(results):.0%}")
+        print(f"Agreement with LLM:    {sum(agreement) / len(agreement):.0%}")
+        if confident_agreement:
+            print(f"Agreement (confident): {sum(confident_agreement) / len(confident_agreement):.0%}")
+
+
+if __name__ == "__main__":
+    main()
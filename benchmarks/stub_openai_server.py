@@ -0,0 +1,428 @@
+"""
+Local stand-in for the OpenAI API, used by the benchmarks to measure the app
+without network access or an API key.
+
+Each endpoint sleeps for a configurable, deterministic latency before
+answering so that client-side changes (parallelism, smaller uploads, shorter
+prompts) show up in the timings the same way they would against the real API.
+Requests, approximate tokens and bytes are counted per endpoint, see
+``get_stub_usage``.
+
+Supported endpoints:
+    POST /v1/chat/completions - answers the app's prompts (router, extraction,
+        answer validation, memory summary) with parseable responses and every
+        other prompt with text drawn from its context. Streaming is supported;
+        the first token arrives after a delay growing with the prompt size,
+        the others at a fixed token rate. Azure deployment paths ending in
+        /chat/completions are served the same way.
+    POST /v1/embeddings - deterministic bag-of-words vectors, so retrieval
+        over them is meaningful.
+    POST /v1/audio/speech - synthetic speech whose length follows the text.
+    POST /v1/audio/transcriptions - "transcribes" synthetic speech made by
+        ``make_speech`` (one tone burst per word, the pitch encodes the word).
+
+Usage:
+    python benchmarks/stub_openai_server.py [--port 8765]
+
+    Then point the app at it with OPENAI_BASE_URL=http://127.0.0.1:8765/v1
+"""
+import argparse
+import base64
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+import numpy as np
+from pydub import AudioSegment
+from pydub.generators import Sine
+from pydub.silence import detect_nonsilent
+
+WORD_BASE_FREQUENCY = 300
+WORD_FREQUENCY_STEP = 20
+WORD_VOCABULARY_SIZE = 40
+WORD_DURATION_MS = 350
+WORD_GAP_MS = 150
+SENTENCE_GAP_MS = 700
+EMBEDDING_DIMENSIONS = 256
+# Speech is sent at roughly this bitrate when the requested format cannot be encoded locally
+SPEECH_FALLBACK_KBPS = 64
+REPLY_SENTENCE_WORDS = 12
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+PHONE_PATTERN = re.compile(r"\+?\(?\d{3}\)?[\s.-]?\d{3}[\s.-]?\d{4}")
+PERSONAL_QUERY_PATTERN = re.compile(r"\b(my|me|i|order|orders|account|purchase|purchases|bought|refund)\b", re.IGNORECASE)
+
+
+class StubLatency:
+    """
+    Latency model of the stub endpoints, in seconds.
+
+    Attributes:
+        transcription_base (float): Fixed cost of a transcription request.
+        transcription_per_audio_second (float): Processing time per second of audio.
+        upload_kbps (float): Simulated client upload bandwidth, 0 for unlimited.
+        chat_base (float): Time to first token of an empty prompt.
+        chat_per_prompt_token (float): Time to first token added per prompt token.
+        chat_tokens_per_second (float): Generation rate after the first token.
+        chat_reply_tokens (int): Length of free-form answers in tokens.
+        embedding_base (float): Fixed cost of an embeddings request.
+        embedding_per_input (float): Time added per embedded text.
+        speech_base (float): Time to the first audio byte of a speech request.
+        speech_per_char (float): Time added per character of speech input.
+    """
+
+    def __init__(self, transcription_base=0.3, transcription_per_audio_second=0.05, upload_kbps=0,
+                 chat_base=0.3, chat_per_prompt_token=0.0002, chat_tokens_per_second=50, chat_reply_tokens=60,
+                 embedding_base=0.1, embedding_per_input=0.001, speech_base=0.4, speech_per_char=0.002):
+        self.transcription_base = transcription_base
+        self.transcription_per_audio_second = transcription_per_audio_second
+        self.upload_kbps = upload_kbps
+        self.chat_base = chat_base
+        self.chat_per_prompt_token = chat_per_prompt_token
+        self.chat_tokens_per_second = chat_tokens_per_second
+        self.chat_reply_tokens = chat_reply_tokens
+        self.embedding_base = embedding_base
+        self.embedding_per_input = embedding_per_input
+        self.speech_base = speech_base
+        self.speech_per_char = speech_per_char
+
+    def scaled(self, factor):
+        """
+        Return a copy with every delay multiplied by ``factor``.
+        """
+        latency = StubLatency(**vars(self))
+        for name, value in vars(self).items():
+            if name in ("upload_kbps", "chat_tokens_per_second"):
+                setattr(latency, name, value / factor if value else value)
+            elif name != "chat_reply_tokens":
+                setattr(latency, name, value * factor)
+        return latency
+
+    def upload_seconds(self, num_bytes):
+        return num_bytes * 8 / (self.upload_kbps * 1000) if self.upload_kbps else 0.0
+
+
+def word_for_index(index):
+    return f"word{index % WORD_VOCABULARY_SIZE}"
+
+
+def make_speech(num_words, sentence_length=8, frame_rate=44100, channels=2):
+    """
+    Build a synthetic recording: one tone burst per word, longer pauses between sentences.
+
+    Returns:
+        tuple: The AudioSegment and the expected transcript.
+    """
+    speech = AudioSegment.silent(500, frame_rate)
+    words = []
+    for index in range(num_words):
+        frequency = WORD_BASE_FREQUENCY + (index % WORD_VOCABULARY_SIZE) * WORD_FREQUENCY_STEP
+        speech += Sine(frequency, sample_rate=frame_rate).to_audio_segment(WORD_DURATION_MS).apply_gain(-6)
+        is_sentence_end = (index + 1) % sentence_length == 0
+        speech += AudioSegment.silent(SENTENCE_GAP_MS if is_sentence_end else WORD_GAP_MS, frame_rate)
+        words.append(word_for_index(index))
+    return speech.set_channels(channels), " ".join(words)
+
+
+def recognize_words(segment):
+    """
+    Decode the words of a ``make_speech`` recording from the pitch of each tone burst.
+    """
+    segment = segment.set_channels(1)
+    words = []
+    for start, end in detect_nonsilent(segment, min_silence_len=WORD_GAP_MS // 2, silence_thresh=-40, seek_step=5):
+        samples = np.array(segment[start:end].get_array_of_samples(), dtype=np.float64)
+        if len(samples) < 64:
+            continue
+        spectrum = np.abs(np.fft.rfft(samples * np.hanning(len(samples))))
+        frequency = np.argmax(spectrum) * segment.frame_rate / len(samples)
+        index = round((frequency - WORD_BASE_FREQUENCY) / WORD_FREQUENCY_STEP)
+        words.append(word_for_index(max(0, index)))
+    return " ".join(words)
+
+
+def parse_multipart(headers, body):
+    message = BytesParser(policy=HTTP).parsebytes(
+        f"Content-Type: {headers['Content-Type']}\r\n\r\n".encode() + body)
+    fields = {}
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        fields[name] = (part.get_filename(), part.get_payload(decode=True))
+    return fields
+
+
+_usage = defaultdict(lambda: defaultdict(int))
+_usage_lock = threading.Lock()
+
+
+def record_usage(endpoint, **amounts):
+    with _usage_lock:
+        for name, amount in amounts.items():
+            _usage[endpoint][name] += amount
+
+
+def get_stub_usage():
+    """
+    Return the usage served so far.
+
+    Returns:
+        dict: Endpoint (``chat``, ``embeddings``, ``speech``, ``transcriptions``)
+            -> requests, prompt_tokens, completion_tokens, bytes_in and bytes_out.
+    """
+    with _usage_lock:
+        return {endpoint: dict(amounts) for endpoint, amounts in _usage.items()}
+
+
+def count_tokens(text):
+    """
+    Approximate token count: words and punctuation marks.
+    """
+    return len(TOKEN_PATTERN.findall(text))
+
+
+def message_text(message):
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
+
+
+def write_answer(prompt, num_tokens):
+    """
+    Build a free-form answer of ``num_tokens`` words taken from the prompt's context.
+
+    Sentences are ``REPLY_SENTENCE_WORDS`` long, so the reply splits into
+    sentences for streaming speech like a real answer would.
+    """
+    context = prompt.rsplit("Context", 1)[-1]
+    words = re.findall(r"[A-Za-z][A-Za-z'-]*", context) or ["answer"]
+    offset = int(hashlib.md5(prompt.encode()).hexdigest(), 16) % len(words)
+    answer = [words[(offset + index) % len(words)] for index in range(num_tokens)]
+    sentences = [" ".join(answer[start:start + REPLY_SENTENCE_WORDS])
+                 for start in range(0, len(answer), REPLY_SENTENCE_WORDS)]
+    return " ".join(sentence[:1].upper() + sentence[1:] + "." for sentence in sentences)
+
+
+def reply_to_prompt(prompt, reply_tokens):
+    """
+    Answer a chat prompt of the app.
+
+    Prompts whose response the app parses get a well-formed response; any
+    other prompt gets ``reply_tokens`` words of text from its context.
+    """
+    if "determines which specialized agent" in prompt:
+        query = prompt.rsplit("Input Query:", 1)[-1]
+        if PERSONAL_QUERY_PATTERN.search(query):
+            return "Agent: personal_concierge_agent"
+        return "Agent: general_agent"
+    if "Extract the phone number and first name" in prompt:
+        phone_number = PHONE_PATTERN.search(prompt)
+        first_name = re.search(r"\b(?:name is|I am|I'm)\s+([A-Za-z]+)", prompt, re.IGNORECASE)
+        if not (phone_number and first_name):
+            return "no"
+        return f"Phone Number: {phone_number.group(0)}, First Name: {first_name.group(1)}"
+    if "Respond with only true or false" in prompt:
+        correct_answer = re.search(r"Correct answer:(.*)", prompt)
+        user_answer = re.search(r"User answer:(.*)", prompt)
+        matches = correct_answer and user_answer and \
+            correct_answer.group(1).strip().lower() == user_answer.group(1).strip().lower()
+        return "true" if matches else "false"
+    if "Update the summary of a conversation" in prompt:
+        return write_answer(prompt.rsplit("New turns:", 1)[-1], min(reply_tokens, 40))
+    return write_answer(prompt, reply_tokens)
+
+
+def embed_text(text):
+    """
+    Deterministic bag-of-words embedding; token ID lists are embedded by their IDs.
+    """
+    vector = np.zeros(EMBEDDING_DIMENSIONS, dtype=np.float32)
+    tokens = [str(token) for token in text] if isinstance(text, list) else re.findall(r"[a-z0-9]+", text.lower())
+    for token in tokens:
+        digest = hashlib.md5(token.encode()).digest()
+        vector[int.from_bytes(digest[:4], "little") % EMBEDDING_DIMENSIONS] += 1 if digest[4] & 1 else -1
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class StubOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = StubLatency()
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, body, content_type, status=200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return len(body)
+
+    def send_json(self, payload, status=200):
+        return self.send_body(json.dumps(payload).encode(), "application/json", status)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.latency.upload_seconds(len(body)))
+        path = self.path.split("?", 1)[0]
+        routes = {
+            "/chat/completions": self.handle_chat,
+            "/embeddings": self.handle_embeddings,
+            "/audio/speech": self.handle_speech,
+            "/audio/transcriptions": self.handle_transcription,
+        }
+        handler = next((handler for suffix, handler in routes.items() if path.endswith(suffix)), None)
+        if handler is None:
+            self.send_json({"error": {"message": f"Unknown endpoint {self.path}"}}, status=404)
+            return
+        handler(body)
+
+    def handle_chat(self, body):
+        request = json.loads(body)
+        prompt = "\n".join(message_text(message) for message in request.get("messages", []))
+        prompt_tokens = count_tokens(prompt)
+        reply = reply_to_prompt(prompt, self.latency.chat_reply_tokens)
+        pieces = re.findall(r"\s*\S+", reply)
+        model = request.get("model", "stub")
+        time.sleep(self.latency.chat_base + self.latency.chat_per_prompt_token * prompt_tokens)
+
+        if not request.get("stream"):
+            time.sleep(max(0, len(pieces) - 1) / self.latency.chat_tokens_per_second)
+            bytes_out = self.send_json({
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(pieces),
+                          "total_tokens": prompt_tokens + len(pieces)},
+            })
+        else:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            bytes_out = 0
+            deltas = [{"role": "assistant", "content": piece} for piece in pieces[:1]]
+            deltas += [{"content": piece} for piece in pieces[1:]]
+            for index, delta in enumerate(deltas + [{}]):
+                if 0 < index < len(deltas):
+                    time.sleep(1 / self.latency.chat_tokens_per_second)
+                chunk = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()),
+                         "model": model,
+                         "choices": [{"index": 0, "delta": delta, "finish_reason": None if delta else "stop"}]}
+                bytes_out += self.write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+            bytes_out += self.write_chunk(b"data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+
+        record_usage("chat", requests=1, prompt_tokens=prompt_tokens, completion_tokens=len(pieces),
+                     bytes_in=len(body), bytes_out=bytes_out)
+
+    def write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+        return len(data)
+
+    def handle_embeddings(self, body):
+        request = json.loads(body)
+        inputs = request["input"]
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        time.sleep(self.latency.embedding_base + self.latency.embedding_per_input * len(inputs))
+
+        data = []
+        prompt_tokens = 0
+        for index, text in enumerate(inputs):
+            vector = embed_text(text)
+            prompt_tokens += len(text) if isinstance(text, list) else count_tokens(text)
+            if request.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vector.astype(np.float32).tobytes()).decode()
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+        bytes_out = self.send_json({"object": "list", "data": data, "model": request.get("model", "stub"),
+                                    "usage": {"prompt_tokens": prompt_tokens, "total_tokens": prompt_tokens}})
+        record_usage("embeddings", requests=1, prompt_tokens=prompt_tokens, bytes_in=len(body), bytes_out=bytes_out)
+
+    def handle_speech(self, body):
+        request = json.loads(body)
+        text = request.get("input", "")
+        response_format = request.get("response_format", "mp3")
+        time.sleep(self.latency.speech_base + self.latency.speech_per_char * len(text))
+
+        speech, _ = make_speech(max(1, len(text.split())), channels=1)
+        try:
+            buffer = BytesIO()
+            speech.export(buffer, format={"opus": "ogg", "pcm": "raw"}.get(response_format, response_format))
+            audio_bytes = buffer.getvalue()
+        except Exception:
+            # No encoder for the format here (e.g. mp3 without ffmpeg): send bytes of a realistic size
+            audio_bytes = bytes(int(speech.duration_seconds * SPEECH_FALLBACK_KBPS * 1000 / 8))
+        bytes_out = self.send_body(audio_bytes, f"audio/{response_format}")
+        record_usage("speech", requests=1, prompt_tokens=count_tokens(text), bytes_in=len(body), bytes_out=bytes_out)
+
+    def handle_transcription(self, body):
+        file_name, audio_bytes = parse_multipart(self.headers, body)["file"]
+        segment = AudioSegment.from_file(BytesIO(audio_bytes), format=file_name.rsplit(".", 1)[-1])
+        time.sleep(self.latency.transcription_base
+                   + self.latency.transcription_per_audio_second * segment.duration_seconds)
+        text = recognize_words(segment)
+        bytes_out = self.send_json({"text": text})
+        record_usage("transcriptions", requests=1, completion_tokens=count_tokens(text), bytes_in=len(body),
+                     bytes_out=bytes_out)
+
+
+def start_stub_server(host="127.0.0.1", port=0, latency=None):
+    """
+    Start the stub server in a background thread.
+
+    Args:
+        host (str): Interface to bind.
+        port (int): Port to bind, 0 picks a free one.
+        latency (StubLatency, optional): Latency model, defaults to ``StubLatency()``.
+
+    Returns:
+        tuple: The server (call ``shutdown()`` to stop it) and its OpenAI base URL.
+    """
+    handler = type("ConfiguredStubOpenAIHandler", (StubOpenAIHandler,), {"latency": latency or StubLatency()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def use_stub_server(base_url):
+    """
+    Point the app's model clients at the stub server.
+
+    Must be called before the app modules are imported. Placeholder keys are
+    set for the clients the app creates at import time.
+    """
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    os.environ.setdefault("AZURE_OPENAI_API_KEY", "stub")
+    os.environ.setdefault("AZURE_OPENAI_ENDPOINT", base_url)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(args.host, args.port)
+    print(f"Stub OpenAI API listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
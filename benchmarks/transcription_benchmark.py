@@ -0,0 +1,76 @@
+"""
+Measure speech-to-text latency against clip length, with and without
+silence-split parallel transcription.
+
+Synthetic recordings of increasing length are transcribed through
+``audio_utils.transcribe_recording`` against the local stub OpenAI server
+(see ``stub_openai_server.py``), whose latency grows with the uploaded audio
+length and size. For every clip length the script reports the p50 latency of
+a single request and of the split mode, the number of chunks and the word
+accuracy of the stitched transcript.
+
+Usage:
+    python benchmarks/transcription_benchmark.py [--durations 10,30,60,120] [--repeats 3]
+"""
+import argparse
+import difflib
+import time
+
+from common import normalize_text
+from stub_openai_server import StubLatency, make_speech, start_stub_server, use_stub_server
+
+from metrics import percentile  # noqa: E402
+
+# Sentences of make_speech's default length take about 4.55 s for 8 words
+WORDS_PER_SECOND = 8 / 4.55
+
+
+def word_accuracy(expected, actual):
+    return difflib.SequenceMatcher(None, normalize_text(expected).split(), normalize_text(actual or "").split()).ratio()
+
+
+def measure(transcribe_recording, segment, expected, split, repeats):
+    latencies = []
+    accuracy = 0.0
+    for _ in range(repeats):
+        started = time.perf_counter()
+        text = transcribe_recording(segment, split=split)
+        latencies.append(time.perf_counter() - started)
+        accuracy = word_accuracy(expected, text)
+    return percentile(latencies, 50), accuracy
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--durations", default="10,30,60,120", help="Comma separated clip lengths in seconds")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--base-latency", type=float, default=0.3, help="Fixed seconds per transcription request")
+    parser.add_argument("--per-audio-second", type=float, default=0.05,
+                        help="Seconds of processing per second of uploaded audio")
+    parser.add_argument("--upload-kbps", type=float, default=2000, help="Simulated upload bandwidth, 0 for unlimited")
+    args = parser.parse_args()
+
+    latency = StubLatency(args.base_latency, args.per_audio_second, args.upload_kbps)
+    server, base_url = start_stub_server(latency=latency)
+    use_stub_server(base_url)
+
+    from audio_utils import prepare_recording, split_recording, transcribe_recording
+    from constants import STT_SPLIT_MIN_DURATION_MS
+
+    print(f"{'clip':>6} {'words':>6} {'single p50':>11} {'split p50':>10} {'chunks':>7} {'speedup':>8} "
+          f"{'acc single':>11} {'acc split':>10}")
+    for duration in (float(value) for value in args.durations.split(",")):
+        segment, expected = make_speech(round(duration * WORDS_PER_SECOND))
+        prepared = prepare_recording(segment)
+        chunks = len(split_recording(prepared)) if len(prepared) > STT_SPLIT_MIN_DURATION_MS else 1
+        single_p50, single_accuracy = measure(transcribe_recording, segment, expected, False, args.repeats)
+        split_p50, split_accuracy = measure(transcribe_recording, segment, expected, True, args.repeats)
+        print(f"{segment.duration_seconds:>5.0f}s {len(expected.split()):>6} {single_p50 * 1000:>8.0f} ms "
+              f"{split_p50 * 1000:>7.0f} ms {chunks:>7} {single_p50 / split_p50:>7.1f}x "
+              f"{single_accuracy:>11.0%} {split_accuracy:>10.0%}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""
+Measure the chat turn pipeline end to end against the local stub OpenAI server.
+
+Scripted conversations (``data/conversations.json``) are played through the
+app's turn handler in Streamlit's AppTest: routing, the general agent with
+retrieval, the validation stages, the personal agent, conversation memory and
+reply speech, and optionally speech-to-text of a synthetic recording per user
+turn. Every model call goes to ``stub_openai_server.py``, which answers with a
+deterministic, configurable latency, so no API key or network is needed.
+
+Reported:
+    - p50/p95/p99 per stage, from the app's own metrics, and per turn end to end
+    - prompt tokens, context tokens and memory tokens per prompt
+    - requests, approximate tokens and bytes per endpoint, and per turn
+
+The run starts from an empty temporary working directory, so the audio,
+embedding and answer caches start cold and the repository's caches are not
+touched. Caches persist across ``--repeat`` runs, as they would across
+sessions of one server.
+
+Pass ``--output`` to save the results as JSON and ``--baseline`` to compare a
+run with saved results: the script exits with status 1 when a stage's p95,
+the per-turn tokens or the per-turn bytes grew by more than ``--threshold``.
+
+``--sidebar`` renders the app's sidebar in every session and sets the options
+under test through its widgets, so all other settings are at their sidebar
+defaults (for example sentence-streamed reply audio and retrieval
+speculation). Otherwise the options are written to the session state and
+unset options fall back to the code defaults. Uploads cannot be driven from
+AppTest in either mode; the knowledge base and customer data are loaded
+directly.
+
+tiktoken downloads its encoding on first use. When that fails and
+TIKTOKEN_CACHE_DIR holds no copy, tokens are counted as words instead.
+
+Usage:
+    python benchmarks/turn_benchmark.py [--repeat 3] [--stream] [--turn-engine] [--stt] [--latency-scale 0.5]
+        [--sidebar] [--retriever-backend chroma] [--output results.json] [--baseline results.json] [--threshold 0.2]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from common import DATA_DIR, use_offline_encoding_fallback
+from streamlit.testing.v1 import AppTest
+from stub_openai_server import StubLatency, get_stub_usage, make_speech, start_stub_server, use_stub_server
+
+from constants import RETRIEVER_BACKENDS  # noqa: E402
+from metrics import get_counters, get_timing_stats, get_value_stats, percentile, reset_metrics  # noqa: E402
+
+SECURITY_ANSWER_PLACEHOLDER = "{security_answer}"
+PERCENTILES = (50, 95, 99)
+
+
+def turn_app():
+    import pandas as pd
+    import streamlit as st
+
+    from audio_utils import transcribe_recording
+    from chat_history import ChatHistory
+    from chat_interface import attach_pending_audio, get_active_turn_engine, handle_user_prompt, render_chat_history
+    from chat_utils import TransactionStore, get_retriever_from_documents
+    from validation_agent import build_user_index
+
+    config = st.session_state.benchmark_config
+    if config["sidebar"]:
+        from sidebar import configure_sidebar
+        configure_sidebar()
+
+    if "messages" not in st.session_state:
+        with open(config["knowledge_base"]) as document_file:
+            st.session_state.benchmark_retriever = get_retriever_from_documents([document_file.read()],
+                                                                                backend=config["retriever_backend"])
+        st.session_state.user_data = pd.read_csv(config["customers"])
+        st.session_state.user_index = build_user_index(st.session_state.user_data)
+        st.session_state.user_transactional_data = pd.read_csv(config["transactions"])
+        st.session_state.transaction_store = TransactionStore(st.session_state.user_transactional_data, version=1)
+
+        if not config["sidebar"]:
+            st.session_state.gpt_version = "4o"
+            st.session_state.general_agent_system_message = ""
+            st.session_state.personal_agent_system_message = ""
+            st.session_state.validation_agent_system_message = ""
+            st.session_state.retriever_backend = config["retriever_backend"]
+            st.session_state.stream_responses = config["stream"]
+            st.session_state.use_turn_engine = config["turn_engine"]
+            st.session_state.stt_split = config["stt_split"]
+
+        # Chat interface state, as set by render_chat_interface
+        st.session_state.is_user_validated = False
+        st.session_state.validation_stage = 0
+        st.session_state.prompt_user_for_phone_and_name = False
+        st.session_state.user_validation_invoked = False
+        st.session_state.user_id = None
+        st.session_state.max_attempts = 3
+        st.session_state.messages = ChatHistory()
+
+    # Stands in for the uploaded files; the sidebar drops the retrievers when it sees none
+    st.session_state.retriever = st.session_state.benchmark_retriever
+    st.session_state.personal_agent_retriever = st.session_state.benchmark_retriever
+
+    st.session_state.pending_audio = []
+    engine = get_active_turn_engine()
+    render_chat_history()
+
+    recording = st.session_state.pop("benchmark_recording", None)
+    if recording is not None:
+        transcribe_recording(recording, engine, st.session_state.stt_split)
+    prompt = st.session_state.pop("benchmark_prompt", None)
+    if prompt:
+        handle_user_prompt(prompt, engine)
+    attach_pending_audio()
+
+
+def usage_delta(before, after):
+    """
+    Return the tokens and bytes served between two ``get_stub_usage`` snapshots.
+    """
+    tokens = 0
+    num_bytes = 0
+    for endpoint, amounts in after.items():
+        previous = before.get(endpoint, {})
+        tokens += sum(amounts.get(name, 0) - previous.get(name, 0) for name in ("prompt_tokens", "completion_tokens"))
+        num_bytes += sum(amounts.get(name, 0) - previous.get(name, 0) for name in ("bytes_in", "bytes_out"))
+    return tokens, num_bytes
+
+
+def summarize(samples):
+    return {"count": len(samples), **{f"p{pct}": percentile(samples, pct) for pct in PERCENTILES}}
+
+
+def select_percentiles(stats):
+    return {"count": stats["count"], **{f"p{pct}": stats[f"p{pct}"] for pct in PERCENTILES}}
+
+
+def play_conversation(conversation, config, stt):
+    """
+    Play one scripted conversation in a new session.
+
+    Returns:
+        list: (seconds, tokens, bytes) per user turn.
+    """
+    app = AppTest.from_function(turn_app, default_timeout=600)
+    app.session_state["benchmark_config"] = config
+    app.run()
+    if config["sidebar"] and not app.exception:
+        app.sidebar.selectbox(key="retriever_backend").set_value(config["retriever_backend"])
+        app.sidebar.checkbox(key="stream_responses").set_value(config["stream"])
+        app.sidebar.checkbox(key="use_turn_engine").set_value(config["turn_engine"])
+        app.sidebar.checkbox(key="stt_split").set_value(config["stt_split"])
+        app.run()
+    if app.exception:
+        raise RuntimeError(f"Setting up the session failed: {app.exception[0].message}")
+
+    turns = []
+    for prompt in conversation["turns"]:
+        if prompt == SECURITY_ANSWER_PLACEHOLDER:
+            prompt = str(app.session_state["correct_answer"]) if "correct_answer" in app.session_state else "unknown"
+        if stt:
+            app.session_state["benchmark_recording"], _ = make_speech(len(prompt.split()))
+        app.session_state["benchmark_prompt"] = prompt
+
+        usage_before = get_stub_usage()
+        started = time.perf_counter()
+        app.run()
+        seconds = time.perf_counter() - started
+        if app.exception:
+            raise RuntimeError(f"Turn {prompt!r} failed: {app.exception[0].message}")
+        turns.append((seconds, *usage_delta(usage_before, get_stub_usage())))
+    return turns
+
+
+def run_benchmark(args):
+    with open(args.conversations) as conversations_file:
+        conversations = json.load(conversations_file)
+    config = {
+        "knowledge_base": args.knowledge_base,
+        "customers": args.customers,
+        "transactions": args.transactions,
+        "retriever_backend": args.retriever_backend,
+        "stream": args.stream,
+        "turn_engine": args.turn_engine,
+        "stt_split": args.stt_split,
+        "sidebar": args.sidebar,
+    }
+
+    reset_metrics()
+    turns = []
+    for _ in range(args.repeat):
+        for conversation in conversations:
+            turns.extend(play_conversation(conversation, config, args.stt or args.stt_split))
+
+    latency = {name: select_percentiles(stats) for name, stats in get_timing_stats().items()}
+    latency["turn.end_to_end"] = summarize([seconds for seconds, _, _ in turns])
+    return {
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "latency": latency,
+        "values": {name: select_percentiles(stats) for name, stats in get_value_stats().items()},
+        "per_turn": {
+            "tokens": summarize([tokens for _, tokens, _ in turns]),
+            "bytes": summarize([num_bytes for _, _, num_bytes in turns]),
+        },
+        "usage": get_stub_usage(),
+        "counters": get_counters(),
+    }
+
+
+def print_results(results):
+    print(f"{'stage':<36} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, stats in results["latency"].items():
+        print(f"{name:<36} {stats['count']:>6} {stats['p50'] * 1000:>9.1f} {stats['p95'] * 1000:>9.1f} "
+              f"{stats['p99'] * 1000:>9.1f}")
+
+    print(f"\n{'value':<36} {'count':>6} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for name, stats in list(results["values"].items()) + [(f"turn.{name}", stats)
+                                                          for name, stats in results["per_turn"].items()]:
+        print(f"{name:<36} {stats['count']:>6} {stats['p50']:>9.0f} {stats['p95']:>9.0f} {stats['p99']:>9.0f}")
+
+    print(f"\n{'endpoint':<16} {'requests':>9} {'prompt tok':>11} {'output tok':>11} {'KB in':>9} {'KB out':>9}")
+    for endpoint, amounts in sorted(results["usage"].items()):
+        print(f"{endpoint:<16} {amounts.get('requests', 0):>9} {amounts.get('prompt_tokens', 0):>11} "
+              f"{amounts.get('completion_tokens', 0):>11} {amounts.get('bytes_in', 0) / 1024:>9.1f} "
+              f"{amounts.get('bytes_out', 0) / 1024:>9.1f}")
+
+
+def find_regressions(results, baseline, threshold, min_delta_ms):
+    """
+    Compare results with a baseline run.
+
+    A stage regresses when its p95 grew by more than ``threshold`` (a
+    fraction) and by more than ``min_delta_ms``; the per-turn tokens and bytes
+    regress when their p50 grew by more than ``threshold``.
+
+    Returns:
+        list: Descriptions of the regressions.
+    """
+    regressions = []
+    for name, stats in results["latency"].items():
+        previous = baseline["latency"].get(name)
+        if not previous:
+            continue
+        if stats["p95"] > previous["p95"] * (1 + threshold) and (stats["p95"] - previous["p95"]) * 1000 > min_delta_ms:
+            regressions.append(f"{name}: p95 {previous['p95'] * 1000:.1f} ms -> {stats['p95'] * 1000:.1f} ms")
+    for name, stats in results["per_turn"].items():
+        previous = baseline["per_turn"].get(name)
+        if previous and stats["p50"] > previous["p50"] * (1 + threshold):
+            regressions.append(f"turn.{name}: p50 {previous['p50']:.0f} -> {stats['p50']:.0f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", default=os.path.join(DATA_DIR, "conversations.json"))
+    parser.add_argument("--knowledge-base", default=os.path.join(DATA_DIR, "knowledge_base.txt"))
+    parser.add_argument("--customers", default=os.path.join(DATA_DIR, "customers.csv"))
+    parser.add_argument("--transactions", default=os.path.join(DATA_DIR, "transactions.csv"))
+    parser.add_argument("--repeat", type=int, default=1, help="Times every conversation is played")
+    parser.add_argument("--retriever-backend", choices=RETRIEVER_BACKENDS, default="chroma")
+    parser.add_argument("--stream", action="store_true", help="Stream agent responses")
+    parser.add_argument("--turn-engine", action="store_true", help="Run model calls on the turn engine")
+    parser.add_argument("--sidebar", action="store_true", help="Set the options through the app's sidebar widgets")
+    parser.add_argument("--stt", action="store_true", help="Transcribe a synthetic recording before each user turn")
+    parser.add_argument("--stt-split", action="store_true", help="Like --stt, with split parallel transcription")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Multiply every stub delay by this factor")
+    parser.add_argument("--reply-tokens", type=int, default=60, help="Length of stub answers in tokens")
+    parser.add_argument("--output", help="Save the results as JSON")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative growth over the baseline")
+    parser.add_argument("--min-delta-ms", type=float, default=5, help="Ignore latency changes smaller than this")
+    args = parser.parse_args()
+
+    for option in ("conversations", "knowledge_base", "customers", "transactions", "output", "baseline"):
+        if getattr(args, option):
+            setattr(args, option, os.path.abspath(getattr(args, option)))
+
+    use_offline_encoding_fallback()
+    latency = StubLatency(chat_reply_tokens=args.reply_tokens).scaled(args.latency_scale)
+    server, base_url = start_stub_server(latency=latency)
+    use_stub_server(base_url)
+    os.chdir(tempfile.mkdtemp(prefix="turn-benchmark-"))
+    try:
+        results = run_benchmark(args)
+    finally:
+        server.shutdown()
+
+    print_results(results)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = find_regressions(results, json.load(baseline_file), args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions over {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
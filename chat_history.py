@@ -0,0 +1,44 @@
+from collections import namedtuple
+
+ChatMessage = namedtuple("ChatMessage", ["role", "content", "audio_file_name", "audio_key"], defaults=(None, None))
+
+
+class ChatHistory:
+    """
+    Conversation history of one session, stored as compact ChatMessage records.
+
+    Audio is referenced by file name or audio store key rather than embedded,
+    so a long history stays small; the chat interface decides which messages
+    get an audio player when it renders a window of the history.
+    """
+
+    def __init__(self):
+        self._messages = []
+
+    def __len__(self):
+        return len(self._messages)
+
+    def __iter__(self):
+        return iter(self._messages)
+
+    def append(self, message):
+        """
+        Add a message, given as a ChatMessage or as a dict with the same keys.
+        """
+        if isinstance(message, dict):
+            message = ChatMessage(message["role"], message["content"],
+                                  message.get("audio_file_name"), message.get("audio_key"))
+        self._messages.append(message)
+
+    def window(self, size):
+        """
+        Return the most recent messages.
+
+        Args:
+            size (int): Maximum number of messages to return.
+
+        Returns:
+            tuple: The index of the first returned message and the messages.
+        """
+        start = max(0, len(self._messages) - size)
+        return start, self._messages[start:]
@@ -1,72 +1,248 @@
 import streamlit as st
 import base64
+import json
+from io import BytesIO
 from audiorecorder import audiorecorder
-from pydub import AudioSegment
 
-from audio_utils import convert_audio_to_text, convert_text_to_audio
-from chat_utils import generate_personal_agent_response, generate_rag_response
-from constants import GREETING_MESSAGE
+from audio_store import AudioStore
+from audio_utils import TTS_MIME_TYPE, convert_text_to_audio, convert_text_to_audio_async, is_audio_cached, stream_text_to_audio, synthesize_speech, synthesize_speech_async, transcribe_recording
+from chat_history import ChatHistory, ChatMessage
+from chat_utils import build_general_agent_chain, cache_answer, get_context_token_budget, generate_personal_agent_response, generate_rag_response, invoke_chain, is_answer_cacheable, lookup_cached_answer, retrieve_context, stream_personal_agent_response, stream_rag_response
+from constants import DEFAULT_VALIDATION_INSTRUCTIONS, GREETING_MESSAGE, HISTORY_INLINE_AUDIO, HISTORY_WINDOW_SIZE, MAX_ATTEMPTS_REACHED_MESSAGE, PHONE_AND_NAME_MESSAGE, SECURITY_QUESTION_MESSAGE, TTS_RESPONSE_FORMAT, TURN_STAGE_TIMEOUTS, TURN_TIMEOUT_MESSAGE, UPLOAD_DATA_MESSAGE, USER_NOT_FOUND_MESSAGE, VALIDATION_SUCCESS_MESSAGE
+from conversation_memory import ConversationMemory, get_conversation_memory
 from file_utils import remove_all_files_in_folder
+from intent_classifier import classify_intent
 from router_agent import router_agent
-from validation_agent import extract_user_info, get_security_question, get_security_question_using_id, validate_security_question
+from speculation import SpeculativeTask
+from turn_engine import StageTimeoutError, get_turn_engine
+from validation_agent import extract_user_info, get_security_question, get_security_question_using_id, get_validation_policy, validate_security_question
 
-def add_message(role, content,audio_file_name=None):
-    st.session_state.messages.append({
-        "role": role,
-        "content": content,
-        "audio_file_name":audio_file_name if audio_file_name else None
-    })
+def get_active_turn_engine():
+    """
+    Return the shared turn engine when it is enabled for this session, else None.
+    """
+    if st.session_state.get("use_turn_engine", False):
+        return get_turn_engine()
+    return None
+
+def get_audio_store():
+    """
+    Return the bounded in-memory store holding this session's reply audio.
+    """
+    if "audio_store" not in st.session_state:
+        st.session_state.audio_store = AudioStore()
+    return st.session_state.audio_store
+
+def new_reply_audio_target():
+    """
+    Return where the audio of the next message is kept.
+
+    Returns:
+        tuple: (audio_file_name, audio_key), only one of which is set depending on the audio storage mode.
+    """
+    message_number = len(st.session_state.messages)
+    if st.session_state.get("audio_storage", "memory") == "memory":
+        return None, f"message{message_number}"
+    return f"audio/message{message_number}.{TTS_RESPONSE_FORMAT}", None
+
+def render_audio(container, audio_file_name=None, audio_key=None, autoplay=False):
+    if audio_key:
+        audio_bytes = get_audio_store().get(audio_key)
+        if audio_bytes is not None:
+            container.audio(audio_bytes, format=TTS_MIME_TYPE, autoplay=autoplay)
+    elif audio_file_name:
+        container.audio(audio_file_name, autoplay=autoplay)
+
+def add_message(role, content,audio_file_name=None, audio_key=None):
+    st.session_state.messages.append(ChatMessage(role, content, audio_file_name, audio_key))
+
+def render_chat_history():
+    """
+    Render a window of the most recent messages.
+
+    Only the last ``history_window`` messages per requested page are rendered
+    on each rerun, older ones are behind a "Show earlier messages" button.
+    The latest ``HISTORY_INLINE_AUDIO`` messages get an audio player, older
+    ones a play button that attaches the player on demand.
+    """
+    history = st.session_state.messages
+    history_pages = st.session_state.get("history_pages", 1)
+    start, messages = history.window(st.session_state.get("history_window", HISTORY_WINDOW_SIZE) * history_pages)
+
+    if start > 0 and st.button(f"Show earlier messages ({start} hidden)", key="show_earlier_messages"):
+        st.session_state.history_pages = history_pages + 1
+        st.rerun()
+
+    inline_audio_from = len(history) - HISTORY_INLINE_AUDIO
+    for index, message in enumerate(messages, start):
+        with st.chat_message(message.role):
+            st.markdown(message.content)
+            if not (message.audio_file_name or message.audio_key):
+                continue
+            if index >= inline_audio_from:
+                render_audio(st, message.audio_file_name, message.audio_key)
+            elif st.button("🔊", key=f"play_message_audio_{index}"):
+                render_audio(st, message.audio_file_name, message.audio_key, autoplay=True)
+
+# Plays clips queued by successive components back to back. The queue and the
+# player live in the parent page, so they outlive the component iframes.
+AUDIO_QUEUE_JS = """
+<script>
+    const page = window.parent;
+    if (!page.ttsQueue) {
+        page.ttsQueue = [];
+        page.ttsPlayNext = new page.Function(`
+            if (this.ttsPlaying || !this.ttsQueue.length) return;
+            this.ttsPlaying = new this.Audio(this.ttsQueue.shift());
+            const next = () => { this.ttsPlaying = null; this.ttsPlayNext(); };
+            this.ttsPlaying.onended = next;
+            this.ttsPlaying.play().catch(next);
+        `);
+    }
+    page.ttsQueue.push(AUDIO_SOURCE);
+    page.ttsPlayNext();
+</script>
+"""
+
+def queue_audio_clip(audio_bytes):
+    """
+    Queue a clip for playback in the browser after the clips queued before it.
+    """
+    source = f"data:{TTS_MIME_TYPE};base64,{base64.b64encode(audio_bytes).decode()}"
+    st.components.v1.html(AUDIO_QUEUE_JS.replace("AUDIO_SOURCE", json.dumps(source)), height=0)
+
+def play_streaming_audio(content, audio_file_name=None, audio_key=None):
+    """
+    Play the reply sentence by sentence while the rest is still being synthesized.
+
+    Each sentence is handed to the browser's playback queue as soon as it is
+    ready; the browser plays them in order, so the script never waits for
+    playback. The stitched clip is left in place for replay.
+    """
+    audio_placeholder = st.empty()
+    output = BytesIO() if audio_key else audio_file_name
+
+    for audio_bytes in stream_text_to_audio(content, output):
+        queue_audio_clip(audio_bytes)
+
+    if audio_key and output.getvalue():
+        get_audio_store().put(audio_key, output.getvalue())
+    render_audio(audio_placeholder, audio_file_name, audio_key)
+
+def schedule_reply_audio(content, engine, audio_file_name=None, audio_key=None):
+    """
+    Synthesize the reply on the turn engine and attach it at the end of the turn.
+
+    The rest of the turn (routing, generation of the next message, history
+    updates) keeps running while the audio is produced.
+    """
+    audio_placeholder = st.empty()
+    if audio_key:
+        stage = synthesize_speech_async(content)
+    else:
+        stage = convert_text_to_audio_async(content, audio_file_name)
+    future = engine.submit(stage, "tts", TURN_STAGE_TIMEOUTS["tts"])
+    st.session_state.pending_audio.append((future, audio_placeholder, audio_file_name, audio_key))
+
+def attach_pending_audio():
+    """
+    Wait for the audio scheduled during this turn and play it in place.
+    """
+    pending_audio = st.session_state.get("pending_audio", [])
+    st.session_state.pending_audio = []
+    for future, audio_placeholder, audio_file_name, audio_key in pending_audio:
+        try:
+            audio_bytes = future.result()
+        except Exception as e:
+            print("Error converting text to audio:", e)
+            continue
+        if audio_key:
+            get_audio_store().put(audio_key, audio_bytes)
+        render_audio(audio_placeholder, audio_file_name, audio_key, autoplay=True)
+
+def play_reply_audio(content, audio_file_name=None, audio_key=None):
+    engine = get_active_turn_engine()
+    if engine:
+        schedule_reply_audio(content, engine, audio_file_name, audio_key)
+        return
+    # Cached phrases are served whole, streaming would only split them into uncached sentences
+    if st.session_state.get("tts_streaming", False) and not is_audio_cached(content):
+        play_streaming_audio(content, audio_file_name, audio_key)
+        return
+    if audio_key:
+        try:
+            get_audio_store().put(audio_key, synthesize_speech(content))
+        except Exception as e:
+            print("Error converting text to audio:", e)
+    else:
+        convert_text_to_audio(content,audio_file_name)
+    render_audio(st, audio_file_name, audio_key, autoplay=True)
 
 def send_chat_message(role, content):
-    audio_file_name=None
+    audio_file_name, audio_key = None, None
 
     if role== "assistant" or role== "validation_agent":
-        audio_file_name = f"audio/message{len(st.session_state.messages)}.wav"
-        convert_text_to_audio(content,audio_file_name)
+        audio_file_name, audio_key = new_reply_audio_target()
 
-    add_message(role, content,audio_file_name)
+    add_message(role, content,audio_file_name, audio_key)
     
     with st.chat_message(role):
         st.markdown(content)
-        if audio_file_name:
-            st.audio(audio_file_name,autoplay=True)
-        
+        if audio_file_name or audio_key:
+            play_reply_audio(content, audio_file_name, audio_key)
+
+def send_streamed_chat_message(role, token_stream):
+    """
+    Render a reply token by token as it is generated, then speak it.
+
+    Returns:
+        str: The full reply text.
+    """
+    audio_file_name, audio_key = new_reply_audio_target()
 
+    with st.chat_message(role):
+        content = st.write_stream(token_stream)
+        play_reply_audio(content, audio_file_name, audio_key)
+
+    add_message(role, content, audio_file_name, audio_key)
+    return content
+        
 
 def prompt_user_for_data():
-    send_chat_message("assistant", "Please upload your data to validate.")
+    send_chat_message("assistant", UPLOAD_DATA_MESSAGE)
 
 def prompt_user_for_phone_and_name():
-    send_chat_message("assistant", "Please provide your phone number and first name.")
+    send_chat_message("assistant", PHONE_AND_NAME_MESSAGE)
 
-def handle_validation_stage_0(prompt):
+def handle_validation_stage_0(prompt, engine=None):
     if "user_data" not in st.session_state:
         prompt_user_for_data()
     elif not st.session_state["prompt_user_for_phone_and_name"]:
         prompt_user_for_phone_and_name()
         st.session_state.prompt_user_for_phone_and_name= True
     else:
-        phone_number, first_name = extract_user_info(prompt)
-        selected_question, correct_answer,user_id = get_security_question(phone_number, first_name, st.session_state.user_data)
+        phone_number, first_name = extract_user_info(prompt, st.session_state.get("user_index"), engine)
+        selected_question, correct_answer,user_id = get_security_question(phone_number, first_name, st.session_state.user_index)
 
         if selected_question and correct_answer:
             st.session_state.selected_question = selected_question
             st.session_state.correct_answer = correct_answer
             st.session_state.user_id = user_id
-            send_chat_message("assistant", f"Security Question: {selected_question}")
+            send_chat_message("assistant", SECURITY_QUESTION_MESSAGE.format(question=selected_question))
             st.session_state.validation_stage = 1
         else:
-            send_chat_message("assistant", "User not found. Please check your phone number and first name.")
+            send_chat_message("assistant", USER_NOT_FOUND_MESSAGE)
             st.session_state.validation_stage = 0
 
-def handle_validation_stage_1(prompt):
+def handle_validation_stage_1(prompt, engine=None):
     if 'validation_attempts' not in st.session_state:
         st.session_state.validation_attempts = 0
 
-    max_attempts = st.session_state.max_attempts
+    instructions = st.session_state.validation_agent_system_message or DEFAULT_VALIDATION_INSTRUCTIONS
+    max_attempts = get_validation_policy(instructions).max_attempts or st.session_state.max_attempts
 
-    if validate_security_question(st.session_state.correct_answer, prompt):
-        send_chat_message("assistant", "Thanks for validating your identity. How can I help?")
+    if validate_security_question(st.session_state.correct_answer, prompt, engine):
+        send_chat_message("assistant", VALIDATION_SUCCESS_MESSAGE)
         st.session_state.is_user_validated = True
         st.session_state.validation_stage = 0
         st.session_state.validation_attempts = 0  # Reset attempts
@@ -76,28 +252,133 @@ def handle_validation_stage_1(prompt):
         if st.session_state.validation_attempts < max_attempts:
             remaining_attempts = max_attempts - st.session_state.validation_attempts
             INCORRECT_ANSWER_AI_RESPONSE =  f"Incorrect answer. You have {remaining_attempts} {'attempts' if remaining_attempts > 1 else 'attempt'} left. Please try again."
-            selected_question, correct_answer = get_security_question_using_id(st.session_state.user_id, st.session_state.user_data)
+            selected_question, correct_answer = get_security_question_using_id(st.session_state.user_id, st.session_state.user_index)
             if selected_question and correct_answer:
                 st.session_state.selected_question = selected_question
                 st.session_state.correct_answer = correct_answer
-                security_question =f"Security Question: {selected_question}"
+                security_question =SECURITY_QUESTION_MESSAGE.format(question=selected_question)
                 INCORRECT_ANSWER_AI_RESPONSE += security_question
             
             send_chat_message("assistant",INCORRECT_ANSWER_AI_RESPONSE)
             st.session_state.validation_stage = 1  # Keep in validation stage
         else:
-            send_chat_message("assistant", "Maximum attempts reached. Validation failed. Please start over with your phone number and first name.")
+            send_chat_message("assistant", MAX_ATTEMPTS_REACHED_MESSAGE)
             st.session_state.validation_stage = 0
             st.session_state.validation_attempts = 0  # Reset attempts
 
-def handle_general_agent(prompt):
-    response = generate_rag_response(prompt)
+# Metric prefix of speculative work, kept apart from the general agent's own timings
+SPECULATION_STAGE = "speculation.general_agent"
+
+def start_general_agent_speculation(prompt):
+    """
+    Start general agent work in the background while the router decides.
+
+    Speculation only pays off when the LLM router is going to be called, so
+    nothing is started when the local classifier is already confident.
+
+    Returns:
+        SpeculativeTask: The started task, or None.
+    """
+    policy = st.session_state.get("speculation_policy", "off")
+    if policy == "off":
+        return None
+
+    _, _, is_confident = classify_intent(prompt)
+    if is_confident:
+        return None
+
+    if policy == "answer":
+        rag_chain, chain_input = build_general_agent_chain(prompt, standalone=is_answer_cacheable(prompt))
+        return SpeculativeTask("answer", invoke_chain, rag_chain, chain_input, SPECULATION_STAGE)
+    if "retriever" in st.session_state:
+        return SpeculativeTask("retrieval", retrieve_context, st.session_state.retriever, prompt,
+                               get_context_token_budget(), SPECULATION_STAGE)
+    return None
+
+def finish_general_agent_turn(prompt, response, cacheable, query_embedding=None):
+    if cacheable:
+        cache_answer(prompt, response, query_embedding)
+    get_conversation_memory().add_turn(prompt, response)
+
+def handle_general_agent(prompt, engine=None, speculation=None):
+    cacheable = is_answer_cacheable(prompt)
+    query_embedding = None
+    if cacheable:
+        cached_answer, query_embedding = lookup_cached_answer(prompt)
+        if cached_answer is not None:
+            if speculation:
+                speculation.discard()
+            send_chat_message("assistant", cached_answer)
+            get_conversation_memory().add_turn(prompt, cached_answer)
+            return
+
+    context = None
+    if speculation:
+        result = speculation.keep()
+        if speculation.name == "answer" and result is not None:
+            send_chat_message("assistant", result)
+            finish_general_agent_turn(prompt, result, cacheable, query_embedding)
+            return
+        if speculation.name == "retrieval":
+            context = result
+
+    try:
+        if st.session_state.get("stream_responses", False):
+            response = send_streamed_chat_message("assistant", stream_rag_response(prompt, context, engine, cacheable))
+            finish_general_agent_turn(prompt, response, cacheable, query_embedding)
+            return
+        response = generate_rag_response(prompt, context, engine, cacheable)
+        finish_general_agent_turn(prompt, response, cacheable, query_embedding)
+    except StageTimeoutError as e:
+        print("Error generating response:", e)
+        response = TURN_TIMEOUT_MESSAGE
     send_chat_message("assistant", response)
 
-def handle_personal_concierge_agent(query):
-    response = generate_personal_agent_response(query)
+def handle_personal_concierge_agent(query, engine=None):
+    try:
+        if st.session_state.get("stream_responses", False):
+            response = send_streamed_chat_message("assistant", stream_personal_agent_response(query, engine))
+            get_conversation_memory().add_turn(query, response)
+            return
+        response = generate_personal_agent_response(query, engine)
+        get_conversation_memory().add_turn(query, response)
+    except StageTimeoutError as e:
+        print("Error generating response:", e)
+        response = TURN_TIMEOUT_MESSAGE
     send_chat_message("assistant", response)
 
+def handle_user_prompt(prompt, engine=None):
+    """
+    Run one user turn: show the prompt, then continue the validation flow or route it to an agent.
+
+    Args:
+        prompt (str): The user message.
+        engine (TurnEngine, optional): The active turn engine.
+    """
+    send_chat_message("user", prompt)
+
+    if st.session_state.user_validation_invoked and not st.session_state.is_user_validated:
+        if st.session_state.validation_stage == 0:
+            handle_validation_stage_0(prompt, engine)
+        elif st.session_state.validation_stage == 1:
+            handle_validation_stage_1(prompt, engine)
+    else:
+        speculation = start_general_agent_speculation(prompt)
+        response=router_agent(prompt, engine)
+        if response == "general_agent":
+            handle_general_agent(prompt, engine, speculation)
+        elif speculation:
+            speculation.discard()
+        if response == "personal_concierge_agent":
+            if not st.session_state.is_user_validated:
+                st.session_state.user_validation_invoked =True
+                if st.session_state.validation_stage == 0:
+                    handle_validation_stage_0(prompt, engine)
+                elif st.session_state.validation_stage == 1:
+                    handle_validation_stage_1(prompt, engine)
+            else:
+                handle_personal_concierge_agent(prompt, engine)
+
 def clear_and_reset_all_session_state():
     st.session_state.transcribed_text = ""
     st.session_state.is_user_validated = False
@@ -105,6 +386,7 @@ def clear_and_reset_all_session_state():
     st.session_state.prompt_user_for_phone_and_name = False
     st.session_state.user_validation_invoked =False
     st.session_state.user_id = None
+    st.session_state.conversation_memory = ConversationMemory()
 
 def render_chat_interface():
     """
@@ -133,6 +415,9 @@ def render_chat_interface():
     if "max_attempts" not in st.session_state:
         st.session_state.max_attempts = 3 
 
+    st.session_state.pending_audio = []
+    engine = get_active_turn_engine()
+
     col1, col2 = st.columns([6,1], gap="large")
     with col1:
         clear_button = st.button('Clear')
@@ -140,26 +425,23 @@ def render_chat_interface():
         audio = audiorecorder("🎙️", "⏹️")
 
         if len(audio) > 0:
-            audio.export("audio.wav", format="wav") 
-            transcribed_text = convert_audio_to_text("audio.wav")
+            transcribed_text = transcribe_recording(audio, engine, st.session_state.get("stt_split", False))
             if transcribed_text == st.session_state.transcribed_text:
                 st.session_state.transcribed_text = ""
             else:
                 st.session_state.transcribed_text = transcribed_text
 
     if "messages" not in st.session_state:
-        st.session_state.messages = []
+        st.session_state.messages = ChatHistory()
 
     if clear_button:
-        st.session_state.messages = []
+        st.session_state.messages = ChatHistory()
+        st.session_state.history_pages = 1
         remove_all_files_in_folder("audio")
+        get_audio_store().clear()
         clear_and_reset_all_session_state()
 
-    for message in st.session_state.messages:
-        with st.chat_message(message["role"]):
-            st.markdown(message["content"])
-            if message["audio_file_name"]:
-                st.audio(message["audio_file_name"])
+    render_chat_history()
 
     prompt = st.chat_input("Enter your message:", key="chat_input")
 
@@ -179,25 +461,7 @@ def render_chat_interface():
         send_chat_message("assistant",GREETING_MESSAGE)
         st.session_state.prompt_greeting_message=True
     if prompt:
-        send_chat_message("user", prompt)
-        
-        if st.session_state.user_validation_invoked and not st.session_state.is_user_validated:
-            if st.session_state.validation_stage == 0:
-                handle_validation_stage_0(prompt)
-            elif st.session_state.validation_stage == 1:
-                handle_validation_stage_1(prompt)
-        else:
-            response=router_agent(prompt)
-            if response == "general_agent":
-                handle_general_agent(prompt)
-            elif response == "personal_concierge_agent":
-                if not st.session_state.is_user_validated:
-                    st.session_state.user_validation_invoked =True
-                    if st.session_state.validation_stage == 0:
-                        handle_validation_stage_0(prompt)
-                    elif st.session_state.validation_stage == 1:
-                        handle_validation_stage_1(prompt)
-                else:
-                    handle_personal_concierge_agent(prompt)
-        
+        handle_user_prompt(prompt, engine)
+
+    attach_pending_audio()
     st.components.v1.html(js, height=0)
\ No newline at end of file
@@ -1,35 +1,38 @@
-import os
+import time
+from collections import OrderedDict
+from functools import partial
+from operator import itemgetter
 
 import streamlit as st
 from dotenv import load_dotenv
 from langchain.prompts import ChatPromptTemplate
-from langchain.text_splitter import CharacterTextSplitter
-from langchain_community.embeddings import OpenAIEmbeddings
-from langchain_community.vectorstores import Chroma
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
-from langchain_openai import ChatOpenAI
-from openai import AzureOpenAI, OpenAI
+from langchain_core.runnables import RunnableLambda
 
-from constants import general_agent_rag_prompt, system_rag_prompt_template,personal_agent_rag_prompt,personal_agent_with_user_data,default_system_prompt
+from constants import CHAIN_CACHE_SIZE, CHUNK_OVERLAP, CHUNK_SIZE, CONTEXT_TOKEN_BUDGET, DEFAULT_RETRIEVER_BACKEND, RETRIEVER_K, TURN_STAGE_TIMEOUTS, conversation_memory_prompt, general_agent_rag_prompt, system_rag_prompt_template,personal_agent_rag_prompt,personal_agent_with_user_data,default_system_prompt
+from answer_cache import get_answer_cache, is_follow_up
+from context_assembly import assemble_context
+from conversation_memory import count_tokens, get_conversation_memory
+from metrics import increment, record_timing, record_value, timed
+from model_clients import get_client_registry
+from retrievers import InMemoryRetriever, build_index
+from vector_store import get_embeddings, get_retriever_for_hashes, index_documents, split_documents
 
 load_dotenv()
 
+client_registry = get_client_registry()
+
 # Azure OpenAI client
-azure_openai_client = AzureOpenAI(azure_endpoint=os.getenv(
-    "AZURE_OPENAI_ENDPOINT", ""),
-                                  api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-                                  api_version="2023-12-01-preview")
+azure_openai_client = client_registry.get("azure")
 
 # OpenAI client
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+openai_client = client_registry.get("openai")
+async_openai_client = client_registry.get("async_openai")
 
 # LangChain OpenAI client
-langchain_openai_client = ChatOpenAI(
-    api_key=os.getenv("OPENAI_API_KEY", ""),
-    model="gpt-4o",
-    verbose=True
-)
+langchain_openai_client = client_registry.get("chat", "gpt-4o")
+
+plain_chat_chain = langchain_openai_client | StrOutputParser()
 
 def get_openai_client(gpt_version="4o"):
 
@@ -38,11 +41,7 @@ def get_openai_client(gpt_version="4o"):
     if gpt_version == "4o-mini":
         model_name = "gpt-4o-mini"
         
-    return ChatOpenAI(
-                api_key=os.getenv("OPENAI_API_KEY", ""),
-                model=model_name,
-                verbose=True
-            )
+    return client_registry.get("chat", model_name)
     
 
 
@@ -63,117 +62,412 @@ def chat(prompt, use_azure=True):
     response = client.invoke(input=prompt)
     return response.content
 
-def format_docs(docs):
-    return "\n\n".join(doc.page_content for doc in docs)
+async def achat(prompt, use_azure=True):
+    """
+    Async version of ``chat`` for the turn engine.
+    """
+    client = azure_openai_client if use_azure else langchain_openai_client
+    response = await client.ainvoke(input=prompt)
+    return response.content
+
+def get_context_token_budget():
+    return st.session_state.get("context_token_budget", CONTEXT_TOKEN_BUDGET)
 
-def generate_rag_response(query):
+def retrieve_context(retriever, query, max_tokens=CONTEXT_TOKEN_BUDGET, stage="general_agent"):
     """
-    Generate a response using the RAG pipeline.
+    Retrieve and assemble the context for a query.
 
     Args:
-        query (str): The query to generate a response using qa_chain.
+        retriever (Retriever): The retriever.
+        query (str): The user query.
+        max_tokens (int, optional): Token budget of the context.
+        stage (str, optional): Metric prefix of the retrieval time.
 
     Returns:
-        str: The generated response.
+        str: The assembled context.
     """
-    if "retriever" not in st.session_state:
-        return chat(query, use_azure=False)
+    with timed(f"{stage}.retrieval"):
+        docs = retriever.invoke(query)
+    return assemble_context(docs, max_tokens)
 
-    system_prompt_template = st.session_state.general_agent_system_message or system_rag_prompt_template
 
-    prompt_template = ChatPromptTemplate.from_messages([
-        ("system",system_prompt_template),
-        ("human", general_agent_rag_prompt),
-        ("ai", "Answer: ")
-    ])
-    retriever = st.session_state.retriever
+def get_conversation_context(standalone=False):
+    """
+    Return the prior turns of the conversation, formatted for the agent prompts.
 
+    Args:
+        standalone (bool): Leave the turns out, for answers that must not
+            depend on the conversation.
+    """
+    if standalone:
+        conversation = "Not needed, answer the question on its own."
+    else:
+        conversation = get_conversation_memory().render() or "None, this is the first question."
+    return conversation_memory_prompt.format(conversation=conversation)
 
-    llm_client = get_openai_client(st.session_state.gpt_version)
+def record_prompt_tokens(stage, prompt):
+    """
+    Record the size of a prompt in tokens and pass it through unchanged.
 
-    rag_chain = ({
-        "context": retriever | format_docs ,
-        "question": RunnablePassthrough()
-    }
-                 | prompt_template
-                 | llm_client
-                 | StrOutputParser())
-    response = rag_chain.invoke(query)
-    
-    return response
+    Args:
+        stage (str): Metric prefix, e.g. ``general_agent``.
+        prompt: A prompt value, or the messages / text passed to the plain chat chain.
+    """
+    if hasattr(prompt, "to_messages"):
+        prompt = prompt.to_messages()
+    if isinstance(prompt, str):
+        texts = [prompt]
+    else:
+        texts = [message.content if hasattr(message, "content") else message[1] for message in prompt]
+    record_value(f"{stage}.prompt_tokens", sum(count_tokens(text) for text in texts))
+    return prompt
+
+def with_conversation_context(prompt, conversation_context, stage):
+    """
+    Build the plain chat chain input for a prompt and the prior turns.
+    """
+    messages = [("system", conversation_context), ("human", prompt)]
+    record_prompt_tokens(stage, messages)
+    return messages
 
 
-def generate_personal_agent_response(query):
-    if "personal_agent_retriever" not in st.session_state and "user_transactional_data" not in st.session_state:
-        return chat(query, use_azure=False)
+class ChainCache:
+    """
+    Bounded LRU cache of compiled chains.
 
-    user_data = "None"
-    
-    if "user_transactional_data" in st.session_state:
-        user_data_json = get_user_related_data_in_json(st.session_state.user_transactional_data)
-        user_data = json_to_str(user_data_json)
+    Keys capture everything a chain is built from (system message, model,
+    retriever, user data version), so chains are only rebuilt when the
+    sidebar configuration or the uploaded data change.
+    """
+
+    def __init__(self, max_size=CHAIN_CACHE_SIZE):
+        self.max_size = max_size
+        self._chains = OrderedDict()
+
+    def get_or_build(self, key, build, stage):
+        if key in self._chains:
+            self._chains.move_to_end(key)
+            increment(f"{stage}.chain_cache_hits")
+            return self._chains[key]
+
+        increment(f"{stage}.chain_cache_misses")
+        with timed(f"{stage}.chain_build"):
+            chain = build()
+        self._chains[key] = chain
+        while len(self._chains) > self.max_size:
+            self._chains.popitem(last=False)
+        return chain
+
+
+def get_chain_cache():
+    if "chain_cache" not in st.session_state:
+        st.session_state.chain_cache = ChainCache()
+    return st.session_state.chain_cache
+
+
+def build_general_agent_chain(query, context=None, standalone=False):
+    """
+    Build the general agent chain for a query.
+
+    Args:
+        query (str): The user query.
+        context (str, optional): Context retrieved ahead of time. When given,
+            the chain skips retrieval.
+        standalone (bool): Answer without the conversation so far.
+
+    Returns:
+        tuple: The runnable and the input it should be invoked with.
+    """
+    conversation_context = get_conversation_context(standalone)
+    if "retriever" not in st.session_state:
+        return plain_chat_chain, with_conversation_context(query, conversation_context, "general_agent")
+
+    system_prompt_template = st.session_state.general_agent_system_message or system_rag_prompt_template
+    retriever = st.session_state.retriever
+    gpt_version = st.session_state.gpt_version
+    chain_cache = get_chain_cache()
+    context_token_budget = get_context_token_budget()
+    cache_key = ("general_agent", system_prompt_template, gpt_version, id(retriever), context_token_budget)
+
+    def build_generation_chain():
+        prompt_template = ChatPromptTemplate.from_messages([
+            ("system",system_prompt_template),
+            ("system", "{conversation}"),
+            ("human", general_agent_rag_prompt),
+            ("ai", "Answer: ")
+        ])
+        llm_client = get_openai_client(gpt_version)
+        return prompt_template | RunnableLambda(partial(record_prompt_tokens, "general_agent")) | llm_client | StrOutputParser()
+
+    generation_chain = chain_cache.get_or_build(cache_key + ("generation",), build_generation_chain, "general_agent")
+
+    if context is not None:
+        return generation_chain, {"context": context, "question": query, "conversation": conversation_context}
+
+    def build_rag_chain():
+        return ({
+            "context": itemgetter("question") | retriever | RunnableLambda(partial(assemble_context, max_tokens=context_token_budget)),
+            "question": itemgetter("question"),
+            "conversation": itemgetter("conversation"),
+        }
+                | generation_chain)
+
+    rag_chain = chain_cache.get_or_build(cache_key, build_rag_chain, "general_agent")
+    return rag_chain, {"question": query, "conversation": conversation_context}
+
+
+def build_personal_agent_chain(query):
+    """
+    Build the personal concierge agent chain for a query.
+
+    Args:
+        query (str): The user query.
+
+    Returns:
+        tuple: The runnable and the input it should be invoked with.
+    """
+    conversation_context = get_conversation_context()
+    if "personal_agent_retriever" not in st.session_state and "user_transactional_data" not in st.session_state:
+        return plain_chat_chain, with_conversation_context(query, conversation_context, "personal_agent")
 
     system_prompt_template = st.session_state.personal_agent_system_message or default_system_prompt
 
+    def get_user_data():
+        if "user_transactional_data" in st.session_state:
+            return get_user_related_data_for_prompt(st.session_state.transaction_store)
+        return "None"
+
     if "personal_agent_retriever" not in st.session_state:
-        prompt_with_user_data = system_prompt_template + "\n\n" + personal_agent_with_user_data.format(question=query, user_data=user_data)
-        response = chat(prompt_with_user_data, use_azure=False)
-        return response
+        prompt_with_user_data = system_prompt_template + "\n\n" + personal_agent_with_user_data.format(question=query, user_data=get_user_data())
+        return plain_chat_chain, with_conversation_context(prompt_with_user_data, conversation_context, "personal_agent")
 
-    
+    personal_agent_retriever = st.session_state.personal_agent_retriever
+    gpt_version = st.session_state.gpt_version
+    transaction_store = st.session_state.get("transaction_store")
+    context_token_budget = get_context_token_budget()
+    cache_key = ("personal_agent", system_prompt_template, gpt_version, id(personal_agent_retriever),
+                 transaction_store.version if transaction_store else None, st.session_state.get("user_id"),
+                 context_token_budget)
+
+    def build_rag_chain():
+        prompt_with_user_data = personal_agent_rag_prompt.format(user_data=get_user_data(),question="{question}",context="{context}")
+
+        prompt_template = ChatPromptTemplate.from_messages([
+            ("system",system_prompt_template),
+            ("system", "{conversation}"),
+            ("human", prompt_with_user_data),
+        ])
+
+        llm_client = get_openai_client(gpt_version)
+
+        return ({
+            "context": itemgetter("question") | personal_agent_retriever | RunnableLambda(partial(assemble_context, max_tokens=context_token_budget)),
+            "question": itemgetter("question"),
+            "conversation": itemgetter("conversation"),
+        }
+                | prompt_template
+                | RunnableLambda(partial(record_prompt_tokens, "personal_agent"))
+                | llm_client
+                | StrOutputParser())
+
+    rag_chain = get_chain_cache().get_or_build(cache_key, build_rag_chain, "personal_agent")
+    return rag_chain, {"question": query, "conversation": conversation_context}
+
+
+def invoke_chain(chain, chain_input, stage, engine=None):
+    """
+    Invoke the chain, on the turn engine when one is given.
 
-    prompt_with_user_data = personal_agent_rag_prompt.format(user_data=user_data,question="{question}",context="{context}")
+    Raises:
+        StageTimeoutError: If the engine generation stage timed out.
+    """
+    with timed(f"{stage}.generation"):
+        if engine:
+            return engine.run(chain.ainvoke(chain_input), "llm", TURN_STAGE_TIMEOUTS["llm"])
+        return chain.invoke(chain_input)
 
-    prompt_template = ChatPromptTemplate.from_messages([
-        ("system",system_prompt_template),
-        ("human", prompt_with_user_data),
-    ])
 
-    personal_agent_retriever = st.session_state.personal_agent_retriever
+def stream_chain(chain, chain_input, stage, engine=None):
+    """
+    Stream the chain output, recording time-to-first-token and total generation time.
 
-    llm_client = get_openai_client(st.session_state.gpt_version)
-    
+    Args:
+        chain (Runnable): The chain to stream.
+        chain_input: The chain input.
+        stage (str): Metric prefix, e.g. ``general_agent``.
+        engine (TurnEngine, optional): Stream on the turn engine instead of
+            the calling thread.
+
+    Yields:
+        str: The generated text chunks.
+    """
+    started = time.perf_counter()
+    first_token_received = False
+    if engine:
+        chunks = engine.stream(chain.astream(chain_input), "llm", TURN_STAGE_TIMEOUTS["llm"])
+    else:
+        chunks = chain.stream(chain_input)
+    for chunk in chunks:
+        if not first_token_received and chunk:
+            record_timing(f"{stage}.time_to_first_token", time.perf_counter() - started)
+            first_token_received = True
+        yield chunk
+    record_timing(f"{stage}.generation", time.perf_counter() - started)
+
+
+def get_answer_cache_scope():
+    """
+    Return everything a general agent answer depends on besides the question.
+    """
+    knowledge_base = st.session_state.get("general_agent_knowledge_base")
+    fingerprint = knowledge_base.fingerprint if "retriever" in st.session_state and knowledge_base else None
+    system_prompt_template = st.session_state.general_agent_system_message or system_rag_prompt_template
+    return (fingerprint, st.session_state.get("retriever_backend"), st.session_state.get("retriever_k"),
+            get_context_token_budget(), system_prompt_template, st.session_state.gpt_version)
+
+
+def is_answer_cacheable(query):
+    """
+    Whether the general agent answer to a query may be served from or stored in the answer cache.
+
+    The cache is shared by all sessions, so cacheable answers are generated
+    standalone, without the conversation so far, which can hold a
+    customer's personal data. Follow-up questions need the conversation and
+    are never cached.
+    """
+    if not st.session_state.get("answer_cache_enabled", True):
+        return False
+    return not (get_conversation_memory().turns and is_follow_up(query))
+
+
+def lookup_cached_answer(query):
+    """
+    Look up a cached general agent answer for the query.
+
+    Returns:
+        tuple: The cached answer or None, and the query embedding to pass to ``cache_answer``.
+    """
+    return get_answer_cache().get(get_answer_cache_scope(), query, get_embeddings().embed_query)
+
+
+def cache_answer(query, answer, query_embedding=None):
+    get_answer_cache().put(get_answer_cache_scope(), query, answer, query_embedding)
+
+
+def invalidate_cached_answers(knowledge_base_fingerprint):
+    """
+    Drop the cached answers of a general agent knowledge base that changed.
+    """
+    get_answer_cache().invalidate(lambda scope: scope[0] == knowledge_base_fingerprint)
+
+
+def generate_rag_response(query, context=None, engine=None, standalone=False):
+    """
+    Generate a response using the RAG pipeline.
 
-    rag_chain = ({
-        "context": personal_agent_retriever,
-        "question": RunnablePassthrough(),
-    }
-                 | prompt_template
-                 | llm_client
-                 | StrOutputParser())
-    response = rag_chain.invoke(query)
-    return response
-
-def get_retriever_from_documents(documents):
+    Args:
+        query (str): The query to generate a response using qa_chain.
+        context (str, optional): Context retrieved ahead of time.
+        engine (TurnEngine, optional): Run generation on the turn engine.
+        standalone (bool): Answer without the conversation so far.
+
+    Returns:
+        str: The generated response.
+    """
+    rag_chain, chain_input = build_general_agent_chain(query, context, standalone)
+    return invoke_chain(rag_chain, chain_input, "general_agent", engine)
+
+
+def stream_rag_response(query, context=None, engine=None, standalone=False):
+    """
+    Stream a response from the RAG pipeline token by token.
+
+    Args:
+        query (str): The user query.
+        context (str, optional): Context retrieved ahead of time.
+        engine (TurnEngine, optional): Stream on the turn engine.
+        standalone (bool): Answer without the conversation so far.
+
+    Returns:
+        generator: The response text chunks.
+    """
+    rag_chain, chain_input = build_general_agent_chain(query, context, standalone)
+    return stream_chain(rag_chain, chain_input, "general_agent", engine)
+
+
+def generate_personal_agent_response(query, engine=None):
+    rag_chain, chain_input = build_personal_agent_chain(query)
+    return invoke_chain(rag_chain, chain_input, "personal_agent", engine)
+
+
+def stream_personal_agent_response(query, engine=None):
+    rag_chain, chain_input = build_personal_agent_chain(query)
+    return stream_chain(rag_chain, chain_input, "personal_agent", engine)
+
+def get_retriever_from_documents(documents, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, k=RETRIEVER_K,
+                                 backend=DEFAULT_RETRIEVER_BACKEND):
     """ 
     Generate retriever from documents
 
+    With the ``chroma`` backend the documents are indexed into the persistent
+    vector store only the first time they are seen; later calls reuse the
+    existing index. The other backends build an in-process index.
+
     Args:
         documents (list): List of documents.
+        chunk_size (int): Chunk size in tokens.
+        chunk_overlap (int): Chunk overlap in tokens.
+        k (int): Number of chunks to retrieve per query.
+        backend (str): One of ``RETRIEVER_BACKENDS``.
 
     Returns:
         retriever (Retriever): The retriever.
     """
-    text_splitter = CharacterTextSplitter(chunk_size=100, chunk_overlap=50)
-    texts = text_splitter.create_documents(documents)
-    embeddings = OpenAIEmbeddings(api_key=os.getenv("OPENAI_API_KEY"))
+    if backend != "chroma":
+        chunks = split_documents(documents, chunk_size, chunk_overlap)
+        return InMemoryRetriever(index=build_index(chunks, backend, get_embeddings()), k=k)
 
-    db = Chroma.from_documents(texts, embeddings)
+    doc_hash = index_documents(documents, chunk_size, chunk_overlap)
 
     # Create retriever interface
-    retriever = db.as_retriever(search_kwargs={"k": 5})
+    retriever = get_retriever_for_hashes([doc_hash], k)
 
     return retriever
 
-def get_user_related_data_in_json(user_transactional_data):
+class TransactionStore:
+    """
+    Transactional data partitioned by UserID.
+
+    The row positions of every user are computed once when the data is
+    uploaded, and each user's prompt-ready (brace-escaped) JSON is cached
+    until the data is re-uploaded and a new store replaces this one.
+    """
+
+    def __init__(self, user_transactional_data, version=None):
+        self.data = user_transactional_data
+        self.version = version
+        with timed("personal_agent.partition_transactions"):
+            self._row_positions = user_transactional_data.groupby('UserID').indices
+        self._prompt_user_data = {}
+
+    def get_user_data_json(self, user_id):
+        positions = self._row_positions.get(user_id)
+        if positions is None:
+            return "[]"
+        return self.data.iloc[positions].to_json(orient='records')
+
+    def get_prompt_user_data(self, user_id):
+        if user_id not in self._prompt_user_data:
+            self._prompt_user_data[user_id] = json_to_str(self.get_user_data_json(user_id))
+        return self._prompt_user_data[user_id]
+
+
+def get_user_related_data_for_prompt(transaction_store):
     try:
-        user_id =st.session_state.user_id
-        user_data = user_transactional_data[user_transactional_data['UserID'] == user_id]
-        user_data_json = user_data.to_json(orient='records')
-        return user_data_json
+        return transaction_store.get_prompt_user_data(st.session_state.user_id)
     except Exception as e:
         print("Error occured while getting user data",e)
-        return None
+        return "None"
 
 def json_to_str(json_data):
-    return json_data.replace("{", "{{").replace("}", "}}")
+    return json_data.replace("{", "{{").replace("}", "}}")
\ No newline at end of file
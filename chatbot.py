@@ -3,16 +3,40 @@ import sys
 sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
 
 import os
+import threading
 import streamlit as st
 
+from audio_utils import warm_up_audio_cache
 from chat_interface import render_chat_interface
+from constants import AUDIO_CACHE_WARM_UP, CLIENT_PREWARM
+from model_clients import get_client_registry
 from sidebar import configure_sidebar, set_sidebar_width
 from dotenv import load_dotenv
 
 load_dotenv()
 
+@st.cache_resource(show_spinner=False)
+def warm_up_audio():
+    """
+    Synthesize the fixed assistant phrases once per process.
+    """
+    warm_up_audio_cache()
+
+
+@st.cache_resource(show_spinner=False)
+def prewarm_model_clients():
+    """
+    Open the shared API connection once per process, in the background.
+    """
+    threading.Thread(target=get_client_registry().prewarm, daemon=True).start()
+
+
 def main():
     st.title("AI Bot")
+    if CLIENT_PREWARM:
+        prewarm_model_clients()
+    if AUDIO_CACHE_WARM_UP:
+        warm_up_audio()
     set_sidebar_width()
     configure_sidebar()
     render_chat_interface()
@@ -48,3 +48,188 @@ You are a helpful assistant.
 GREETING_MESSAGE = """
 Hello There, Greetings! I am an AI assistant. I am here to help you with your queries.
 """
+
+UPLOAD_DATA_MESSAGE = "Please upload your data to validate."
+PHONE_AND_NAME_MESSAGE = "Please provide your phone number and first name."
+USER_NOT_FOUND_MESSAGE = "User not found. Please check your phone number and first name."
+VALIDATION_SUCCESS_MESSAGE = "Thanks for validating your identity. How can I help?"
+MAX_ATTEMPTS_REACHED_MESSAGE = "Maximum attempts reached. Validation failed. Please start over with your phone number and first name."
+SECURITY_QUESTION_MESSAGE = "Security Question: {question}"
+
+# Security question -> column of the validation data holding the answer
+SECURITY_QUESTIONS = {
+    "What is your mother's maiden name?": "MothersMaidenName",
+    "What was the name of your first elementary school?": "FirstElementarySchoolName",
+    "What was the name of your first pet?": "FirstPetName",
+}
+
+TTS_MODEL = "tts-1"
+TTS_VOICE = "onyx"
+# Compact encodings only: "opus" is the smallest, "mp3" plays in every browser
+TTS_RESPONSE_FORMAT = "mp3"
+# MIME type for st.audio and container name for pydub/ffmpeg, per TTS format
+AUDIO_FORMATS = {
+    "mp3": ("audio/mpeg", "mp3"),
+    "opus": ("audio/ogg", "ogg"),
+    "aac": ("audio/aac", "adts"),
+    "flac": ("audio/flac", "flac"),
+}
+
+# Number of sentences synthesized concurrently when streaming audio replies
+TTS_STREAMING_MAX_WORKERS = 4
+# Sentences shorter than this are merged with their neighbour before synthesis
+TTS_STREAMING_MIN_SENTENCE_CHARS = 40
+
+AUDIO_CACHE_DIR = "audio_cache"
+AUDIO_CACHE_MAX_BYTES = 200 * 1024 * 1024
+# Synthesize the fixed phrases below into the audio cache at startup
+AUDIO_CACHE_WARM_UP = True
+
+# Recordings are trimmed, downmixed and resampled before upload to Whisper
+STT_SAMPLE_RATE = 16000
+STT_SILENCE_THRESHOLD_DBFS = -45
+# Silence kept around the speech so that the first and last words are not clipped
+STT_SILENCE_PADDING_MS = 200
+# Upload codec (falls back to 16 kHz mono WAV when ffmpeg cannot encode it)
+STT_UPLOAD_FORMAT = "ogg"
+STT_UPLOAD_CODEC = "libopus"
+STT_UPLOAD_BITRATE = "24k"
+
+# Recordings longer than this can be split at pauses and transcribed concurrently
+STT_SPLIT_MIN_DURATION_MS = 20000
+STT_SPLIT_MAX_CHUNK_MS = 15000
+STT_SPLIT_MIN_SILENCE_MS = 400
+# Chunks cut without a pause overlap by this much; the repeated words are dropped when stitching
+STT_SPLIT_OVERLAP_MS = 500
+STT_SPLIT_MAX_OVERLAP_WORDS = 8
+STT_SPLIT_MAX_WORKERS = 4
+
+# Where reply audio is kept: "memory" (bounded per-session byte store) or "disk" (audio/ folder)
+AUDIO_STORAGE_MODES = ("memory", "disk")
+AUDIO_STORE_MAX_BYTES = 32 * 1024 * 1024
+
+CACHED_AUDIO_PHRASES = [
+    GREETING_MESSAGE,
+    UPLOAD_DATA_MESSAGE,
+    PHONE_AND_NAME_MESSAGE,
+    USER_NOT_FOUND_MESSAGE,
+    VALIDATION_SUCCESS_MESSAGE,
+    MAX_ATTEMPTS_REACHED_MESSAGE,
+] + [SECURITY_QUESTION_MESSAGE.format(question=question) for question in SECURITY_QUESTIONS]
+
+# Chat history: messages rendered per page and how many of the latest replies get an inline audio player
+HISTORY_WINDOW_SIZE = 20
+HISTORY_INLINE_AUDIO = 2
+
+# Number of samples kept per timing metric
+METRICS_MAX_SAMPLES = 1000
+
+# Local intent router: minimum centroid similarity margin to skip the LLM router
+LOCAL_ROUTER_MIN_MARGIN = 0.08
+LOCAL_ROUTER_MIN_SIMILARITY = 0.1
+ROUTER_CACHE_SIZE = 2048
+
+# Speculative execution of the general agent while the router decides
+SPECULATION_POLICIES = ("off", "retrieval", "answer")
+SPECULATION_MAX_WORKERS = 4
+
+# Knowledge base indexing
+VECTOR_STORE_DIR = "vector_store"
+VECTOR_STORE_COLLECTION = "documents"
+EMBEDDING_MODEL = "text-embedding-ada-002"
+# Chunk size and overlap are measured in tokens of TOKENIZER_ENCODING
+TOKENIZER_ENCODING = "cl100k_base"
+CHUNK_SIZE = 200
+CHUNK_OVERLAP = 20
+RETRIEVER_K = 5
+# Retrieved chunks are merged, de-duplicated and cut to this many tokens before prompting
+CONTEXT_TOKEN_BUDGET = 1000
+# Chunks of the same source closer than this many characters are joined into one passage
+CONTEXT_MERGE_GAP_CHARS = 2
+# Minimum shared text, in characters, to merge chunks that carry no start offset
+CONTEXT_MIN_OVERLAP_CHARS = 20
+# Sentences shorter than this many words are never dropped as duplicates
+CONTEXT_MIN_DUPLICATE_WORDS = 4
+# A passage is cut to fill the budget only if at least this many tokens remain
+CONTEXT_MIN_TRUNCATED_TOKENS = 50
+# Split on paragraphs first, then lines, then sentences, then words
+CHUNK_SEPARATORS = ["\n\n", "\n", ". ", "? ", "! ", " ", ""]
+
+# Local chunk embedding cache
+EMBEDDING_CACHE_PATH = "vector_store/embedding_cache.sqlite3"
+EMBEDDING_BATCH_SIZE = 512
+# Query embeddings are only kept in memory, for the most recent queries
+QUERY_EMBEDDING_CACHE_SIZE = 256
+# Number of documents chunked and embedded concurrently on upload
+KNOWLEDGE_BASE_MAX_WORKERS = 4
+
+# Local security answer matching: answers at or above the accept similarity
+# pass, below the reject similarity fail, and the LLM judges the band between.
+# Strict instructions skip the similarity and require the exact answer.
+ANSWER_MATCH_THRESHOLDS = {
+    "normal": (0.85, 0.5),
+    "lenient": (0.75, 0.4),
+}
+DEFAULT_VALIDATION_INSTRUCTIONS = "Check if the correct answer and user answer are same or not."
+
+# Shared HTTP connection pool used by every model client
+CLIENT_MAX_CONNECTIONS = 50
+CLIENT_MAX_KEEPALIVE_CONNECTIONS = 20
+CLIENT_KEEPALIVE_EXPIRY_SECONDS = 120
+CLIENT_TIMEOUT_SECONDS = 60
+CLIENT_CONNECT_TIMEOUT_SECONDS = 5
+CLIENT_HTTP2 = True
+# Open a connection to the API at startup so the first turn skips the TLS handshake
+CLIENT_PREWARM = True
+
+# Compiled RAG chains kept per session
+CHAIN_CACHE_SIZE = 16
+
+# Retriever backends: the persistent Chroma store, or in-process indexes built per knowledge base
+RETRIEVER_BACKENDS = ("chroma", "bm25", "vector", "hybrid")
+DEFAULT_RETRIEVER_BACKEND = "chroma"
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Hybrid retrieval: candidates taken from each index per result, and the reciprocal rank fusion constant
+HYBRID_CANDIDATE_MULTIPLIER = 4
+HYBRID_RRF_K = 60
+
+# General agent answer cache, shared by all sessions
+ANSWER_CACHE_MAX_ENTRIES = 1024
+ANSWER_CACHE_TTL_SECONDS = 24 * 60 * 60
+# Minimum cosine similarity of query embeddings to reuse an answer
+ANSWER_CACHE_SIMILARITY_THRESHOLD = 0.95
+
+# Conversation memory: tokens of prior turns injected into the agent prompts
+MEMORY_TOKEN_BUDGET = 1000
+# Part of the budget reserved for the rolling summary of older turns
+MEMORY_SUMMARY_MAX_TOKENS = 300
+MEMORY_SUMMARY_MODEL = "gpt-4o-mini"
+MEMORY_SUMMARY_MAX_WORKERS = 2
+
+conversation_memory_prompt = """
+Conversation so far, use it to understand follow-up questions:
+{conversation}
+"""
+
+conversation_summary_prompt = """
+Update the summary of a conversation between a user and an assistant with the new turns below.
+Keep names, numbers, dates and the user's open requests. Leave out greetings and small talk.
+Answer with the updated summary only, in at most {max_words} words.
+
+Current summary:
+{summary}
+
+New turns:
+{turns}
+"""
+
+# Async turn engine: per-stage timeouts in seconds
+TURN_STAGE_TIMEOUTS = {
+    "stt": 30,
+    "router": 10,
+    "validation": 15,
+    "llm": 60,
+    "tts": 30,
+}
+TURN_TIMEOUT_MESSAGE = "Sorry, that is taking longer than expected. Please try again."
@@ -0,0 +1,175 @@
+import re
+
+from constants import (CONTEXT_MERGE_GAP_CHARS, CONTEXT_MIN_DUPLICATE_WORDS, CONTEXT_MIN_OVERLAP_CHARS,
+                       CONTEXT_MIN_TRUNCATED_TOKENS, CONTEXT_TOKEN_BUDGET)
+from conversation_memory import count_tokens, truncate_to_tokens
+from metrics import record_value, timed
+
+# Sentence ends and line breaks, captured so the original separators can be kept
+SENTENCE_BOUNDARY_PATTERN = re.compile(r"((?<=[.!?])\s+|\n+)")
+
+
+class Passage:
+    """
+    A span of one source document built from one or more retrieved chunks.
+    """
+
+    __slots__ = ("source", "start", "text", "rank")
+
+    def __init__(self, source, start, text, rank):
+        self.source = source
+        self.start = start
+        self.text = text
+        self.rank = rank
+
+    @property
+    def end(self):
+        return self.start + len(self.text)
+
+
+def get_source_key(doc):
+    return doc.metadata.get("doc_hash"), doc.metadata.get("source")
+
+
+def merge_text(first, second):
+    """
+    Join two chunk texts when one contains the other or the end of the first
+    repeats the start of the second.
+
+    Returns:
+        str: The merged text, or None if the texts do not overlap.
+    """
+    if second in first:
+        return first
+    if first in second:
+        return second
+    if len(second) < CONTEXT_MIN_OVERLAP_CHARS:
+        return None
+    anchor = second[:CONTEXT_MIN_OVERLAP_CHARS]
+    position = first.find(anchor, max(0, len(first) - len(second)))
+    while position != -1:
+        if second.startswith(first[position:]):
+            return first[:position] + second
+        position = first.find(anchor, position + 1)
+    return None
+
+
+def merge_positioned(passages):
+    """
+    Merge chunks with a known start offset that overlap or touch in their source.
+    """
+    merged = []
+    for passage in sorted(passages, key=lambda passage: passage.start):
+        previous = merged[-1] if merged else None
+        if previous is None or passage.start > previous.end + CONTEXT_MERGE_GAP_CHARS:
+            merged.append(passage)
+            continue
+        if passage.end > previous.end:
+            if passage.start >= previous.end:
+                previous.text += " " + passage.text
+            else:
+                previous.text += passage.text[previous.end - passage.start:]
+        previous.rank = min(previous.rank, passage.rank)
+    return merged
+
+
+def merge_unpositioned(passages):
+    """
+    Merge chunks without a start offset (indexed before offsets were recorded) by their shared text.
+    """
+    merged = []
+    for passage in passages:
+        for index, other in enumerate(merged):
+            text = merge_text(other.text, passage.text) or merge_text(passage.text, other.text)
+            if text is not None:
+                merged[index] = Passage(passage.source, None, text, min(other.rank, passage.rank))
+                break
+        else:
+            merged.append(passage)
+    return merged
+
+
+def merge_chunks(docs):
+    """
+    Merge overlapping and adjacent chunks of the same source into passages.
+
+    Args:
+        docs (list): Retrieved Documents, most relevant first.
+
+    Returns:
+        list: The passages, most relevant first. A passage ranks as its best chunk.
+    """
+    by_source = {}
+    for rank, doc in enumerate(docs):
+        start = doc.metadata.get("start_index")
+        by_source.setdefault(get_source_key(doc), []).append(
+            Passage(get_source_key(doc), start if start is not None and start >= 0 else None, doc.page_content, rank))
+
+    passages = []
+    for source_passages in by_source.values():
+        passages.extend(merge_positioned([passage for passage in source_passages if passage.start is not None]))
+        passages.extend(merge_unpositioned([passage for passage in source_passages if passage.start is None]))
+    return sorted(passages, key=lambda passage: passage.rank)
+
+
+def normalize_sentence(sentence):
+    return " ".join(re.findall(r"\w+", sentence.lower()))
+
+
+def remove_duplicate_sentences(text, seen):
+    """
+    Drop sentences of ``text`` already in ``seen``, keeping the original separators.
+
+    Args:
+        text (str): The passage text.
+        seen (set): Normalized sentences emitted so far; updated in place.
+    """
+    parts = SENTENCE_BOUNDARY_PATTERN.split(text)
+    kept = []
+    for index in range(0, len(parts), 2):
+        sentence = parts[index]
+        separator = parts[index + 1] if index + 1 < len(parts) else ""
+        normalized = normalize_sentence(sentence)
+        if len(normalized.split()) >= CONTEXT_MIN_DUPLICATE_WORDS:
+            if normalized in seen:
+                continue
+            seen.add(normalized)
+        kept.append(sentence + separator)
+    return "".join(kept).strip()
+
+
+def assemble_context(docs, max_tokens=CONTEXT_TOKEN_BUDGET):
+    """
+    Turn retrieved chunks into prompt context.
+
+    Overlapping or adjacent chunks of the same source are merged into one
+    passage, sentences repeated across passages are dropped and the passages
+    are joined most relevant first until ``max_tokens`` is reached.
+
+    Args:
+        docs (list): Retrieved Documents, most relevant first.
+        max_tokens (int): Token budget of the context.
+
+    Returns:
+        str: The context text.
+    """
+    with timed("context.assembly"):
+        seen = set()
+        passages = []
+        remaining = max_tokens
+        for passage in merge_chunks(docs):
+            text = remove_duplicate_sentences(passage.text, seen)
+            if not text:
+                continue
+            tokens = count_tokens(text)
+            if tokens > remaining:
+                if remaining >= CONTEXT_MIN_TRUNCATED_TOKENS:
+                    passages.append(truncate_to_tokens(text, remaining))
+                break
+            passages.append(text)
+            remaining -= tokens
+        context = "\n\n".join(passages)
+
+    record_value("context.retrieved_tokens", sum(count_tokens(doc.page_content) for doc in docs))
+    record_value("context.tokens", count_tokens(context))
+    return context
@@ -0,0 +1,132 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import streamlit as st
+import tiktoken
+
+from constants import (MEMORY_SUMMARY_MAX_TOKENS, MEMORY_SUMMARY_MAX_WORKERS, MEMORY_SUMMARY_MODEL,
+                       MEMORY_TOKEN_BUDGET, TOKENIZER_ENCODING, conversation_summary_prompt)
+from metrics import increment, record_value, timed
+from model_clients import get_client_registry
+
+executor = ThreadPoolExecutor(max_workers=MEMORY_SUMMARY_MAX_WORKERS, thread_name_prefix="memory-summary")
+
+
+@lru_cache(maxsize=None)
+def get_encoding():
+    return tiktoken.get_encoding(TOKENIZER_ENCODING)
+
+
+def count_tokens(text):
+    return len(get_encoding().encode(text))
+
+
+def truncate_to_tokens(text, max_tokens):
+    tokens = get_encoding().encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return get_encoding().decode(tokens[:max_tokens])
+
+
+def summarize_turns(llm_client, summary, turns, max_tokens):
+    """
+    Fold conversation turns into the running summary.
+
+    Args:
+        llm_client: The chat model used to write the summary.
+        summary (str): The current summary, may be empty.
+        turns (list): Formatted turns to fold in, oldest first.
+        max_tokens (int): Maximum length of the new summary in tokens.
+
+    Returns:
+        str: The updated summary.
+    """
+    prompt = conversation_summary_prompt.format(max_words=max_tokens * 3 // 4,
+                                                summary=summary or "None",
+                                                turns="\n\n".join(turns))
+    with timed("memory.summarize"):
+        response = llm_client.invoke(input=prompt)
+    return truncate_to_tokens(response.content.strip(), max_tokens)
+
+
+class ConversationMemory:
+    """
+    Prior turns of the agent conversation, kept within a token budget.
+
+    The most recent turns that fit in the budget left after the summary are
+    passed to the prompts verbatim. Turns that no longer fit are folded into
+    a rolling summary by a background LLM call, so the prompt stays the same
+    size however long the conversation gets and no turn waits for the
+    summarizer. A finished summary is picked up on the next turn.
+
+    Only agent questions and answers are recorded; validation prompts and
+    security answers never enter the memory.
+    """
+
+    def __init__(self, token_budget=MEMORY_TOKEN_BUDGET, summary_max_tokens=MEMORY_SUMMARY_MAX_TOKENS):
+        self.token_budget = token_budget
+        self.summary_max_tokens = summary_max_tokens
+        self.turns = []
+        self.summary = ""
+        # turns[:summarized_turns] are folded into the summary
+        self.summarized_turns = 0
+        self._pending_summary = None
+
+    def add_turn(self, query, response):
+        text = f"User: {query}\nAssistant: {response}"
+        self.turns.append((text, count_tokens(text)))
+        self._update_summary()
+
+    def _recent_turns(self):
+        budget = self.token_budget - self.summary_max_tokens
+        recent_turns = []
+        for text, tokens in reversed(self.turns[self.summarized_turns:]):
+            if tokens > budget:
+                break
+            recent_turns.append(text)
+            budget -= tokens
+        return recent_turns[::-1]
+
+    def _apply_finished_summary(self):
+        if self._pending_summary is None or not self._pending_summary[0].done():
+            return
+        future, summarized_turns = self._pending_summary
+        self._pending_summary = None
+        try:
+            self.summary = future.result()
+            self.summarized_turns = summarized_turns
+        except Exception as e:
+            increment("memory.summary_errors")
+            print("Error summarizing conversation:", e)
+
+    def _update_summary(self):
+        self._apply_finished_summary()
+        if self._pending_summary is not None:
+            return
+
+        unsummarized_turns = len(self.turns) - self.summarized_turns
+        overflow = unsummarized_turns - len(self._recent_turns())
+        if overflow <= 0:
+            return
+
+        turns = [text for text, _ in self.turns[self.summarized_turns:self.summarized_turns + overflow]]
+        llm_client = get_client_registry().get("chat", MEMORY_SUMMARY_MODEL)
+        future = executor.submit(summarize_turns, llm_client, self.summary, turns, self.summary_max_tokens)
+        self._pending_summary = (future, self.summarized_turns + overflow)
+
+    def render(self):
+        """
+        Return the summary and recent turns to inject into a prompt, or "" if there are none.
+        """
+        self._update_summary()
+        parts = [f"Summary of earlier turns: {self.summary}"] if self.summary else []
+        parts.extend(self._recent_turns())
+        conversation = "\n\n".join(parts)
+        record_value("memory.tokens", count_tokens(conversation))
+        return conversation
+
+
+def get_conversation_memory():
+    if "conversation_memory" not in st.session_state:
+        st.session_state.conversation_memory = ConversationMemory()
+    return st.session_state.conversation_memory
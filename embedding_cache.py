@@ -0,0 +1,115 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from constants import EMBEDDING_BATCH_SIZE, EMBEDDING_CACHE_PATH, QUERY_EMBEDDING_CACHE_SIZE
+from metrics import increment
+
+# SQLite limits the number of bound parameters per statement
+LOOKUP_BATCH_SIZE = 500
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper backed by a local SQLite store of float32 vectors.
+
+    Texts are keyed on hash(model, text). Each call deduplicates its texts,
+    looks them up locally and only sends the misses to the wrapped
+    embeddings, in batches of ``batch_size``.
+
+    Queries are user messages, which can carry customer data, so they are
+    never written to disk; the last ``query_cache_size`` of them are kept in
+    memory instead.
+    """
+
+    def __init__(self, embeddings, model, db_path=EMBEDDING_CACHE_PATH, batch_size=EMBEDDING_BATCH_SIZE,
+                 query_cache_size=QUERY_EMBEDDING_CACHE_SIZE):
+        self.embeddings = embeddings
+        self.model = model
+        self.batch_size = batch_size
+        self.query_cache_size = query_cache_size
+        self._queries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._connection.commit()
+
+    def _key(self, text):
+        return hashlib.sha256(f"{self.model}\0{text}".encode()).hexdigest()
+
+    def _load(self, keys):
+        vectors = {}
+        with self._lock:
+            for start in range(0, len(keys), LOOKUP_BATCH_SIZE):
+                batch = keys[start:start + LOOKUP_BATCH_SIZE]
+                rows = self._connection.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch)
+                for key, blob in rows:
+                    vectors[key] = np.frombuffer(blob, dtype=np.float32)
+        return vectors
+
+    def _store(self, vectors):
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, vector.tobytes()) for key, vector in vectors.items()])
+            self._connection.commit()
+
+    def embed_documents(self, texts):
+        keys = [self._key(text) for text in texts]
+        unique_texts = dict(zip(keys, texts))
+
+        vectors = self._load(list(unique_texts))
+        missing_keys = [key for key in unique_texts if key not in vectors]
+
+        for start in range(0, len(missing_keys), self.batch_size):
+            batch_keys = missing_keys[start:start + self.batch_size]
+            embedded = self.embeddings.embed_documents([unique_texts[key] for key in batch_keys])
+            batch_vectors = {key: np.asarray(vector, dtype=np.float32) for key, vector in zip(batch_keys, embedded)}
+            self._store(batch_vectors)
+            vectors.update(batch_vectors)
+
+        hits = len(unique_texts) - len(missing_keys)
+        with self._lock:
+            self.hits += hits
+            self.misses += len(missing_keys)
+        increment("embedding_cache.hits", hits)
+        increment("embedding_cache.misses", len(missing_keys))
+
+        return [vectors[key].tolist() for key in keys]
+
+    def embed_query(self, text):
+        key = self._key(text)
+        with self._lock:
+            vector = self._queries.get(key)
+            if vector is not None:
+                self._queries.move_to_end(key)
+        if vector is not None:
+            increment("embedding_cache.query_hits")
+            return vector
+
+        increment("embedding_cache.query_misses")
+        vector = self.embeddings.embed_query(text)
+        with self._lock:
+            self._queries[key] = vector
+            while len(self._queries) > self.query_cache_size:
+                self._queries.popitem(last=False)
+        return vector
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,180 @@
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+
+from constants import LOCAL_ROUTER_MIN_MARGIN, LOCAL_ROUTER_MIN_SIMILARITY, ROUTER_CACHE_SIZE
+
+GENERAL_AGENT = "general_agent"
+PERSONAL_CONCIERGE_AGENT = "personal_concierge_agent"
+
+# Queries about the user's own account, orders or details
+PERSONAL_PATTERNS = [
+    re.compile(r"\b(my|mine)\s+(\w+\s+){0,2}(orders?|account|purchases?|transactions?|balance|payments?|subscriptions?|deliver(y|ies)|refunds?|bills?|invoices?|cards?|profile|details|history|shipments?|package|points|statement|spending|plan)\b"),
+    re.compile(r"\b(i|i've|i have|did i|have i)\s+(ordered|bought|purchased|paid|spent|returned)\b"),
+    re.compile(r"\b(did|have|will)\s+i\s+(order|buy|purchase|pay|spend|receive|get)\b"),
+    re.compile(r"\bwhere('s| is)\s+my\b"),
+    re.compile(r"\b(last|latest|recent|previous)\s+(order|purchase|transaction|payment)s?\s+(i|of mine)\b"),
+    # "the order I placed", "the refund I requested", "the payment I made last week"
+    re.compile(r"\b(orders?|purchases?|payments?|transactions?|refunds?|returns?|packages?|parcels?|shipments?|deliver(y|ies)|items?|subscriptions?)"
+               r"\s+(that\s+|which\s+)?i\s+(\w+\s+)?(placed|made|ordered|bought|purchased|paid|sent|received|requested|submitted|returned|got)\b"),
+    re.compile(r"\bi\s+(placed|made|submitted|requested)\s+(an?|the)\s+(orders?|purchases?|payments?|returns?|refunds?)\b"),
+    re.compile(r"\b(do|did)\s+you\s+have\s+(\w+\s+){0,2}(for|about|on)\s+me\b"),
+]
+
+# Queries that are clearly not about the user's own data
+GENERAL_PATTERNS = [
+    re.compile(r"^(hi|hello|hey|good (morning|afternoon|evening)|thanks|thank you)\b[\w\s]{0,20}$"),
+    re.compile(r"^(what|who)\s+(are|is)\s+you\b"),
+    re.compile(r"\bwhat can you (do|help)\b"),
+]
+
+TRAINING_EXAMPLES = {
+    GENERAL_AGENT: [
+        "hello",
+        "hi there how are you",
+        "what can you help me with",
+        "what are your opening hours",
+        "what is your return policy",
+        "how long does shipping usually take",
+        "do you ship internationally",
+        "what payment methods do you accept",
+        "tell me about your company",
+        "what services do you offer",
+        "how do i contact customer support",
+        "where are your stores located",
+        "do you have a loyalty program",
+        "what is the warranty on your products",
+        "how do i reset a password",
+        "can you explain how the product works",
+        "what are the delivery options",
+        "is there a discount for students",
+        "what is the price of the premium plan",
+        "which products are on sale",
+        "how do refunds work in general",
+        "what is the capital of france",
+        "summarize the uploaded document",
+        "who founded the company",
+        "what are the features of the latest model",
+    ],
+    PERSONAL_CONCIERGE_AGENT: [
+        "where is my order",
+        "what did i buy last month",
+        "show me my purchase history",
+        "how much did i spend last week",
+        "what is my account balance",
+        "when will my package arrive",
+        "can you check the status of my refund",
+        "what was my last transaction",
+        "list my recent orders",
+        "did my payment go through",
+        "what is my current subscription plan",
+        "how many loyalty points do i have",
+        "update my delivery address",
+        "what items are in my last order",
+        "when did i place my last order",
+        "how much have i paid this year",
+        "cancel my order",
+        "what is my phone number on file",
+        "show my invoices",
+        "i want to know about my account details",
+        "have i returned anything recently",
+        "what was the total of my previous purchase",
+        "track my shipment",
+        "check my order status",
+        "what did i order yesterday",
+    ],
+}
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_query(query):
+    """
+    Lowercase the query, drop punctuation and collapse whitespace.
+    """
+    query = re.sub(r"[^\w\s']", " ", query.lower())
+    return WHITESPACE_PATTERN.sub(" ", query).strip()
+
+
+def extract_features(normalized_query):
+    tokens = TOKEN_PATTERN.findall(normalized_query)
+    return tokens + [f"{first} {second}" for first, second in zip(tokens, tokens[1:])]
+
+
+class CentroidClassifier:
+    """
+    Nearest-centroid classifier over TF-IDF vectors of labeled example queries.
+    """
+
+    def __init__(self, examples):
+        documents = [(label, extract_features(normalize_query(text)))
+                     for label, texts in examples.items() for text in texts]
+        document_frequency = Counter(feature for _, features in documents for feature in set(features))
+        self.idf = {
+            feature: math.log((1 + len(documents)) / (1 + frequency)) + 1
+            for feature, frequency in document_frequency.items()
+        }
+        self.centroids = {}
+        for label in examples:
+            centroid = Counter()
+            for document_label, features in documents:
+                if document_label == label:
+                    centroid.update(self.vectorize(features))
+            self.centroids[label] = self._normalize(centroid)
+
+    @staticmethod
+    def _normalize(vector):
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+        return {feature: weight / norm for feature, weight in vector.items()} if norm else {}
+
+    def vectorize(self, features):
+        counts = Counter(feature for feature in features if feature in self.idf)
+        return self._normalize({feature: count * self.idf[feature] for feature, count in counts.items()})
+
+    def scores(self, normalized_query):
+        vector = self.vectorize(extract_features(normalized_query))
+        return {
+            label: sum(weight * centroid.get(feature, 0.0) for feature, weight in vector.items())
+            for label, centroid in self.centroids.items()
+        }
+
+
+classifier = CentroidClassifier(TRAINING_EXAMPLES)
+
+
+def match_rules(normalized_query):
+    is_personal = any(pattern.search(normalized_query) for pattern in PERSONAL_PATTERNS)
+    is_general = any(pattern.search(normalized_query) for pattern in GENERAL_PATTERNS)
+    if is_personal != is_general:
+        return PERSONAL_CONCIERGE_AGENT if is_personal else GENERAL_AGENT
+    return None
+
+
+@lru_cache(maxsize=ROUTER_CACHE_SIZE)
+def classify_normalized_query(normalized_query):
+    route = match_rules(normalized_query)
+    if route:
+        return route, 1.0, True
+
+    scores = classifier.scores(normalized_query)
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    (best_route, best_score), (_, runner_up_score) = ranked[0], ranked[1]
+    margin = best_score - runner_up_score
+    is_confident = best_score >= LOCAL_ROUTER_MIN_SIMILARITY and margin >= LOCAL_ROUTER_MIN_MARGIN
+    return best_route, margin, is_confident
+
+
+def classify_intent(query):
+    """
+    Classify a query locally with keyword rules and the nearest-centroid model.
+
+    Args:
+        query (str): The user query.
+
+    Returns:
+        tuple: The best route, its confidence and whether the decision is
+            confident enough to skip the LLM router.
+    """
+    return classify_normalized_query(normalize_query(query))
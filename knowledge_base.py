@@ -0,0 +1,157 @@
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from constants import CHUNK_OVERLAP, CHUNK_SIZE, DEFAULT_RETRIEVER_BACKEND, KNOWLEDGE_BASE_MAX_WORKERS, RETRIEVER_K
+from metrics import timed
+from retrievers import InMemoryRetriever, build_index
+from vector_store import get_document_hash, get_embeddings, get_retriever_for_hashes, index_documents, release_documents, split_documents
+
+
+def chunk_documents(documents, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, source=None):
+    """
+    Split documents for an in-process retriever backend.
+
+    Returns:
+        tuple: The document hash and the chunk Documents.
+    """
+    doc_hash = get_document_hash(documents, chunk_size, chunk_overlap, source)
+    return doc_hash, split_documents(documents, chunk_size, chunk_overlap, source, doc_hash)
+
+
+class KnowledgeBase:
+    """
+    The set of documents one agent answers from, searched through a single retriever.
+
+    Documents are indexed into the shared persistent vector store and can be
+    added or removed incrementally; the chunks of a removed or replaced
+    document are deleted from the store once no knowledge base references
+    them. ``version`` changes whenever the document set does.
+
+    With an in-process backend (``bm25``, ``vector`` or ``hybrid``) the chunks
+    are kept in memory instead and searched by an index rebuilt whenever the
+    document set changes.
+    """
+
+    def __init__(self, backend=DEFAULT_RETRIEVER_BACKEND):
+        self.backend = backend
+        self.documents = {}
+        self.chunks = {}
+        self.version = 0
+        self._retriever = None
+        self._retriever_key = None
+        self._index = None
+        self._index_version = None
+
+    def sync(self, files, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP,
+             max_workers=KNOWLEDGE_BASE_MAX_WORKERS, progress_callback=None, backend=None):
+        """
+        Make the knowledge base match the given files.
+
+        New or changed files are chunked and embedded concurrently, files that
+        are no longer present are removed.
+
+        Args:
+            files (dict): File name -> document text.
+            chunk_size (int): Chunk size in tokens.
+            chunk_overlap (int): Chunk overlap in tokens.
+            max_workers (int): Maximum number of files indexed concurrently.
+            progress_callback (callable, optional): Called with (done, total)
+                on the calling thread after each file is indexed.
+            backend (str, optional): Retriever backend; switching it re-indexes every file.
+
+        Returns:
+            bool: Whether the document set changed.
+        """
+        if backend and backend != self.backend:
+            self._release(self.documents.values())
+            self.backend = backend
+            self.documents = {}
+            self.chunks = {}
+            self.version += 1
+
+        removed = [source for source in self.documents if source not in files]
+        self._release(self.documents[source] for source in removed)
+        for source in removed:
+            del self.documents[source]
+            self.chunks.pop(source, None)
+
+        pending = {
+            source: text for source, text in files.items()
+            if self.documents.get(source) != get_document_hash([text], chunk_size, chunk_overlap, source)
+        }
+
+        indexed = {}
+        if pending:
+            with timed("knowledge_base.sync"), ThreadPoolExecutor(max_workers=max_workers) as executor:
+                index = index_documents if self.backend == "chroma" else chunk_documents
+                futures = {
+                    executor.submit(index, [text], chunk_size, chunk_overlap, source): source
+                    for source, text in pending.items()
+                }
+                for done, future in enumerate(as_completed(futures), start=1):
+                    source = futures[future]
+                    try:
+                        if self.backend == "chroma":
+                            indexed[source] = future.result()
+                        else:
+                            indexed[source], self.chunks[source] = future.result()
+                    except Exception as e:
+                        print(f"Error indexing {source}:", e)
+                    if progress_callback:
+                        progress_callback(done, len(futures))
+
+        changed = bool(removed)
+        replaced = []
+        for source, doc_hash in indexed.items():
+            if self.documents.get(source) != doc_hash:
+                if source in self.documents:
+                    replaced.append(self.documents[source])
+                self.documents[source] = doc_hash
+                changed = True
+        self._release(replaced)
+
+        if changed:
+            self.version += 1
+        return changed
+
+    @property
+    def fingerprint(self):
+        """
+        Hash of the indexed document contents, equal for knowledge bases holding the same documents.
+        """
+        payload = json.dumps(sorted(self.documents.values()))
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def remove(self, source):
+        self.chunks.pop(source, None)
+        doc_hash = self.documents.pop(source, None)
+        if doc_hash:
+            self._release([doc_hash])
+            self.version += 1
+
+    def _release(self, doc_hashes):
+        if self.backend == "chroma":
+            release_documents(list(doc_hashes))
+
+    def get_retriever(self, k=RETRIEVER_K):
+        """
+        Return the retriever over all documents, or None when the knowledge base is empty.
+        """
+        if not self.documents:
+            return None
+        if self._retriever_key != (self.version, k):
+            if self.backend == "chroma":
+                self._retriever = get_retriever_for_hashes(self.documents.values(), k)
+            else:
+                self._retriever = InMemoryRetriever(index=self._get_index(), k=k)
+            self._retriever_key = (self.version, k)
+        return self._retriever
+
+    def _get_index(self):
+        if self._index_version != self.version:
+            chunks = [chunk for source in sorted(self.chunks) for chunk in self.chunks[source]]
+            embeddings = get_embeddings() if self.backend != "bm25" else None
+            self._index = build_index(chunks, self.backend, embeddings)
+            self._index_version = self.version
+        return self._index
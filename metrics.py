@@ -0,0 +1,112 @@
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+from constants import METRICS_MAX_SAMPLES
+
+_lock = threading.Lock()
+_timings = defaultdict(lambda: deque(maxlen=METRICS_MAX_SAMPLES))
+_counters = defaultdict(int)
+_values = defaultdict(lambda: deque(maxlen=METRICS_MAX_SAMPLES))
+
+
+def record_timing(name, seconds):
+    """
+    Record a duration sample for the named stage.
+
+    Args:
+        name (str): The stage name, e.g. ``general_agent.generation``.
+        seconds (float): The measured duration in seconds.
+    """
+    with _lock:
+        _timings[name].append(seconds)
+
+
+def record_value(name, value):
+    """
+    Record a sample of a non-timing quantity, e.g. ``general_agent.prompt_tokens``.
+    """
+    with _lock:
+        _values[name].append(value)
+
+
+@contextmanager
+def timed(name):
+    """
+    Context manager recording the wall time of its body under ``name``.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(name, time.perf_counter() - started)
+
+
+def increment(name, amount=1):
+    with _lock:
+        _counters[name] += amount
+
+
+def get_counter(name):
+    with _lock:
+        return _counters[name]
+
+
+def percentile(values, pct):
+    """
+    Return the ``pct`` percentile of ``values`` using nearest-rank.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[rank]
+
+
+def _summarize(samples_by_name):
+    with _lock:
+        snapshot = {name: list(samples) for name, samples in samples_by_name.items() if samples}
+    return {
+        name: {
+            "count": len(samples),
+            "last": samples[-1],
+            "p50": percentile(samples, 50),
+            "p95": percentile(samples, 95),
+            "p99": percentile(samples, 99),
+        }
+        for name, samples in sorted(snapshot.items())
+    }
+
+
+def get_timing_stats():
+    """
+    Summarize the recorded timings.
+
+    Returns:
+        dict: Stage name -> count, last, p50, p95 and p99 in seconds.
+    """
+    return _summarize(_timings)
+
+
+def get_value_stats():
+    """
+    Summarize the recorded values.
+
+    Returns:
+        dict: Name -> count, last, p50, p95 and p99.
+    """
+    return _summarize(_values)
+
+
+def get_counters():
+    with _lock:
+        return dict(sorted(_counters.items()))
+
+
+def reset_metrics():
+    with _lock:
+        _timings.clear()
+        _counters.clear()
+        _values.clear()
@@ -0,0 +1,142 @@
+import os
+import threading
+
+import httpx
+import streamlit as st
+from dotenv import load_dotenv
+from langchain_community.embeddings import OpenAIEmbeddings
+from langchain_openai import ChatOpenAI
+from openai import AsyncOpenAI, AzureOpenAI, OpenAI
+
+from constants import (CLIENT_CONNECT_TIMEOUT_SECONDS, CLIENT_HTTP2, CLIENT_KEEPALIVE_EXPIRY_SECONDS,
+                       CLIENT_MAX_CONNECTIONS, CLIENT_MAX_KEEPALIVE_CONNECTIONS, CLIENT_TIMEOUT_SECONDS)
+
+load_dotenv()
+
+DEFAULT_OPENAI_BASE_URL = "https://api.openai.com/v1"
+
+
+def is_http2_available():
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class ClientRegistry:
+    """
+    Process-wide registry of model clients keyed by (provider, model).
+
+    Every client shares one keep-alive httpx connection pool, so TLS
+    handshakes and client setup happen once per process instead of on
+    every request.
+    """
+
+    def __init__(self, max_connections=CLIENT_MAX_CONNECTIONS,
+                 max_keepalive_connections=CLIENT_MAX_KEEPALIVE_CONNECTIONS,
+                 keepalive_expiry=CLIENT_KEEPALIVE_EXPIRY_SECONDS,
+                 timeout=CLIENT_TIMEOUT_SECONDS, connect_timeout=CLIENT_CONNECT_TIMEOUT_SECONDS,
+                 http2=CLIENT_HTTP2):
+        self.base_url = os.getenv("OPENAI_BASE_URL") or DEFAULT_OPENAI_BASE_URL
+        self.http2 = http2 and is_http2_available()
+        limits = httpx.Limits(max_connections=max_connections,
+                              max_keepalive_connections=max_keepalive_connections,
+                              keepalive_expiry=keepalive_expiry)
+        timeouts = httpx.Timeout(timeout, connect=connect_timeout)
+        self.http_client = httpx.Client(http2=self.http2, limits=limits, timeout=timeouts)
+        # Only used from the turn engine event loop
+        self.async_http_client = httpx.AsyncClient(http2=self.http2, limits=limits, timeout=timeouts)
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider, model=None):
+        """
+        Return the shared client for (provider, model), creating it on first use.
+
+        Args:
+            provider (str): ``openai``, ``async_openai``, ``azure``, ``chat``
+                (LangChain chat model) or ``embeddings`` (LangChain embeddings).
+            model (str, optional): Model name for ``chat`` and ``embeddings``.
+        """
+        key = (provider, model)
+        with self._lock:
+            if key not in self._clients:
+                self._clients[key] = self._create(provider, model)
+            return self._clients[key]
+
+    def _create(self, provider, model):
+        if provider == "openai":
+            return OpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=self.base_url, http_client=self.http_client)
+        if provider == "async_openai":
+            return AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=self.base_url,
+                               http_client=self.async_http_client)
+        if provider == "azure":
+            return AzureOpenAI(azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT", ""),
+                               api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+                               api_version="2023-12-01-preview",
+                               http_client=self.http_client)
+        if provider == "chat":
+            return ChatOpenAI(api_key=os.getenv("OPENAI_API_KEY", ""), model=model, base_url=self.base_url,
+                              http_client=self.http_client, http_async_client=self.async_http_client,
+                              verbose=True)
+        if provider == "embeddings":
+            return OpenAIEmbeddings(api_key=os.getenv("OPENAI_API_KEY"), model=model, base_url=self.base_url,
+                                    http_client=self.http_client)
+        raise ValueError(f"Unknown model client provider: {provider}")
+
+    def prewarm(self):
+        """
+        Open a connection to the API so the first request skips DNS and TLS setup.
+        """
+        try:
+            self.http_client.head(self.base_url)
+        except httpx.HTTPError as e:
+            print("Error pre-warming model client connections:", e)
+
+    def stats(self):
+        """
+        Return the client count and the connections open in the shared pool.
+
+        httpx does not expose its connection pool, so the connection counts
+        are None when its internals are not laid out as expected.
+        """
+        stats = {"clients": len(self._clients), "http2": self.http2, "connections": None, "idle_connections": None}
+        pool = getattr(getattr(self.http_client, "_transport", None), "_pool", None)
+        try:
+            connections = list(pool.connections)
+            stats["connections"] = len(connections)
+            stats["idle_connections"] = sum(1 for connection in connections if connection.is_idle())
+        except (AttributeError, TypeError):
+            pass
+        return stats
+
+
+@st.cache_resource(show_spinner=False)
+def get_shared_client_registry():
+    """
+    Return the client registry shared by all Streamlit sessions of this process.
+    """
+    return ClientRegistry()
+
+
+_local_client_registry = None
+_local_client_registry_lock = threading.Lock()
+
+
+def get_client_registry():
+    """
+    Return the process-wide client registry.
+
+    Inside a Streamlit app the registry lives in ``st.cache_resource``; when
+    running without the Streamlit runtime (scripts, benchmarks) a module
+    level instance is used instead.
+    """
+    if st.runtime.exists():
+        return get_shared_client_registry()
+
+    global _local_client_registry
+    with _local_client_registry_lock:
+        if _local_client_registry is None:
+            _local_client_registry = ClientRegistry()
+        return _local_client_registry
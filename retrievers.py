@@ -0,0 +1,157 @@
+import re
+from collections import Counter, defaultdict
+from typing import Any, List
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from constants import BM25_B, BM25_K1, HYBRID_CANDIDATE_MULTIPLIER, HYBRID_RRF_K, RETRIEVER_K
+from metrics import timed
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def top_k(scores, k):
+    """
+    Return (index, score) pairs of the ``k`` highest positive scores, best first.
+    """
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+    return [(int(index), float(scores[index])) for index in ranked if scores[index] > 0]
+
+
+class BM25Index:
+    """
+    In-memory Okapi BM25 index over chunk texts.
+
+    The BM25 weight of every (term, chunk) posting is computed at build time,
+    so a query only sums the posting weights of its terms. No network call
+    is made at query time.
+    """
+
+    name = "bm25"
+
+    def __init__(self, documents, k1=BM25_K1, b=BM25_B):
+        self.documents = documents
+        token_lists = [tokenize(document.page_content) for document in documents]
+        doc_lengths = np.array([len(tokens) for tokens in token_lists], dtype=np.float32)
+        length_norm = k1 * (1 - b + b * doc_lengths / (doc_lengths.mean() if len(documents) else 1.0))
+
+        postings = defaultdict(lambda: ([], []))
+        for doc_id, tokens in enumerate(token_lists):
+            for term, frequency in Counter(tokens).items():
+                postings[term][0].append(doc_id)
+                postings[term][1].append(frequency)
+
+        self.postings = {}
+        for term, (doc_ids, frequencies) in postings.items():
+            doc_ids = np.array(doc_ids, dtype=np.int32)
+            frequencies = np.array(frequencies, dtype=np.float32)
+            idf = np.log1p((len(documents) - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+            weights = idf * frequencies * (k1 + 1) / (frequencies + length_norm[doc_ids])
+            self.postings[term] = (doc_ids, weights.astype(np.float32))
+
+    def search(self, query, k):
+        scores = np.zeros(len(self.documents), dtype=np.float32)
+        for term in set(tokenize(query)):
+            if term in self.postings:
+                doc_ids, weights = self.postings[term]
+                scores[doc_ids] += weights
+        return top_k(scores, k)
+
+    def nbytes(self):
+        return sum(doc_ids.nbytes + weights.nbytes for doc_ids, weights in self.postings.values())
+
+
+class VectorIndex:
+    """
+    Chunk embeddings in one contiguous, L2-normalized float32 matrix.
+
+    A query is embedded once and scored against every chunk with a single
+    matrix-vector product.
+    """
+
+    name = "vector"
+
+    def __init__(self, documents, embeddings):
+        self.documents = documents
+        self.embeddings = embeddings
+        vectors = np.asarray(embeddings.embed_documents([document.page_content for document in documents]),
+                             dtype=np.float32).reshape(len(documents), -1)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.matrix = np.ascontiguousarray(vectors / np.where(norms == 0, 1, norms))
+
+    def search(self, query, k):
+        query_vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        query_vector /= np.linalg.norm(query_vector) or 1.0
+        return top_k(self.matrix @ query_vector, k)
+
+    def nbytes(self):
+        return self.matrix.nbytes
+
+
+class HybridIndex:
+    """
+    Reciprocal rank fusion of a BM25 and a vector index over the same chunks.
+    """
+
+    name = "hybrid"
+
+    def __init__(self, documents, embeddings, candidate_multiplier=HYBRID_CANDIDATE_MULTIPLIER, rrf_k=HYBRID_RRF_K):
+        self.documents = documents
+        self.lexical = BM25Index(documents)
+        self.semantic = VectorIndex(documents, embeddings)
+        self.candidate_multiplier = candidate_multiplier
+        self.rrf_k = rrf_k
+
+    def search(self, query, k):
+        scores = np.zeros(len(self.documents), dtype=np.float32)
+        candidates = k * self.candidate_multiplier
+        for index in (self.lexical, self.semantic):
+            for rank, (doc_id, _) in enumerate(index.search(query, candidates)):
+                scores[doc_id] += 1.0 / (self.rrf_k + rank + 1)
+        return top_k(scores, k)
+
+    def nbytes(self):
+        return self.lexical.nbytes() + self.semantic.nbytes()
+
+
+def build_index(documents, backend, embeddings=None):
+    """
+    Build an in-process index over chunk Documents.
+
+    Args:
+        documents (list): The chunks.
+        backend (str): ``bm25``, ``vector`` or ``hybrid``.
+        embeddings (Embeddings, optional): Required for ``vector`` and ``hybrid``.
+    """
+    with timed(f"index.{backend}_build"):
+        if backend == "bm25":
+            return BM25Index(documents)
+        if backend == "vector":
+            return VectorIndex(documents, embeddings)
+        if backend == "hybrid":
+            return HybridIndex(documents, embeddings)
+    raise ValueError(f"Unknown in-process retriever backend: {backend}")
+
+
+class InMemoryRetriever(BaseRetriever):
+    """
+    LangChain retriever over an in-process index, usable wherever the Chroma retriever is.
+    """
+
+    index: Any
+    k: int = RETRIEVER_K
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        with timed(f"retrieval.{self.index.name}"):
+            return [self.index.documents[doc_id] for doc_id, _ in self.index.search(query, self.k)]
@@ -1,12 +1,13 @@
-import os
 import re
-from langchain_openai import ChatOpenAI
 
+from constants import TURN_STAGE_TIMEOUTS
+from intent_classifier import classify_intent
+from metrics import increment, timed
+from model_clients import get_client_registry
+from turn_engine import StageTimeoutError
 
-openai_generic_client = ChatOpenAI(
-    api_key=os.getenv("OPENAI_API_KEY", ""),
-    model="gpt-4o",
-)
+
+openai_generic_client = get_client_registry().get("chat", "gpt-4o")
 
 generic_prompt = """ 
 
@@ -30,22 +31,67 @@ Agent:
 """
 
 
-def router_agent(query):
-    """ 
-    Generic agent inorder to make desicion for the chatbot
-    """
-    prompt_with_input = generic_prompt.format(input=query)
-    response = openai_generic_client.invoke(
-        input=prompt_with_input
-    )
+def parse_router_response(content):
     # Use regular expression to extract agent name from response
     agent_pattern = r"Agent:\s*(general_agent|personal_concierge_agent)"
-    match = re.search(agent_pattern, response.content, re.IGNORECASE)
+    match = re.search(agent_pattern, content, re.IGNORECASE)
 
     if match:
-        agent_name = match.group(1)
-        print(f"Routing to {agent_name.replace('_', ' ').title()} Agent")
-        return agent_name
+        return match.group(1).lower()
+    print("Invalid response from the agent")
+    return None
+
+
+def llm_router_agent(query):
+    """ 
+    Ask the LLM which agent should handle the query.
+
+    Returns:
+        str: The agent name, or None when the response could not be parsed.
+    """
+    prompt_with_input = generic_prompt.format(input=query)
+    with timed("router.llm"):
+        response = openai_generic_client.invoke(
+            input=prompt_with_input
+        )
+    return parse_router_response(response.content)
+
+
+async def llm_router_agent_async(query):
+    """
+    Async version of ``llm_router_agent`` for the turn engine.
+    """
+    prompt_with_input = generic_prompt.format(input=query)
+    response = await openai_generic_client.ainvoke(input=prompt_with_input)
+    return parse_router_response(response.content)
+
+
+def router_agent(query, engine=None):
+    """ 
+    Generic agent inorder to make desicion for the chatbot
+
+    Confidently classified queries are routed locally; the LLM router is
+    only consulted when the local classifier is unsure. If the LLM response
+    cannot be parsed, or the engine router stage times out, the local best
+    guess is used.
+    """
+    with timed("router.local"):
+        agent_name, confidence, is_confident = classify_intent(query)
+
+    if is_confident:
+        increment("router.local_decisions")
     else:
-        print("Invalid response from the agent")
-        return None
+        increment("router.llm_decisions")
+        if engine:
+            try:
+                with timed("router.llm"):
+                    llm_agent_name = engine.run(llm_router_agent_async(query), "router", TURN_STAGE_TIMEOUTS["router"])
+            except StageTimeoutError as e:
+                print("Error routing query:", e)
+                llm_agent_name = None
+        else:
+            llm_agent_name = llm_router_agent(query)
+        agent_name = llm_agent_name or agent_name
+
+    print(f"Routing to {agent_name.replace('_', ' ').title()} Agent")
+    return agent_name
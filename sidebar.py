@@ -3,7 +3,14 @@ import os
 import pandas as pd
 import streamlit as st
 
-from chat_utils import get_retriever_from_documents
+from answer_cache import get_answer_cache
+from audio_cache import audio_cache
+from chat_utils import TransactionStore, invalidate_cached_answers
+from constants import AUDIO_STORAGE_MODES, CHUNK_OVERLAP, CHUNK_SIZE, CONTEXT_TOKEN_BUDGET, DEFAULT_RETRIEVER_BACKEND, HISTORY_WINDOW_SIZE, RETRIEVER_BACKENDS, RETRIEVER_K, SPECULATION_POLICIES
+from knowledge_base import KnowledgeBase
+from validation_agent import build_user_index
+from metrics import get_counter, get_counters, get_timing_stats, get_value_stats
+from model_clients import get_client_registry
 
 openai_api_key = os.getenv("OPENAI_API_KEY")
 
@@ -38,6 +45,220 @@ def configure_gpt_model():
         )
 
 
+def configure_retrieval_settings():
+    """
+    Render the chunking and retrieval options used when indexing uploaded documents.
+    """
+    if "chunk_size" not in st.session_state:
+        st.session_state.chunk_size = CHUNK_SIZE
+    if "chunk_overlap" not in st.session_state:
+        st.session_state.chunk_overlap = CHUNK_OVERLAP
+    if "retriever_k" not in st.session_state:
+        st.session_state.retriever_k = RETRIEVER_K
+    if "retriever_backend" not in st.session_state:
+        st.session_state.retriever_backend = DEFAULT_RETRIEVER_BACKEND
+    if "context_token_budget" not in st.session_state:
+        st.session_state.context_token_budget = CONTEXT_TOKEN_BUDGET
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.number_input("Chunk size (tokens)", min_value=16, max_value=2000, step=16, key="chunk_size")
+    with col2:
+        st.number_input("Overlap (tokens)", min_value=0, max_value=500, step=4, key="chunk_overlap")
+    with col3:
+        st.number_input("Top k", min_value=1, max_value=20, key="retriever_k")
+
+    st.selectbox(
+            label="Retriever backend",
+            options=RETRIEVER_BACKENDS,
+            key="retriever_backend",
+            help="chroma: persistent vector store. bm25: in-memory keyword index, no API call per query. "
+                 "vector: in-memory embedding matrix. hybrid: bm25 and vector results fused by rank."
+        )
+    st.number_input("Context budget (tokens)", min_value=100, max_value=8000, step=100, key="context_token_budget",
+                    help="Retrieved chunks are merged, de-duplicated and cut to this size before prompting.")
+
+
+def get_retriever_settings():
+    return {
+        "chunk_size": st.session_state.chunk_size,
+        "chunk_overlap": min(st.session_state.chunk_overlap, st.session_state.chunk_size - 1),
+        "k": st.session_state.retriever_k,
+        "backend": st.session_state.retriever_backend,
+    }
+
+
+def sync_knowledge_base(knowledge_base_key, retriever_key, uploaded_files, on_change=None):
+    """
+    Bring an agent's knowledge base in line with its uploaded text files.
+
+    New and changed files are indexed in parallel with a progress bar, removed
+    files are dropped, and the agent retriever is updated accordingly.
+
+    Args:
+        knowledge_base_key (str): Session state key of the KnowledgeBase.
+        retriever_key (str): Session state key the agent reads its retriever from.
+        uploaded_files (list): The uploaded text files.
+        on_change (callable, optional): Called with the previous knowledge base
+            fingerprint when the document set changed.
+    """
+    if knowledge_base_key not in st.session_state:
+        st.session_state[knowledge_base_key] = KnowledgeBase()
+    knowledge_base = st.session_state[knowledge_base_key]
+
+    settings = get_retriever_settings()
+    files = {uploaded_file.name: uploaded_file.getvalue().decode() for uploaded_file in uploaded_files}
+
+    progress_bar = None
+
+    def show_progress(done, total):
+        nonlocal progress_bar
+        if progress_bar is None:
+            progress_bar = st.progress(0.0)
+        progress_bar.progress(done / total, text=f"Indexed {done} of {total} files")
+
+    previous_fingerprint = knowledge_base.fingerprint
+    changed = knowledge_base.sync(files, settings["chunk_size"], settings["chunk_overlap"],
+                                  progress_callback=show_progress, backend=settings["backend"])
+    if changed and on_change:
+        on_change(previous_fingerprint)
+    if progress_bar is not None:
+        progress_bar.empty()
+
+    retriever = knowledge_base.get_retriever(settings["k"])
+    if retriever is None:
+        st.session_state.pop(retriever_key, None)
+    else:
+        st.session_state[retriever_key] = retriever
+
+
+def configure_audio_settings():
+    """
+    Render the audio reply options.
+    """
+    if "tts_streaming" not in st.session_state:
+        st.session_state.tts_streaming = True
+
+    st.checkbox(
+            "Stream audio replies sentence by sentence",
+            key="tts_streaming"
+        )
+
+    if "audio_storage" not in st.session_state:
+        st.session_state.audio_storage = "memory"
+
+    st.selectbox(
+            label="Reply audio storage",
+            options=AUDIO_STORAGE_MODES,
+            key="audio_storage",
+            help="Keep compressed reply audio in a bounded in-memory store instead of files under audio/."
+        )
+
+    if "audio_store" in st.session_state:
+        store_stats = st.session_state.audio_store.stats()
+        st.caption(f"Reply audio in memory: {store_stats['entries']} clips ({store_stats['total_bytes'] / 1024 / 1024:.1f} MB)")
+
+    if "stt_split" not in st.session_state:
+        st.session_state.stt_split = True
+
+    st.checkbox(
+            "Split long recordings and transcribe the parts in parallel",
+            key="stt_split"
+        )
+
+    raw_bytes = get_counter("stt.bytes_raw")
+    if raw_bytes:
+        saved_bytes = max(0, raw_bytes - get_counter("stt.bytes_uploaded"))
+        st.caption(f"Recording uploads: {saved_bytes / 1024:.0f} KB saved ({saved_bytes / raw_bytes:.0%} of the raw audio)")
+
+    cache_stats = audio_cache.stats()
+    st.caption(
+        f"TTS cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+        f"{cache_stats['entries']} clips ({cache_stats['total_bytes'] / 1024 / 1024:.1f} MB)"
+    )
+
+
+def configure_performance_settings():
+    """
+    Render the response streaming option and the collected latency metrics.
+    """
+    if "stream_responses" not in st.session_state:
+        st.session_state.stream_responses = True
+
+    st.checkbox(
+            "Stream answers token by token",
+            key="stream_responses"
+        )
+
+    if "speculation_policy" not in st.session_state:
+        st.session_state.speculation_policy = "retrieval"
+
+    st.selectbox(
+            label="Speculative general agent work while routing",
+            options=SPECULATION_POLICIES,
+            key="speculation_policy",
+            help="Start retrieval (or the whole general answer) while the LLM router decides."
+        )
+
+    if "use_turn_engine" not in st.session_state:
+        st.session_state.use_turn_engine = False
+
+    st.checkbox(
+            "Run turns on the async engine",
+            key="use_turn_engine",
+            help="Run speech-to-text, routing, generation and text-to-speech on the shared asyncio engine "
+                 "with per-stage timeouts. Reply audio is synthesized while the rest of the turn continues."
+        )
+
+    if "answer_cache_enabled" not in st.session_state:
+        st.session_state.answer_cache_enabled = True
+
+    st.checkbox(
+            "Reuse cached answers for repeated general questions",
+            key="answer_cache_enabled"
+        )
+    answer_cache_stats = get_answer_cache().stats()
+    st.caption(
+        f"Answer cache: {answer_cache_stats['hit_rate']:.0%} hit rate ({answer_cache_stats['exact_hits']} exact, "
+        f"{answer_cache_stats['semantic_hits']} similar, {answer_cache_stats['misses']} misses), "
+        f"{answer_cache_stats['entries']} answers"
+    )
+
+    if "history_window" not in st.session_state:
+        st.session_state.history_window = HISTORY_WINDOW_SIZE
+
+    st.number_input(
+            label="Messages shown per history page",
+            min_value=2,
+            max_value=200,
+            step=10,
+            key="history_window",
+            help="Older messages are behind a \"Show earlier messages\" button and are not re-rendered on every rerun."
+        )
+
+    with st.expander("Latency metrics"):
+        timing_stats = get_timing_stats()
+        if not timing_stats:
+            st.caption("No turns recorded yet.")
+        for name, stats in timing_stats.items():
+            st.caption(
+                f"{name}: last {stats['last'] * 1000:.0f} ms, p50 {stats['p50'] * 1000:.0f} ms, "
+                f"p95 {stats['p95'] * 1000:.0f} ms ({stats['count']} samples)"
+            )
+        for name, stats in get_value_stats().items():
+            st.caption(f"{name}: last {stats['last']:.0f}, p50 {stats['p50']:.0f}, p95 {stats['p95']:.0f} ({stats['count']} samples)")
+        for name, value in get_counters().items():
+            st.caption(f"{name}: {value}")
+
+        pool_stats = get_client_registry().stats()
+        if pool_stats["connections"] is None:
+            connections = "unknown"
+        else:
+            connections = f"{pool_stats['connections']} ({pool_stats['idle_connections']} idle)"
+        st.caption(f"Model clients: {pool_stats['clients']}, connections: {connections}, "
+                   f"HTTP/2 {'on' if pool_stats['http2'] else 'off'}")
+
+
 def save_changes():
     """
     Render a button to save changes and update the GPT model version.
@@ -62,6 +283,11 @@ def configure_sidebar():
         st.header("Agent Configuration")
         st.divider()
 
+        st.subheader("Retrieval")
+        configure_retrieval_settings()
+
+        st.divider()
+
         st.subheader("General Agent")
         
         st.text_area(
@@ -71,15 +297,8 @@ def configure_sidebar():
                                           accept_multiple_files=True,
                                           type=["txt"],
                                           key="general_agent")
-        if uploaded_files:
-            for uploaded_file in uploaded_files:
-
-                documents = [uploaded_file.read().decode()]
-
-                retriever = get_retriever_from_documents(documents)
-
-                if "retriever" not in st.session_state:
-                    st.session_state.retriever = retriever
+        sync_knowledge_base("general_agent_knowledge_base", "retriever", uploaded_files or [],
+                            on_change=invalidate_cached_answers)
 
         st.divider()
 
@@ -91,10 +310,15 @@ def configure_sidebar():
         if uploaded_files:
             for uploaded_file in uploaded_files:
                 st.write("Filename is:", uploaded_file.name)
+
+            # The last uploaded file wins; parse and index it once per upload, not on every rerun
+            uploaded_file = uploaded_files[-1]
+            if st.session_state.get("user_data_file_id") != uploaded_file.file_id:
                 user_data = pd.read_csv(uploaded_file)
 
                 st.session_state.user_data = user_data
-                
+                st.session_state.user_index = build_user_index(user_data)
+                st.session_state.user_data_file_id = uploaded_file.file_id
 
         st.divider()
 
@@ -103,18 +327,30 @@ def configure_sidebar():
         uploaded_files = st.file_uploader("Upload Files",
                                           accept_multiple_files=True,
                                           key="personal_agent")
-        if uploaded_files:
-            for uploaded_file in uploaded_files:
-                st.write("Filename:", uploaded_file.name)
-                if uploaded_file.type == "text/csv":
-                    user_transactional_data= pd.read_csv(uploaded_file)
-                    st.session_state.user_transactional_data = user_transactional_data
-                
-                if uploaded_file.type == "text/plain":
-                    text_documents = [uploaded_file.read().decode()]
-                    personal_agent_retriever = get_retriever_from_documents(text_documents)
-                    if "personal_agent_retriever":
-                        st.session_state.personal_agent_retriever= personal_agent_retriever
+        text_files = []
+        for uploaded_file in uploaded_files or []:
+            st.write("Filename:", uploaded_file.name)
+            # Partition the transactions once per upload, not on every rerun
+            if uploaded_file.type == "text/csv" and st.session_state.get("user_transactional_data_file_id") != uploaded_file.file_id:
+                user_transactional_data= pd.read_csv(uploaded_file)
+                st.session_state.user_transactional_data = user_transactional_data
+                st.session_state.transaction_store = TransactionStore(user_transactional_data, uploaded_file.file_id)
+                st.session_state.user_transactional_data_file_id = uploaded_file.file_id
+            
+            if uploaded_file.type == "text/plain":
+                text_files.append(uploaded_file)
+
+        sync_knowledge_base("personal_agent_knowledge_base", "personal_agent_retriever", text_files)
+
+        st.divider()
+
+        st.subheader("Audio")
+        configure_audio_settings()
+
+        st.divider()
+
+        st.subheader("Performance")
+        configure_performance_settings()
 
         st.divider()
 
@@ -0,0 +1,56 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from constants import SPECULATION_MAX_WORKERS
+from metrics import increment, record_timing
+
+executor = ThreadPoolExecutor(max_workers=SPECULATION_MAX_WORKERS, thread_name_prefix="speculation")
+
+
+class SpeculativeTask:
+    """
+    Background work started before we know whether it will be needed.
+
+    The task is either kept, in which case its result is awaited and the
+    time it already ran in the background is recorded as saved, or
+    discarded, in which case it is cancelled if it has not started yet and
+    its run time is recorded as wasted otherwise.
+
+    The callable must not touch ``st.session_state``; capture everything it
+    needs on the script thread before starting the task.
+    """
+
+    def __init__(self, name, fn, *args):
+        self.name = name
+        self.started_at = time.perf_counter()
+        self.finished_at = None
+        self.future = executor.submit(self._run, fn, *args)
+
+    def _run(self, fn, *args):
+        try:
+            return fn(*args)
+        finally:
+            self.finished_at = time.perf_counter()
+
+    def keep(self):
+        """
+        Wait for the speculative result.
+
+        Returns:
+            The result, or None if the speculative work failed.
+        """
+        saved = (self.finished_at or time.perf_counter()) - self.started_at
+        record_timing(f"speculation.{self.name}.saved", saved)
+        increment(f"speculation.{self.name}.kept")
+        try:
+            return self.future.result()
+        except Exception as e:
+            print("Error in speculative work:", e)
+            return None
+
+    def discard(self):
+        increment(f"speculation.{self.name}.discarded")
+        if self.future.cancel():
+            return
+        self.future.add_done_callback(
+            lambda _: record_timing(f"speculation.{self.name}.wasted", self.finished_at - self.started_at))
@@ -0,0 +1,6 @@
+import os
+
+# The model clients are created at import time; no request is sent in the tests
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "test")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://test")
@@ -0,0 +1,101 @@
+import pytest
+from streamlit.testing.v1 import AppTest
+
+import answer_cache
+import chat_utils
+import conversation_memory
+
+
+def general_agent_app():
+    import streamlit as st
+
+    from chat_history import ChatHistory
+    from chat_interface import handle_general_agent
+    from conversation_memory import get_conversation_memory
+
+    if "messages" not in st.session_state:
+        st.session_state.messages = ChatHistory()
+        st.session_state.general_agent_system_message = ""
+        st.session_state.gpt_version = "4o"
+
+    personal_turn = st.session_state.pop("personal_turn", None)
+    if personal_turn:
+        get_conversation_memory().add_turn(*personal_turn)
+
+    prompt = st.session_state.pop("prompt", None)
+    if prompt:
+        handle_general_agent(prompt)
+
+
+class FakeEmbeddings:
+    def embed_query(self, text):
+        return [1.0, float(len(text))]
+
+
+def fake_generate_rag_response(prompt, context=None, engine=None, standalone=False):
+    """
+    Answer with the session's ``llm_answer``, followed by the conversation when the prompt includes it.
+    """
+    import streamlit as st
+
+    if standalone:
+        return st.session_state.llm_answer
+    return f"{st.session_state.llm_answer} {conversation_memory.get_conversation_memory().render()}".strip()
+
+
+@pytest.fixture(autouse=True)
+def offline_general_agent(monkeypatch):
+    """
+    Skip the LLM, audio, embeddings and the tokenizer download.
+    """
+    # The audio recorder component can only be declared inside a Streamlit runtime
+    AppTest.from_string("import chat_interface").run()
+    import chat_interface
+
+    monkeypatch.setattr(chat_interface, "generate_rag_response", fake_generate_rag_response)
+    monkeypatch.setattr(chat_interface, "play_reply_audio", lambda content, audio_file_name=None, audio_key=None: None)
+    monkeypatch.setattr(chat_utils, "get_embeddings", FakeEmbeddings)
+    monkeypatch.setattr(conversation_memory, "count_tokens", lambda text: len(text.split()))
+    monkeypatch.setattr(answer_cache, "_local_answer_cache", None)
+    answer_cache.get_shared_answer_cache.clear()
+
+
+def new_session():
+    session = AppTest.from_function(general_agent_app, default_timeout=30)
+    session.run()
+    return session
+
+
+def ask(session, prompt, llm_answer):
+    session.session_state["prompt"] = prompt
+    session.session_state["llm_answer"] = llm_answer
+    session.run()
+    assert not session.exception
+    return session.chat_message[-1].markdown[0].value
+
+
+def test_first_question_is_answered_from_another_session():
+    first, second = new_session(), new_session()
+
+    assert ask(first, "What are your opening hours?", "We are open 9 to 5.") == "We are open 9 to 5."
+    assert ask(second, "What are your opening hours?", "Generated again.") == "We are open 9 to 5."
+
+
+def test_later_question_is_answered_without_the_conversation_and_shared():
+    first, second = new_session(), new_session()
+    first.session_state["personal_turn"] = ("What is my balance?", "Your balance is $1,234.")
+    first.run()
+
+    assert ask(first, "What are your opening hours?", "We are open 9 to 5.") == "We are open 9 to 5."
+    assert ask(second, "What are your opening hours?", "Generated again.") == "We are open 9 to 5."
+
+
+def test_follow_up_after_personal_turn_is_not_shared():
+    first, second = new_session(), new_session()
+    first.session_state["personal_turn"] = ("What is my balance?", "Your balance is $1,234.")
+    first.run()
+    second.session_state["personal_turn"] = ("Hello", "Hi, how can I help?")
+    second.run()
+
+    assert "$1,234" in ask(first, "Can you say that again?", "Sure.")
+    assert "$1,234" not in ask(second, "Can you say that again?", "Sure.")
@@ -0,0 +1,27 @@
+import pytest
+
+from intent_classifier import GENERAL_AGENT, PERSONAL_CONCIERGE_AGENT, classify_intent
+
+
+@pytest.mark.parametrize("query", [
+    "Can you tell me the status of the order I placed?",
+    "Has the package I ordered shipped yet?",
+    "What happened to the refund I requested?",
+    "Is the payment I made last Tuesday processed?",
+    "I placed an order last week, where is it?",
+    "What address do you have for me?",
+    "Where is my order?",
+])
+def test_personal_queries_are_never_confidently_general(query):
+    route, _, is_confident = classify_intent(query)
+    assert route == PERSONAL_CONCIERGE_AGENT or not is_confident
+
+
+@pytest.mark.parametrize("query", [
+    "What is your return policy?",
+    "How do I return an item?",
+    "What are your opening hours?",
+])
+def test_general_queries_stay_general(query):
+    route, _, is_confident = classify_intent(query)
+    assert route == GENERAL_AGENT or not is_confident
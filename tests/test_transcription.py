@@ -0,0 +1,47 @@
+import pytest
+from pydub import AudioSegment
+
+import audio_utils
+from constants import STT_SPLIT_MIN_DURATION_MS
+
+FIRST_MS, SECOND_MS = STT_SPLIT_MIN_DURATION_MS, STT_SPLIT_MIN_DURATION_MS // 2
+RECORDING = AudioSegment.silent(FIRST_MS + SECOND_MS)
+
+
+@pytest.fixture
+def fake_whisper(monkeypatch):
+    """
+    Transcribe chunks by length, failing the lengths listed in ``failures`` as often as given.
+    """
+    transcripts = {FIRST_MS: "hello there", SECOND_MS: "how are you", len(RECORDING): "hello there how are you"}
+    failures = {}
+    requests = []
+
+    def transcribe_chunk(chunk, engine=None):
+        requests.append(len(chunk))
+        if failures.get(len(chunk), 0):
+            failures[len(chunk)] -= 1
+            return None
+        return transcripts[len(chunk)]
+
+    monkeypatch.setattr(audio_utils, "prepare_recording", lambda segment: segment)
+    monkeypatch.setattr(audio_utils, "split_recording",
+                        lambda segment: [(segment[:FIRST_MS], False), (segment[FIRST_MS:], False)])
+    monkeypatch.setattr(audio_utils, "transcribe_chunk", transcribe_chunk)
+    return failures, requests
+
+
+def test_failed_chunk_is_retried(fake_whisper):
+    failures, requests = fake_whisper
+    failures[SECOND_MS] = 1
+
+    assert audio_utils.transcribe_recording(RECORDING, split=True) == "hello there how are you"
+    assert sorted(requests) == [SECOND_MS, SECOND_MS, FIRST_MS]
+
+
+def test_chunk_failing_again_falls_back_to_one_request(fake_whisper):
+    failures, requests = fake_whisper
+    failures[SECOND_MS] = 2
+
+    assert audio_utils.transcribe_recording(RECORDING, split=True) == "hello there how are you"
+    assert requests[-1] == len(RECORDING)
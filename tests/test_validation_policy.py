@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+
+import pytest
+
+import validation_agent
+from validation_agent import get_validation_policy
+
+
+@pytest.mark.parametrize("instructions", [
+    "Answers must match exactly.",
+    "The answer is case sensitive.",
+    "Be strict when comparing the answers.",
+])
+def test_positive_phrasing_is_strict(instructions):
+    assert get_validation_policy(instructions).strictness == "strict"
+
+
+@pytest.mark.parametrize("instructions", [
+    "Answers are not case sensitive.",
+    "The answer doesn't have to be exact.",
+    "No need for an exact match, compare the answers.",
+    "Never be strict about the answers.",
+])
+def test_negated_phrasing_is_not_strict(instructions):
+    policy = get_validation_policy(instructions)
+    assert policy.strictness != "strict"
+    assert not policy.case_sensitive
+
+
+def test_negated_strictness_keeps_lenient_keywords():
+    assert get_validation_policy("Don't be strict, allow typos.").strictness == "lenient"
+
+
+def validate(instructions, correct_answer, user_answer, monkeypatch):
+    session_state = SimpleNamespace(validation_agent_system_message=instructions)
+    monkeypatch.setattr(validation_agent, "st", SimpleNamespace(session_state=session_state))
+    return validation_agent.validate_security_question(correct_answer, user_answer)
+
+
+def test_strict_matching_ignores_case_unless_asked(monkeypatch):
+    assert validate("Answers must match exactly.", "Fluffy", " fluffy ", monkeypatch)
+    assert not validate("Answers must match exactly.", "Fluffy Paws", "Paws Fluffy", monkeypatch)
+
+
+def test_case_sensitive_matching(monkeypatch):
+    assert not validate("The answer must match exactly and is case sensitive.", "Fluffy", "fluffy", monkeypatch)
+    assert validate("The answer must match exactly and is case sensitive.", "Fluffy", "Fluffy ", monkeypatch)
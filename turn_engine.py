@@ -0,0 +1,129 @@
+import asyncio
+import queue
+import threading
+import time
+
+import streamlit as st
+
+from metrics import increment, record_timing
+
+
+class StageTimeoutError(Exception):
+    """
+    Raised when a turn stage does not finish within its timeout.
+    """
+
+    def __init__(self, stage, timeout):
+        super().__init__(f"Stage '{stage}' timed out after {timeout}s")
+        self.stage = stage
+        self.timeout = timeout
+
+
+class TurnEngine:
+    """
+    Asyncio event loop running the I/O stages of every conversation in the process.
+
+    Stages (speech-to-text, routing, generation, text-to-speech) are
+    coroutines built on the async OpenAI and LangChain clients. The Streamlit
+    script thread submits them and only blocks when it needs a result, so
+    independent stages overlap and a slow call never holds a worker thread.
+    Every stage runs under a timeout and is cancelled when it expires or
+    when its future is cancelled.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="turn-engine", daemon=True)
+        self._thread.start()
+
+    async def _run_stage(self, coroutine, stage, timeout):
+        started = time.perf_counter()
+        try:
+            return await asyncio.wait_for(coroutine, timeout)
+        except asyncio.TimeoutError:
+            increment(f"engine.{stage}.timeouts")
+            raise StageTimeoutError(stage, timeout)
+        finally:
+            record_timing(f"engine.{stage}", time.perf_counter() - started)
+
+    def submit(self, coroutine, stage, timeout=None):
+        """
+        Schedule a stage on the engine loop without waiting for it.
+
+        Args:
+            coroutine: The stage coroutine.
+            stage (str): Stage name used for metrics and errors.
+            timeout (float, optional): Seconds before the stage is cancelled.
+
+        Returns:
+            concurrent.futures.Future: The stage result.
+        """
+        return asyncio.run_coroutine_threadsafe(self._run_stage(coroutine, stage, timeout), self.loop)
+
+    def run(self, coroutine, stage, timeout=None):
+        """
+        Run a stage on the engine loop and wait for its result.
+
+        Raises:
+            StageTimeoutError: If the stage did not finish in time.
+        """
+        return self.submit(coroutine, stage, timeout).result()
+
+    def stream(self, async_iterable, stage, timeout=None):
+        """
+        Consume an async iterable on the engine loop and yield its items on the calling thread.
+
+        The whole stream must finish within ``timeout``. Closing the
+        generator early cancels the underlying stream.
+
+        Raises:
+            StageTimeoutError: If the stream did not finish in time.
+        """
+        items = queue.Queue()
+        done = object()
+
+        async def pump():
+            async for item in async_iterable:
+                items.put(item)
+
+        future = self.submit(pump(), stage, timeout)
+        # Also fires when the stage is cancelled before it ever started
+        future.add_done_callback(lambda _: items.put(done))
+        try:
+            while True:
+                item = items.get()
+                if item is done:
+                    break
+                yield item
+            future.result()
+        finally:
+            future.cancel()
+
+
+@st.cache_resource(show_spinner=False)
+def get_shared_turn_engine():
+    """
+    Return the turn engine shared by all Streamlit sessions of this process.
+    """
+    return TurnEngine()
+
+
+_local_turn_engine = None
+_local_turn_engine_lock = threading.Lock()
+
+
+def get_turn_engine():
+    """
+    Return the process-wide turn engine.
+
+    Inside a Streamlit app the engine lives in ``st.cache_resource``; when
+    running without the Streamlit runtime a module level instance is used.
+    """
+    if st.runtime.exists():
+        return get_shared_turn_engine()
+
+    global _local_turn_engine
+    with _local_turn_engine_lock:
+        if _local_turn_engine is None:
+            _local_turn_engine = TurnEngine()
+        return _local_turn_engine
@@ -1,52 +1,212 @@
 import random
+import re
+import unicodedata
+from collections import namedtuple
+from functools import lru_cache
 
 import streamlit as st
 
-from chat_utils import chat
+from chat_utils import achat, chat
+from constants import ANSWER_MATCH_THRESHOLDS, DEFAULT_VALIDATION_INSTRUCTIONS, SECURITY_QUESTIONS, TURN_STAGE_TIMEOUTS
+from metrics import increment, timed
+from turn_engine import StageTimeoutError
 
 
-def extract_user_info(user_input):
-    try:
-        # Prepare the prompt for the LLM
-        prompt = f"Extract the phone number and first name from the following user input: '{user_input}'.Provide the answer in the following format: 'Phone Number: 123-456-7890, First Name: John'. If the user input does not contain a phone number or first name, provide 'no' as the answer."
+PHONE_NUMBER_PATTERN = re.compile(r"(?<![\d+])(?:\+?1[\s.-]?)?\(?\d{3}\)?[\s.-]?\d{3}[\s.-]?\d{4}(?!\d)")
+NAME = r"([A-Za-z][A-Za-z'-]*)"
+NAME_PATTERNS = [
+    re.compile(rf"\bmy\s+(?:first\s+)?name\s+is\s+{NAME}", re.IGNORECASE),
+    re.compile(rf"\b(?:first\s+)?name(?:\s*[:=-]|\s+is\b)?\s*{NAME}", re.IGNORECASE),
+    re.compile(rf"\b{NAME}\s+here\b", re.IGNORECASE),
+    re.compile(rf"\b(?:i'm|i\s+am|this\s+is|it's|it\s+is)\s+{NAME}", re.IGNORECASE),
+    re.compile(rf"\b(?:call\s+me|name's)\s+{NAME}", re.IGNORECASE),
+    # "Sofia, 555-369-2580" and "555-369-2580, Sofia"
+    re.compile(rf"^\s*{NAME}\s*[,;/-]?\s*(?=\+?\(?\d)"),
+    re.compile(rf"\d\s*[,;/-]\s*{NAME}\s*[.!]?\s*$"),
+    re.compile(r"\d\s+([A-Z][a-z'-]*)\s*[.!]?\s*$"),
+]
+# Words the name patterns can capture that are never a first name
+NOT_NAMES = {
+    "a", "an", "and", "calling", "checking", "here", "hi", "hello", "hey", "looking", "my", "number", "phone",
+    "not", "the", "trying", "wondering", "is", "mobile", "cell", "contact", "sure", "just", "also", "ok", "okay",
+    "very", "please", "thanks", "thank", "you", "yes", "no", "so", "well", "good", "great", "fine", "happy", "glad",
+    "sorry", "back", "new", "from", "with", "at", "in", "on", "still", "really", "again", "now",
+}
 
-        # Call the LLM API
-        response = chat(prompt, use_azure=False)
 
-        # Return None if the response starts with no
-        if response.lower().startswith("no") or response is None:
-            return None, None
+def extract_user_info_locally(user_input, user_index=None):
+    """
+    Extract the phone number and first name without calling the LLM.
+
+    The result is only returned when it is unambiguous: exactly one phone
+    number and exactly one first name, either matched by a name pattern or
+    found in the input as the first name of a customer with that phone
+    number in ``user_index``. With a ``user_index``, a pattern match that is
+    not a first name of a customer with that phone number is rejected.
+
+    Args:
+        user_input (str): The user message.
+        user_index (UserIndex, optional): Customer index used to cross-check.
+
+    Returns:
+        tuple: The normalized phone number and lowercased first name, or
+            None when the local extractor is not confident.
+    """
+    phone_numbers = {normalize_phone_number(match) for match in PHONE_NUMBER_PATTERN.findall(user_input)}
+    if len(phone_numbers) != 1:
+        return None
+    phone_number = phone_numbers.pop()
 
-        # Parse the LLM response
-        extracted_info = response.strip().split(", ")
-        phone_number = extracted_info[0].split(": ")[1]
-        first_name = extracted_info[1].split(": ")[1]
+    if user_index is not None:
+        words = set(re.findall(r"[a-z'-]+", user_input.lower()))
+        known_names = [name for name in user_index.first_names_for_phone(phone_number) if name in words]
+        if len(known_names) == 1:
+            return phone_number, known_names[0]
+
+    names = {match.group(1).lower() for pattern in NAME_PATTERNS for match in pattern.finditer(user_input)}
+    names -= NOT_NAMES
+    if len(names) != 1:
+        return None
+    name = names.pop()
+    if user_index is not None and name not in user_index.first_names_for_phone(phone_number):
+        return None
+    return phone_number, name
+
+
+def get_extraction_prompt(user_input):
+    return f"Extract the phone number and first name from the following user input: '{user_input}'.Provide the answer in the following format: 'Phone Number: 123-456-7890, First Name: John'. If the user input does not contain a phone number or first name, provide 'no' as the answer."
+
+
+def parse_extraction_response(response):
+    # Return None if the response starts with no
+    if response is None or response.lower().startswith("no"):
+        return None, None
 
-        return phone_number, first_name.lower()
+    # Parse the LLM response
+    extracted_info = response.strip().split(", ")
+    phone_number = extracted_info[0].split(": ")[1]
+    first_name = extracted_info[1].split(": ")[1]
+
+    return phone_number, first_name.lower()
+
+
+def extract_user_info_with_llm(user_input):
+    try:
+        # Call the LLM API
+        response = chat(get_extraction_prompt(user_input), use_azure=False)
+        return parse_extraction_response(response)
+    except Exception as e:
+        print("Error extracting user information:", e)
+        return None, None
+
+
+async def extract_user_info_with_llm_async(user_input):
+    """
+    Async version of ``extract_user_info_with_llm`` for the turn engine.
+    """
+    try:
+        response = await achat(get_extraction_prompt(user_input), use_azure=False)
+        return parse_extraction_response(response)
     except Exception as e:
         print("Error extracting user information:", e)
         return None, None
 
 
+def extract_user_info(user_input, user_index=None, engine=None):
+    """
+    Extract the phone number and first name from the user input.
+
+    The local extractor handles the common cases; the LLM is only called
+    when it cannot produce a confident result, on the turn engine when one
+    is given.
+    """
+    with timed("validation.extract_local"):
+        extracted = extract_user_info_locally(user_input, user_index)
+    if extracted:
+        increment("validation.extract_local_decisions")
+        return extracted
+
+    increment("validation.extract_llm_decisions")
+    with timed("validation.extract_llm"):
+        if engine:
+            try:
+                return engine.run(extract_user_info_with_llm_async(user_input), "validation",
+                                  TURN_STAGE_TIMEOUTS["validation"])
+            except StageTimeoutError as e:
+                print("Error extracting user information:", e)
+                return None, None
+        return extract_user_info_with_llm(user_input)
+
+
 # My name is Sofia and phone number is 555-369-2580
 
-def get_security_question_using_id(user_id,user_data):
+UserRecord = namedtuple("UserRecord", ["user_id", "security_answers"])
+
+
+class UserIndex:
+    """
+    Hash index over the uploaded customer data.
+
+    Maps (normalized phone number, lowercased first name) and ID to a compact
+    record holding the user ID and the security answers, in the order of
+    ``SECURITY_QUESTIONS``. When several rows share a key the first one wins.
+    """
+
+    def __init__(self, user_data):
+        answer_columns = [user_data[column] for column in SECURITY_QUESTIONS.values()]
+        phone_numbers = user_data['PhoneNumber'].astype(str).map(normalize_phone_number)
+        first_names = user_data['FirstName'].astype(str).str.strip().str.lower()
+
+        self.by_phone_and_name = {}
+        self.by_id = {}
+        self.names_by_phone = {}
+        for user_id, phone_number, first_name, *answers in zip(user_data['ID'], phone_numbers, first_names,
+                                                               *answer_columns):
+            record = UserRecord(user_id, tuple(answers))
+            self.by_phone_and_name.setdefault((phone_number, first_name), record)
+            self.by_id.setdefault(user_id, record)
+            self.names_by_phone.setdefault(phone_number, []).append(first_name)
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def lookup(self, phone_number, first_name):
+        if not phone_number or not first_name:
+            return None
+        return self.by_phone_and_name.get((normalize_phone_number(phone_number), first_name.strip().lower()))
+
+    def get(self, user_id):
+        return self.by_id.get(user_id)
+
+    def first_names_for_phone(self, phone_number):
+        return self.names_by_phone.get(normalize_phone_number(phone_number), [])
+
+
+def normalize_phone_number(phone_number):
+    """
+    Reduce a phone number to its digits, dropping a leading US country code.
+    """
+    digits = re.sub(r"\D", "", str(phone_number))
+    if len(digits) == 11 and digits.startswith("1"):
+        digits = digits[1:]
+    return digits
+
+
+def build_user_index(user_data):
+    with timed("validation.build_user_index"):
+        return UserIndex(user_data)
+
+
+def choose_security_question(record):
+    question_index = random.randrange(len(SECURITY_QUESTIONS))
+    return list(SECURITY_QUESTIONS)[question_index], record.security_answers[question_index]
+
+
+def get_security_question_using_id(user_id,user_index):
     try:
-        user = user_data[(user_data['ID'] ==user_id)]
-        if not user.empty:
-            security_questions = {
-                'What is your mother\'s maiden name?':
-                user['MothersMaidenName'].values[0],
-                'What was the name of your first elementary school?':
-                user['FirstElementarySchoolName'].values[0],
-                'What was the name of your first pet?':
-                user['FirstPetName'].values[0]
-            }
-
-            question = random.choice(list(security_questions.keys()))
-            answer = security_questions[question]
-
-            return question, answer
+        record = user_index.get(user_id)
+        if record:
+            return choose_security_question(record)
         else:
             return None,None
     except Exception as e:
@@ -54,26 +214,13 @@ def get_security_question_using_id(user_id,user_data):
         return None, None
 
 
-def get_security_question(phone_number, first_name, user_data):
+def get_security_question(phone_number, first_name, user_index):
     try:
-        user = user_data[(user_data['PhoneNumber'] == phone_number)
-                       & (user_data['FirstName'].str.lower() == first_name)]
-
-        if not user.empty:
-            
-            security_questions = {
-                'What is your mother\'s maiden name?':
-                user['MothersMaidenName'].values[0],
-                'What was the name of your first elementary school?':
-                user['FirstElementarySchoolName'].values[0],
-                'What was the name of your first pet?':
-                user['FirstPetName'].values[0]
-            }
-
-            question = random.choice(list(security_questions.keys()))
-            answer = security_questions[question]
-            user_id = user['ID'].values[0]
-            return question, answer,user_id
+        record = user_index.lookup(phone_number, first_name)
+
+        if record:
+            question, answer = choose_security_question(record)
+            return question, answer,record.user_id
         else:
             return None, None ,None
 
@@ -81,10 +228,120 @@ def get_security_question(phone_number, first_name, user_data):
         print("Error getting security question:", e)
         return None, None,None
 
-def validate_security_question(security_question_correct_answer,user_answer_for_security_question):
-    try:
-        instructions = st.session_state.validation_agent_system_message or "Check if the correct answer and user answer are same or not."
-        prompt = f"""
+ValidationPolicy = namedtuple("ValidationPolicy", ["max_attempts", "strictness", "case_sensitive"])
+
+NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10}
+NUMBER = rf"(\d+|{'|'.join(NUMBER_WORDS)})"
+MAX_ATTEMPTS_PATTERNS = [
+    re.compile(rf"\b{NUMBER}\s+(?:\w+\s+)?(?:attempts?|tries|try|chances?|guesses)\b", re.IGNORECASE),
+    re.compile(rf"\b(?:attempts?|tries|chances?|guesses)\s*(?:limit|allowed|max(?:imum)?)?\s*(?:is|of|:|=|to)?\s*{NUMBER}\b", re.IGNORECASE),
+]
+STRICT_PATTERN = re.compile(r"\b(exact(ly)?|strict(ly)?|case[- ]sensitive|identical|verbatim)\b", re.IGNORECASE)
+LENIENT_PATTERN = re.compile(r"\b(lenient|typos?|misspell\w*|spelling|approximate(ly)?|close enough|similar|fuzzy|partial)\b", re.IGNORECASE)
+CASE_SENSITIVE_PATTERN = re.compile(r"\bcase[- ]sensitive(ly)?\b", re.IGNORECASE)
+# A negation up to three words before a keyword: "not case sensitive", "doesn't have to be exact"
+NEGATION_PATTERN = re.compile(r"\b(?:not|no|never|without|\w+n['’]t)\b(?:\W+\w+){0,3}\W*$", re.IGNORECASE)
+CLAUSE_BOUNDARY_PATTERN = re.compile(r"[.;,!?\n]")
+
+
+def mentions(pattern, instructions):
+    """
+    Whether ``pattern`` occurs in the instructions without a negation before it in the same clause.
+    """
+    for match in pattern.finditer(instructions):
+        clause = CLAUSE_BOUNDARY_PATTERN.split(instructions[:match.start()])[-1]
+        if not NEGATION_PATTERN.search(clause):
+            return True
+    return False
+
+
+@lru_cache(maxsize=32)
+def get_validation_policy(instructions):
+    """
+    Parse the validation agent system message into a policy.
+
+    Cached on the message text, so the policy is computed once per change of
+    the system message rather than on every answer.
+
+    Keywords preceded by a negation in the same clause ("answers are not
+    case sensitive", "doesn't have to be exact") are ignored.
+
+    Returns:
+        ValidationPolicy: The maximum number of attempts (None when not
+            mentioned), the answer matching strictness and whether strict
+            matching is case sensitive.
+    """
+    max_attempts = None
+    for pattern in MAX_ATTEMPTS_PATTERNS:
+        match = pattern.search(instructions)
+        if match:
+            value = match.group(1).lower()
+            max_attempts = int(value) if value.isdigit() else NUMBER_WORDS[value]
+            break
+
+    if mentions(STRICT_PATTERN, instructions):
+        strictness = "strict"
+    elif mentions(LENIENT_PATTERN, instructions):
+        strictness = "lenient"
+    else:
+        strictness = "normal"
+
+    return ValidationPolicy(max_attempts, strictness, mentions(CASE_SENSITIVE_PATTERN, instructions))
+
+
+def normalize_answer(answer):
+    """
+    Lowercase, strip accents and punctuation and collapse whitespace.
+    """
+    answer = unicodedata.normalize("NFKD", str(answer))
+    answer = "".join(char for char in answer if not unicodedata.combining(char))
+    answer = re.sub(r"[^\w\s]", " ", answer.lower())
+    return " ".join(answer.split())
+
+
+def edit_distance(first, second):
+    if len(first) < len(second):
+        first, second = second, first
+    previous_row = list(range(len(second) + 1))
+    for i, first_char in enumerate(first, start=1):
+        current_row = [i]
+        for j, second_char in enumerate(second, start=1):
+            current_row.append(min(previous_row[j] + 1,
+                                   current_row[j - 1] + 1,
+                                   previous_row[j - 1] + (first_char != second_char)))
+        previous_row = current_row
+    return previous_row[-1]
+
+
+def answer_similarity(correct_answer, user_answer):
+    """
+    Similarity of two answers between 0 and 1.
+
+    Exact and token-set matches (same words in any order) score 1, otherwise
+    the best normalized edit distance similarity of the raw and token-sorted
+    strings is returned.
+    """
+    correct_answer = normalize_answer(correct_answer)
+    user_answer = normalize_answer(user_answer)
+    if not correct_answer or not user_answer:
+        return 0.0
+    if correct_answer == user_answer:
+        return 1.0
+
+    correct_tokens = correct_answer.split()
+    user_tokens = user_answer.split()
+    if set(correct_tokens) == set(user_tokens):
+        return 1.0
+
+    def ratio(first, second):
+        return 1 - edit_distance(first, second) / max(len(first), len(second))
+
+    return max(ratio(correct_answer, user_answer),
+               ratio(" ".join(sorted(correct_tokens)), " ".join(sorted(user_tokens))))
+
+
+def get_answer_validation_prompt(security_question_correct_answer, user_answer_for_security_question, instructions):
+    return f"""
         Please follow the given instructions carefully. You will receive both a 
         correct answer and a user answer. 
         Your task is to validate the user answer and correct answer based on the provided instructions and
@@ -94,34 +351,90 @@ def validate_security_question(security_question_correct_answer,user_answer_for_
         Correct answer: {security_question_correct_answer}
         User answer: {user_answer_for_security_question}
 
-       Your response should be in the following format:
-        - true or false (indicating whether the answers match according to the instructions)
-        - Max attempts (if mentioned in the instructions), or 'Not specified' if not mentioned.
-
-        Provide the response in a single line, comma-separated:
-        - Example: true, 3
-        - Example: false, Not specified
+        Respond with only true or false.
         """
 
+
+def validate_security_question_with_llm(security_question_correct_answer,user_answer_for_security_question, instructions):
+    try:
+        prompt = get_answer_validation_prompt(security_question_correct_answer,
+                                              user_answer_for_security_question, instructions)
+
         # Call the LLM API
         response = chat(prompt, use_azure=False)
-        
-        parts = response.split(',')
-        match_result = parts[0].strip()
-        max_attempts = parts[1].strip() if len(parts) > 1 else None
-
-        if max_attempts and max_attempts != 'Not specified' :
-            st.session_state.max_attempts =int(max_attempts)
 
         # Return true if the response starts has true
-        if "true" in match_result.lower():
+        if "true" in response.lower():
             return True
         
         return False
        
     except Exception as e:
         print("Error extracting user information:", e)
-        return security_question_correct_answer.lower() == user_answer_for_security_question
+        return str(security_question_correct_answer).lower() == user_answer_for_security_question.lower()
+
+
+async def validate_security_question_with_llm_async(security_question_correct_answer,
+                                                    user_answer_for_security_question, instructions):
+    """
+    Async version of ``validate_security_question_with_llm`` for the turn engine.
+    """
+    try:
+        prompt = get_answer_validation_prompt(security_question_correct_answer,
+                                              user_answer_for_security_question, instructions)
+        response = await achat(prompt, use_azure=False)
+        return "true" in response.lower()
+    except Exception as e:
+        print("Error extracting user information:", e)
+        return str(security_question_correct_answer).lower() == user_answer_for_security_question.lower()
+
+
+def validate_security_question(security_question_correct_answer,user_answer_for_security_question, engine=None):
+    """
+    Check the user's answer to the security question.
+
+    Answers are matched locally first; the LLM is only consulted when the
+    similarity falls in the ambiguous band of the configured strictness, on
+    the turn engine when one is given. An answer the LLM could not judge in
+    time is rejected.
+    Strict instructions require the answer as stored, up to surrounding
+    whitespace and, unless they ask for case sensitive matching, case.
+    """
+    instructions = st.session_state.validation_agent_system_message or DEFAULT_VALIDATION_INSTRUCTIONS
+    policy = get_validation_policy(instructions)
+
+    if policy.strictness == "strict":
+        increment("validation.answer_match_local_decisions")
+        correct_answer = str(security_question_correct_answer).strip()
+        user_answer = user_answer_for_security_question.strip()
+        if policy.case_sensitive:
+            return correct_answer == user_answer
+        return correct_answer.casefold() == user_answer.casefold()
+
+    accept_similarity, reject_similarity = ANSWER_MATCH_THRESHOLDS[policy.strictness]
+    with timed("validation.answer_match_local"):
+        similarity = answer_similarity(security_question_correct_answer, user_answer_for_security_question)
+
+    if similarity >= accept_similarity:
+        increment("validation.answer_match_local_decisions")
+        return True
+    if similarity < reject_similarity:
+        increment("validation.answer_match_local_decisions")
+        return False
+
+    increment("validation.answer_match_llm_decisions")
+    with timed("validation.answer_match_llm"):
+        if engine:
+            try:
+                return engine.run(
+                    validate_security_question_with_llm_async(security_question_correct_answer,
+                                                              user_answer_for_security_question, instructions),
+                    "validation", TURN_STAGE_TIMEOUTS["validation"])
+            except StageTimeoutError as e:
+                print("Error validating security answer:", e)
+                return False
+        return validate_security_question_with_llm(security_question_correct_answer,
+                                                   user_answer_for_security_question, instructions)
 
 
 def validate_user(user_data):
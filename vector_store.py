@@ -0,0 +1,168 @@
+import hashlib
+import json
+import threading
+from collections import Counter, defaultdict
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_community.vectorstores import Chroma
+
+from constants import CHUNK_OVERLAP, CHUNK_SEPARATORS, CHUNK_SIZE, EMBEDDING_MODEL, TOKENIZER_ENCODING, VECTOR_STORE_COLLECTION, VECTOR_STORE_DIR
+from embedding_cache import CachedEmbeddings
+from metrics import increment, timed
+from model_clients import get_client_registry
+
+_vector_store = None
+_vector_store_lock = threading.Lock()
+_embeddings = None
+_document_locks = defaultdict(threading.Lock)
+_indexed_hashes = set()
+_document_references = Counter()
+
+
+def get_embeddings():
+    """
+    Return the process-wide embedding model, backed by the persistent embedding cache.
+    """
+    global _embeddings
+    with _vector_store_lock:
+        if _embeddings is None:
+            _embeddings = CachedEmbeddings(get_client_registry().get("embeddings", EMBEDDING_MODEL), EMBEDDING_MODEL)
+        return _embeddings
+
+
+def get_vector_store():
+    """
+    Return the process-wide persistent Chroma collection holding all indexed documents.
+
+    Chunks of every document are tagged with the document hash, so each
+    retriever only searches the documents it was built for.
+    """
+    global _vector_store
+    embeddings = get_embeddings()
+    with _vector_store_lock:
+        if _vector_store is None:
+            _vector_store = Chroma(collection_name=VECTOR_STORE_COLLECTION,
+                                   embedding_function=embeddings,
+                                   persist_directory=VECTOR_STORE_DIR)
+        return _vector_store
+
+
+def get_text_splitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    """
+    Return a token-aware splitter that prefers paragraph and sentence boundaries.
+
+    Chunks carry their character offset in the source as ``start_index``
+    metadata, which lets the context assembly merge overlapping chunks.
+
+    Args:
+        chunk_size (int): Maximum chunk size in tokens.
+        chunk_overlap (int): Overlap between consecutive chunks in tokens.
+    """
+    return RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        encoding_name=TOKENIZER_ENCODING,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        separators=CHUNK_SEPARATORS,
+        add_start_index=True,
+    )
+
+
+def get_document_hash(documents, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, source=None):
+    """
+    Hash the document contents together with the settings that shape the index.
+    """
+    payload = json.dumps([documents, source, chunk_size, chunk_overlap, TOKENIZER_ENCODING, CHUNK_SEPARATORS, EMBEDDING_MODEL])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def split_documents(documents, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, source=None, doc_hash=None):
+    """
+    Split documents into chunks tagged with the document hash and source.
+
+    Returns:
+        list: The chunk Documents.
+    """
+    doc_hash = doc_hash or get_document_hash(documents, chunk_size, chunk_overlap, source)
+    text_splitter = get_text_splitter(chunk_size, chunk_overlap)
+    metadata = {"doc_hash": doc_hash, "source": source} if source else {"doc_hash": doc_hash}
+    return text_splitter.create_documents(documents, metadatas=[metadata] * len(documents))
+
+
+def is_indexed(doc_hash):
+    if doc_hash in _indexed_hashes:
+        return True
+    if get_vector_store().get(where={"doc_hash": doc_hash}, limit=1)["ids"]:
+        _indexed_hashes.add(doc_hash)
+        return True
+    return False
+
+
+def index_documents(documents, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, source=None):
+    """
+    Split and embed documents into the vector store unless they are already indexed.
+
+    Indexing is idempotent: the same contents with the same splitter settings
+    are embedded once and reused across reruns, sessions and restarts. Every
+    call takes a reference to the document; give it back with
+    ``release_documents`` once the document is no longer searched.
+
+    Args:
+        documents (list): List of document texts.
+        chunk_size (int): Chunk size in tokens.
+        chunk_overlap (int): Chunk overlap in tokens.
+        source (str, optional): Name of the uploaded file, stored on every chunk.
+
+    Returns:
+        str: The document hash identifying the indexed chunks.
+    """
+    doc_hash = get_document_hash(documents, chunk_size, chunk_overlap, source)
+
+    with _document_locks[doc_hash]:
+        if is_indexed(doc_hash):
+            increment("index.reuses")
+        else:
+            with timed("index.build"):
+                texts = split_documents(documents, chunk_size, chunk_overlap, source, doc_hash)
+                if texts:
+                    get_vector_store().add_documents(texts, ids=[f"{doc_hash}-{i}" for i in range(len(texts))])
+
+            _indexed_hashes.add(doc_hash)
+            increment("index.builds")
+
+        _document_references[doc_hash] += 1
+
+    return doc_hash
+
+
+def release_documents(doc_hashes):
+    """
+    Give back references taken by ``index_documents``.
+
+    Chunks of a document nobody references any more are deleted from the
+    vector store, so old versions of edited or removed files do not pile up.
+
+    Args:
+        doc_hashes (iterable): Hashes of the documents no longer searched.
+    """
+    for doc_hash in doc_hashes:
+        with _document_locks[doc_hash]:
+            _document_references[doc_hash] -= 1
+            if _document_references[doc_hash] > 0:
+                continue
+            del _document_references[doc_hash]
+
+            vector_store = get_vector_store()
+            ids = vector_store.get(where={"doc_hash": doc_hash})["ids"]
+            if ids:
+                vector_store.delete(ids=ids)
+            _indexed_hashes.discard(doc_hash)
+            increment("index.deletes")
+
+
+def get_retriever_for_hashes(doc_hashes, k):
+    """
+    Return a retriever searching only the chunks of the given documents.
+    """
+    doc_hashes = sorted(doc_hashes)
+    doc_filter = {"doc_hash": doc_hashes[0]} if len(doc_hashes) == 1 else {"doc_hash": {"$in": doc_hashes}}
+    return get_vector_store().as_retriever(search_kwargs={"k": k, "filter": doc_filter})